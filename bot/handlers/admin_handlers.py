@@ -4,70 +4,93 @@ from typing import List, Dict, Any, Optional
 import datetime
 
 from bot.keyboards.keyboards import Keyboards
+from bot.services.broadcast import BroadcastService
 from config.config import ADMIN_IDS, TARIFFS
 from database.models import DatabaseManager
+from utils import outbound
+from utils.async_bridge import async_handler
 
 
 class AdminHandlers:
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, broadcasts: BroadcastService):
         self.db_manager = db_manager
+        self.broadcasts = broadcasts
         self.ITEMS_PER_PAGE = 5  # Количество элементов на странице для пагинации
 
     async def is_admin(self, user_id: int) -> bool:
         """Проверка, является ли пользователь администратором"""
         return user_id in ADMIN_IDS
 
+    @staticmethod
+    def access_denied(update: Update) -> Optional[str]:
+        """Текст подтверждения нажатия для админских кнопок: отказ, если пользователь не администратор"""
+        if update.effective_user.id in ADMIN_IDS:
+            return None
+        return "⛔ У вас нет доступа к этому разделу"
+
+    @async_handler
     async def admin_panel(self, update: Update, context: CallbackContext) -> None:
         """Обработчик административной панели"""
         user = update.effective_user
         
         if not await self.is_admin(user.id):
-            await context.bot.send_message(
+            await outbound.send(
+                user.id,
+                context.bot.send_message,
                 chat_id=user.id,
                 text="⛔ У вас нет доступа к административной панели"
             )
             return
         
-        await context.bot.send_message(
+        await outbound.send(
+            user.id,
+            context.bot.send_message,
             chat_id=user.id,
             text="🔑 <b>Административная панель</b>\n\nВыберите раздел:",
             reply_markup=Keyboards.admin_keyboard(),
             parse_mode="HTML"
         )
 
+    @async_handler
     async def admin_users(self, update: Update, context: CallbackContext) -> None:
         """Обработчик списка пользователей"""
         query = update.callback_query
         user = update.effective_user
         
         if not await self.is_admin(user.id):
-            await query.answer("⛔ У вас нет доступа к этому разделу")
+            # Об отказе сообщает подтверждение нажатия (access_denied)
             return
         
-        # Определяем номер страницы
+        # Номер страницы и курсор приходят из маршрута
+        # admin_users_page:<page>:<n|p>:<registration_date (unix)>:<user_id>
         page = 0
-        if query.data.startswith("admin_users_page_"):
-            page = int(query.data.split("_")[-1])
-        
-        # Получаем всех пользователей
-        users = await self.db_manager.get_all_users()
+        cursor = None
+        backward = False
+        if context.args:
+            page, direction, registration_date, user_id = context.args
+            backward = direction == "p"
+            cursor = (registration_date, user_id)
+        
+        # Получаем только пользователей текущей страницы
+        page_users = await self.db_manager.get_users_page(cursor, self.ITEMS_PER_PAGE, backward)
+        if backward and len(page_users) < self.ITEMS_PER_PAGE:
+            # Вернулись к началу списка
+            page = 0
+            page_users = await self.db_manager.get_users_page(None, self.ITEMS_PER_PAGE)
+        users_count = await self.db_manager.count_users()
         
         # Вычисляем общее количество страниц
-        total_pages = len(users) // self.ITEMS_PER_PAGE
-        if len(users) % self.ITEMS_PER_PAGE > 0:
+        total_pages = users_count // self.ITEMS_PER_PAGE
+        if users_count % self.ITEMS_PER_PAGE > 0:
             total_pages += 1
         total_pages = max(0, total_pages - 1)
-        
-        # Получаем пользователей для текущей страницы
         start_idx = page * self.ITEMS_PER_PAGE
-        end_idx = min(start_idx + self.ITEMS_PER_PAGE, len(users))
-        page_users = users[start_idx:end_idx]
         
         # Формируем текст сообщения
-        text = f"👥 <b>Пользователи</b> (всего: {len(users)})\n\n"
+        text = f"👥 <b>Пользователи</b> (всего: {users_count})\n\n"
         
         for idx, user_data in enumerate(page_users, start=start_idx+1):
-            reg_date = datetime.datetime.strptime(user_data["registration_date"], "%Y-%m-%d %H:%M:%S").strftime("%d.%m.%Y")
+            reg_date = user_data["registration_date_display"]
             username = user_data["username"] or "Нет"
             name = f"{user_data['first_name']} {user_data['last_name']}".strip() or "Не указано"
             
@@ -80,47 +103,39 @@ class AdminHandlers:
             text += "Пользователи не найдены"
         
         # Отправляем сообщение с пагинацией
-        await query.edit_message_text(
+        await outbound.call(
+            query.edit_message_text,
             text=text,
-            reply_markup=Keyboards.admin_users_keyboard(page, total_pages),
+            reply_markup=Keyboards.admin_users_keyboard(
+                page,
+                total_pages,
+                first_key=(page_users[0]["registration_date"], page_users[0]["user_id"]) if page_users else None,
+                last_key=(page_users[-1]["registration_date"], page_users[-1]["user_id"]) if page_users else None,
+            ),
             parse_mode="HTML"
         )
 
+    @async_handler
     async def admin_stats(self, update: Update, context: CallbackContext) -> None:
         """Обработчик статистики"""
         query = update.callback_query
         user = update.effective_user
         
         if not await self.is_admin(user.id):
-            await query.answer("⛔ У вас нет доступа к этому разделу")
+            # Об отказе сообщает подтверждение нажатия (access_denied)
             return
         
-        # Получаем всех пользователей
-        users = await self.db_manager.get_all_users()
-        
-        # Получаем статистику по тарифам
-        subscriptions = []
-        for u in users:
-            sub = await self.db_manager.get_active_subscription(u["user_id"])
-            if sub:
-                subscriptions.append(sub)
-        
-        # Группируем подписки по тарифам
-        tariff_stats = {}
-        for sub in subscriptions:
-            tariff_id = sub["tariff_id"]
-            if tariff_id in tariff_stats:
-                tariff_stats[tariff_id] += 1
-            else:
-                tariff_stats[tariff_id] = 1
+        # Получаем статистику одним агрегирующим запросом
+        stats = await self.db_manager.get_subscription_stats()
+        tariff_stats = stats["by_tariff"]
         
         # Формируем текст сообщения
         now = datetime.datetime.now()
         today = now.strftime("%d.%m.%Y")
         
         text = f"📊 <b>Статистика на {today}</b>\n\n"
-        text += f"👥 Всего пользователей: {len(users)}\n"
-        text += f"💰 Активных подписок: {len(subscriptions)}\n\n"
+        text += f"👥 Всего пользователей: {stats['total_users']}\n"
+        text += f"💰 Активных подписок: {stats['active_subscriptions']}\n\n"
         
         if tariff_stats:
             text += "<b>По тарифам:</b>\n"
@@ -130,19 +145,21 @@ class AdminHandlers:
                     text += f"• {tariff['name']}: {count} подписчиков\n"
         
         # Отправляем сообщение
-        await query.edit_message_text(
+        await outbound.call(
+            query.edit_message_text,
             text=text,
             reply_markup=Keyboards.back_keyboard("admin"),
             parse_mode="HTML"
         )
 
+    @async_handler
     async def admin_tariffs(self, update: Update, context: CallbackContext) -> None:
         """Обработчик управления тарифами"""
         query = update.callback_query
         user = update.effective_user
         
         if not await self.is_admin(user.id):
-            await query.answer("⛔ У вас нет доступа к этому разделу")
+            # Об отказе сообщает подтверждение нажатия (access_denied)
             return
         
         # Формируем текст сообщения со списком тарифов
@@ -163,19 +180,21 @@ class AdminHandlers:
         ]
         
         # Отправляем сообщение
-        await query.edit_message_text(
+        await outbound.call(
+            query.edit_message_text,
             text=text,
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode="HTML"
         )
 
+    @async_handler
     async def admin_broadcast(self, update: Update, context: CallbackContext) -> None:
         """Обработчик рассылки сообщений"""
         query = update.callback_query
         user = update.effective_user
         
         if not await self.is_admin(user.id):
-            await query.answer("⛔ У вас нет доступа к этому разделу")
+            # Об отказе сообщает подтверждение нажатия (access_denied)
             return
         
         # Устанавливаем состояние ожидания текста рассылки
@@ -187,7 +206,8 @@ class AdminHandlers:
         ]
         
         # Отправляем сообщение
-        await query.edit_message_text(
+        await outbound.call(
+            query.edit_message_text,
             text="📨 <b>Рассылка сообщений</b>\n\nВведите текст для рассылки всем пользователям:",
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode="HTML"
@@ -199,7 +219,9 @@ class AdminHandlers:
         message = update.message.text
         
         if not await self.is_admin(user.id):
-            await update.message.reply_text("⛔ У вас нет доступа к этой функции")
+            await outbound.send(
+                update.effective_chat.id, update.message.reply_text, "⛔ У вас нет доступа к этой функции"
+            )
             return
         
         if "waiting_for_broadcast" not in context.user_data or not context.user_data["waiting_for_broadcast"]:
@@ -208,33 +230,5 @@ class AdminHandlers:
         # Сбрасываем состояние ожидания
         context.user_data["waiting_for_broadcast"] = False
         
-        # Получаем всех пользователей
-        users = await self.db_manager.get_all_users()
-        
-        # Отправляем подтверждение администратору
-        await update.message.reply_text(
-            f"✅ Рассылка сообщения {len(users)} пользователям начата...",
-            reply_markup=Keyboards.back_keyboard("admin")
-        )
-        
-        # Отправляем сообщение всем пользователям
-        success_count = 0
-        for u in users:
-            try:
-                await context.bot.send_message(
-                    chat_id=u["user_id"],
-                    text=f"📢 <b>Уведомление от EarthVPN</b>\n\n{message}",
-                    parse_mode="HTML"
-                )
-                success_count += 1
-            except Exception:
-                # Игнорируем ошибки отправки
-                pass
-        
-        # Отправляем отчет администратору
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=f"✅ Рассылка завершена\nОтправлено: {success_count} из {len(users)} пользователей",
-            reply_markup=Keyboards.back_keyboard("admin"),
-            parse_mode="HTML"
-        ) 
\ No newline at end of file
+        # Рассылка выполняется в фоне, ход рассылки администратор видит в отдельном сообщении
+        await self.broadcasts.start(context.bot, user.id, message)
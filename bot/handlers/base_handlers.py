@@ -1,63 +1,114 @@
 from telegram import Update, Message
+from telegram.error import BadRequest
 from telegram.ext import CallbackContext
 from typing import Optional, Dict, Any, List, Union
 import datetime
-import asyncio  # Добавляем импорт asyncio
 
 from bot.keyboards.keyboards import Keyboards
-from config.config import MESSAGES, TARIFFS, FAQ_ITEMS, PAYMENT_METHODS
+from bot.message_tracker import MessageTracker
+from config.config import (
+    MESSAGES,
+    TARIFFS,
+    FAQ_ITEMS,
+    PAYMENT_METHODS,
+    MESSAGE_TRACKER_PER_USER,
+    MESSAGE_TRACKER_MAX_USERS,
+)
 from database.models import DatabaseManager
+from utils import outbound
+from utils.async_bridge import async_handler, submit
+from utils.response_timer import get_response_timer
 
 
 class BaseHandlers:
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
-        self.user_message_ids = {}  # Для хранения ID сообщений пользователей
+        # Сообщения бота пользователям, которые удаляются при смене экрана
+        self.user_message_ids = MessageTracker(
+            db_manager.get_bot_messages,
+            db_manager.save_bot_messages,
+            max_per_user=MESSAGE_TRACKER_PER_USER,
+            max_users=MESSAGE_TRACKER_MAX_USERS,
+        )
 
     async def save_user_message_id(self, user_id: int, message_id: int) -> None:
         """Сохранить ID последнего сообщения от бота пользователю"""
-        # Удаляем старые сообщения перед сохранением нового
-        if user_id in self.user_message_ids:
-            self.user_message_ids[user_id].append(message_id)
-        else:
-            self.user_message_ids[user_id] = [message_id]
+        await self.user_message_ids.add(user_id, message_id)
+
+    async def delete_previous_messages(
+        self, update: Update, context: CallbackContext, keep: Optional[int] = None
+    ) -> None:
+        """Удалить предыдущие сообщения бота пользователю в фоне.
 
-    async def delete_previous_messages(self, update: Update, context: CallbackContext) -> None:
-        """Удалить предыдущие сообщения бота пользователю"""
+        Удаление не задерживает ответ на нажатие: запросы уходят в очередь
+        исходящих запросов с приоритетом рассылки.
+
+        :param keep: ID сообщения, которое нужно оставить (текущий экран)
+        """
         user_id = update.effective_user.id
-        
-        if user_id in self.user_message_ids:
-            for message_id in self.user_message_ids[user_id]:
-                try:
-                    context.bot.delete_message(chat_id=user_id, message_id=message_id)
-                except Exception:
-                    pass  # Игнорируем ошибки при удалении сообщений
-            
-            # Очищаем список после удаления
-            self.user_message_ids[user_id] = []
+        message_ids = await self.user_message_ids.replace(user_id, keep)
+        if message_ids:
+            submit(self._delete_messages(context, user_id, message_ids))
+
+    async def _delete_messages(self, context: CallbackContext, user_id: int, message_ids: List[int]) -> None:
+        """Удалить сообщения по одному, игнорируя уже удаленные и слишком старые"""
+        for message_id in message_ids:
+            try:
+                await outbound.call(
+                    context.bot.delete_message, chat_id=user_id, message_id=message_id, bulk=True
+                )
+            except Exception:
+                pass  # Игнорируем ошибки при удалении сообщений
 
     async def send_message_and_save_id(
-        self, update: Update, context: CallbackContext, text: str, keyboard=None
+        self, update: Update, context: CallbackContext, text: str, keyboard=None, edit: bool = True
     ) -> Message:
-        """Отправить сообщение и сохранить его ID"""
-        # Удаляем старые сообщения
-        await self.delete_previous_messages(update, context)
+        """Показать экран пользователю.
+
+        При нажатии кнопки редактируется сообщение, на котором она находится, -
+        это один запрос к Bot API. Новое сообщение отправляется, только если
+        редактирование невозможно (документ, слишком старое сообщение) или
+        edit=False; остальные сообщения бота удаляются в фоне. Показ экрана
+        отмечается в таймере ответов на нажатия.
+        """
+        query = update.callback_query
+        current = query.message if query is not None else None
+        if edit and current is not None and current.text is not None:
+            try:
+                await outbound.call(
+                    query.edit_message_text, text=text, reply_markup=keyboard, parse_mode="HTML"
+                )
+                get_response_timer().visible(update.update_id)
+                await self.delete_previous_messages(update, context, keep=current.message_id)
+                return current
+            except BadRequest as e:
+                # Повторное нажатие той же кнопки: экран уже показан
+                if "not modified" in e.message.lower():
+                    get_response_timer().visible(update.update_id)
+                    await self.delete_previous_messages(update, context, keep=current.message_id)
+                    return current
         
         # Отправляем новое сообщение
-        message = context.bot.send_message(
+        message = await outbound.send(
+            update.effective_user.id,
+            context.bot.send_message,
             chat_id=update.effective_user.id,
             text=text,
             reply_markup=keyboard,
             parse_mode="HTML"
         )
+        get_response_timer().visible(update.update_id)
         
-        # Сохраняем ID нового сообщения
-        await self.save_user_message_id(update.effective_user.id, message.message_id)
+        # Старое сообщение с кнопкой тоже удаляется
+        if current is not None:
+            await self.save_user_message_id(update.effective_user.id, current.message_id)
+        await self.delete_previous_messages(update, context, keep=message.message_id)
         
         return message
 
-    async def _start_async(self, update: Update, context: CallbackContext) -> None:
-        """Внутренняя асинхронная реализация обработчика команды /start"""
+    @async_handler
+    async def start(self, update: Update, context: CallbackContext) -> None:
+        """Обработчик команды /start"""
         user = update.effective_user
         
         # Добавляем пользователя в базу данных
@@ -69,7 +120,9 @@ class BaseHandlers:
         )
         
         # Отправляем приветственное сообщение
-        context.bot.send_message(
+        await outbound.send(
+            user.id,
+            context.bot.send_message,
             chat_id=user.id,
             text=MESSAGES["start"],
             reply_markup=Keyboards.start_keyboard(),
@@ -79,32 +132,9 @@ class BaseHandlers:
         # Обновляем время последней активности
         await self.db_manager.update_user_activity(user.id)
 
-    def start(self, update: Update, context: CallbackContext) -> None:
-        """Обработчик команды /start - синхронная обертка для асинхронной функции"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        
-        # Запускаем асинхронную функцию в цикле событий
-        loop.run_until_complete(self._start_async(update, context))
-
-    def main_menu(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def main_menu(self, update: Update, context: CallbackContext) -> None:
         """Обработчик главного меню"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._main_menu_async(update, context))
-        
-    async def _main_menu_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика главного меню"""
         user = update.effective_user
         
         # Отправляем сообщение с главным меню
@@ -118,20 +148,9 @@ class BaseHandlers:
         # Обновляем время последней активности
         await self.db_manager.update_user_activity(user.id)
 
-    def about(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def about(self, update: Update, context: CallbackContext) -> None:
         """Обработчик раздела 'О сервисе'"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._about_async(update, context))
-        
-    async def _about_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика раздела 'О сервисе'"""
         user = update.effective_user
         
         await self.send_message_and_save_id(
@@ -143,20 +162,9 @@ class BaseHandlers:
         
         await self.db_manager.update_user_activity(user.id)
 
-    def tariffs(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def tariffs(self, update: Update, context: CallbackContext) -> None:
         """Обработчик раздела 'Тарифы и подписка'"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._tariffs_async(update, context))
-        
-    async def _tariffs_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика раздела 'Тарифы и подписка'"""
         user = update.effective_user
         
         await self.send_message_and_save_id(
@@ -168,22 +176,10 @@ class BaseHandlers:
         
         await self.db_manager.update_user_activity(user.id)
 
-    def tariff_info(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def tariff_info(self, update: Update, context: CallbackContext) -> None:
         """Обработчик информации о конкретном тарифе"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._tariff_info_async(update, context))
-        
-    async def _tariff_info_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика информации о конкретном тарифе"""
-        query = update.callback_query
-        tariff_id = int(query.data.split('_')[1])
+        tariff_id = context.args[0]
         user = update.effective_user
         
         # Находим тариф по ID
@@ -212,20 +208,9 @@ class BaseHandlers:
         
         await self.db_manager.update_user_activity(user.id)
 
-    def faq(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def faq(self, update: Update, context: CallbackContext) -> None:
         """Обработчик раздела 'FAQ'"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._faq_async(update, context))
-        
-    async def _faq_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика раздела 'FAQ'"""
         user = update.effective_user
         
         await self.send_message_and_save_id(
@@ -237,22 +222,10 @@ class BaseHandlers:
         
         await self.db_manager.update_user_activity(user.id)
 
-    def faq_item(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def faq_item(self, update: Update, context: CallbackContext) -> None:
         """Обработчик конкретного вопроса FAQ"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._faq_item_async(update, context))
-        
-    async def _faq_item_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика конкретного вопроса FAQ"""
-        query = update.callback_query
-        item_id = int(query.data.split('_')[2])
+        item_id = context.args[0]
         user = update.effective_user
         
         if 0 <= item_id < len(FAQ_ITEMS):
@@ -268,20 +241,9 @@ class BaseHandlers:
         
         await self.db_manager.update_user_activity(user.id)
 
-    def support(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def support(self, update: Update, context: CallbackContext) -> None:
         """Обработчик раздела 'Поддержка'"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._support_async(update, context))
-        
-    async def _support_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика раздела 'Поддержка'"""
         user = update.effective_user
         
         await self.send_message_and_save_id(
@@ -293,20 +255,9 @@ class BaseHandlers:
         
         await self.db_manager.update_user_activity(user.id)
 
-    def profile(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def profile(self, update: Update, context: CallbackContext) -> None:
         """Обработчик личного кабинета пользователя"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._profile_async(update, context))
-        
-    async def _profile_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика личного кабинета пользователя"""
         user = update.effective_user
         
         # Получаем активную подписку пользователя
@@ -317,15 +268,11 @@ class BaseHandlers:
             tariff = next((t for t in TARIFFS if t["id"] == subscription["tariff_id"]), None)
             
             if tariff:
-                # Форматируем дату окончания подписки
-                end_date = datetime.datetime.strptime(subscription["end_date"], "%Y-%m-%d %H:%M:%S")
-                days_left = (end_date - datetime.datetime.now()).days
-                
-                # Формируем информацию о профиле
+                # Формируем информацию о профиле (даты уже отформатированы в SQL)
                 profile_info = MESSAGES["subscription_info"].format(
                     tariff_name=tariff["name"],
-                    expire_date=end_date.strftime("%d.%m.%Y"),
-                    days_left=max(0, days_left)
+                    expire_date=subscription["end_date_display"],
+                    days_left=subscription["days_left"]
                 )
             else:
                 profile_info = MESSAGES["no_subscription"]
@@ -341,22 +288,10 @@ class BaseHandlers:
         
         await self.db_manager.update_user_activity(user.id)
 
-    def payment(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def payment(self, update: Update, context: CallbackContext) -> None:
         """Обработчик оплаты"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._payment_async(update, context))
-        
-    async def _payment_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика оплаты"""
-        query = update.callback_query
-        tariff_id = int(query.data.split('_')[1])
+        tariff_id = context.args[0]
         user = update.effective_user
         
         await self.send_message_and_save_id(
@@ -368,24 +303,10 @@ class BaseHandlers:
         
         await self.db_manager.update_user_activity(user.id)
 
-    def process_payment_method(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def process_payment_method(self, update: Update, context: CallbackContext) -> None:
         """Обработчик выбора способа оплаты"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._process_payment_method_async(update, context))
-        
-    async def _process_payment_method_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика выбора способа оплаты"""
-        query = update.callback_query
-        parts = query.data.split('_')
-        method_id = parts[2]
-        tariff_id = int(parts[3])
+        method_id, tariff_id = context.args
         user = update.effective_user
         
         # Находим тариф по ID
@@ -435,22 +356,10 @@ class BaseHandlers:
         
         await self.db_manager.update_user_activity(user.id)
 
-    def check_payment(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def check_payment(self, update: Update, context: CallbackContext) -> None:
         """Обработчик проверки статуса платежа"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._check_payment_async(update, context))
-        
-    async def _check_payment_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика проверки статуса платежа"""
-        query = update.callback_query
-        payment_id = int(query.data.split('_')[2])
+        payment_id = context.args[0]
         user = update.effective_user
         
         # Получаем информацию о платеже
@@ -469,41 +378,35 @@ class BaseHandlers:
         # В данном примере, для демонстрации, считаем платеж успешным
         
         # Имитация успешного платежа
-        if payment["status"] == "pending":
-            # Обновляем статус платежа
-            await self.db_manager.update_payment(
+        # Находим тариф по ID
+        tariff = next((t for t in TARIFFS if t["id"] == payment["tariff_id"]), None)
+        
+        if payment["status"] in ("pending", "success") and tariff:
+            # Подтверждаем платеж, создаем подписку и конфигурации одной транзакцией;
+            # повторное нажатие вернет уже существующий результат
+            result = await self.db_manager.activate_payment(
                 payment_id=payment_id,
                 payment_external_id="test_payment_id",
-                status="success"
+                duration_days=tariff["duration_days"],
+                configs=self.generate_config_files(payment["user_id"], tariff)
+            )
+        else:
+            result = None
+        
+        if result and result["status"] == "success":
+            await self.send_message_and_save_id(
+                update=update,
+                context=context,
+                text=f"✅ Оплата успешно произведена! Тариф '{tariff['name']}' активирован.\n\nВы можете скачать конфигурационные файлы в личном кабинете.",
+                keyboard=Keyboards.back_keyboard("profile")
+            )
+        elif payment["status"] == "pending":
+            await self.send_message_and_save_id(
+                update=update,
+                context=context,
+                text="Ошибка активации тарифа. Пожалуйста, обратитесь в поддержку.",
+                keyboard=Keyboards.back_keyboard("profile")
             )
-            
-            # Находим тариф по ID
-            tariff = next((t for t in TARIFFS if t["id"] == payment["tariff_id"]), None)
-            
-            if tariff:
-                # Добавляем подписку пользователю
-                subscription_id = await self.db_manager.add_subscription(
-                    user_id=user.id,
-                    tariff_id=tariff["id"],
-                    duration_days=tariff["duration_days"]
-                )
-                
-                # Генерируем конфигурационные файлы (в реальном проекте)
-                await self.generate_config_files(user.id, tariff)
-                
-                await self.send_message_and_save_id(
-                    update=update,
-                    context=context,
-                    text=f"✅ Оплата успешно произведена! Тариф '{tariff['name']}' активирован.\n\nВы можете скачать конфигурационные файлы в личном кабинете.",
-                    keyboard=Keyboards.back_keyboard("profile")
-                )
-            else:
-                await self.send_message_and_save_id(
-                    update=update,
-                    context=context,
-                    text="Ошибка активации тарифа. Пожалуйста, обратитесь в поддержку.",
-                    keyboard=Keyboards.back_keyboard("profile")
-                )
         else:
             await self.send_message_and_save_id(
                 update=update,
@@ -514,8 +417,8 @@ class BaseHandlers:
         
         await self.db_manager.update_user_activity(user.id)
 
-    async def generate_config_files(self, user_id: int, tariff: Dict[str, Any]) -> None:
-        """Генерация конфигурационных файлов VPN"""
+    def generate_config_files(self, user_id: int, tariff: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Генерация конфигурационных файлов VPN (сохраняются вместе с активацией платежа)"""
         # OpenVPN конфигурация
         openvpn_config = {
             "server": "vpn.earthvpn.com",
@@ -535,24 +438,11 @@ class BaseHandlers:
             "dns": "1.1.1.1, 8.8.8.8"
         }
         
-        # Сохраняем конфигурации в базу данных
-        await self.db_manager.save_config(user_id, "openvpn", openvpn_config)
-        await self.db_manager.save_config(user_id, "wireguard", wireguard_config)
+        return {"openvpn": openvpn_config, "wireguard": wireguard_config}
 
-    def configs(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def configs(self, update: Update, context: CallbackContext) -> None:
         """Обработчик запроса конфигурационных файлов"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._configs_async(update, context))
-        
-    async def _configs_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика запроса конфигурационных файлов"""
         user = update.effective_user
         
         await self.send_message_and_save_id(
@@ -564,20 +454,9 @@ class BaseHandlers:
         
         await self.db_manager.update_user_activity(user.id)
         
-    def payment_history(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def payment_history(self, update: Update, context: CallbackContext) -> None:
         """Обработчик истории платежей"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._payment_history_async(update, context))
-        
-    async def _payment_history_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика истории платежей"""
         user = update.effective_user
         
         # Получаем все платежи пользователя
@@ -591,9 +470,7 @@ class BaseHandlers:
                 tariff = next((t for t in TARIFFS if t["id"] == payment["tariff_id"]), None)
                 tariff_name = tariff["name"] if tariff else "Неизвестный тариф"
                 
-                date = datetime.datetime.strptime(payment["created_at"], "%Y-%m-%d %H:%M:%S").strftime("%d.%m.%Y %H:%M")
-                
-                text += f"📅 <b>{date}</b>\n"
+                text += f"📅 <b>{payment['created_at_display']}</b>\n"
                 text += f"🏷 Тариф: {tariff_name}\n"
                 text += f"💰 Сумма: {payment['amount']} руб.\n"
                 text += f"💳 Способ: {payment['payment_method']}\n"
@@ -610,22 +487,10 @@ class BaseHandlers:
         
         await self.db_manager.update_user_activity(user.id)
 
-    def download_config(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def download_config(self, update: Update, context: CallbackContext) -> None:
         """Обработчик скачивания конфигурационного файла"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._download_config_async(update, context))
-        
-    async def _download_config_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика скачивания конфигурационного файла"""
-        query = update.callback_query
-        config_type = query.data.split('_')[1]
+        config_type = context.args[0]
         user = update.effective_user
         
         # Получаем конфигурационные файлы пользователя
@@ -644,18 +509,23 @@ class BaseHandlers:
                 config_text = "Неподдерживаемый тип конфигурации"
             
             # Отправляем файл пользователю
-            context.bot.send_document(
+            await outbound.send(
+                user.id,
+                context.bot.send_document,
                 chat_id=user.id,
                 document=config_text.encode(),
                 filename=f"earthvpn_{config_type}.conf",
                 caption=f"Конфигурация {config_type.upper()} для EarthVPN"
             )
+            get_response_timer().visible(update.update_id)
             
+            # Меню отправляется новым сообщением под документом
             await self.send_message_and_save_id(
                 update=update,
                 context=context,
                 text=f"✅ Конфигурационный файл {config_type.upper()} отправлен!",
-                keyboard=Keyboards.configs_keyboard()
+                keyboard=Keyboards.configs_keyboard(),
+                edit=False
             )
         else:
             await self.send_message_and_save_id(
@@ -1,5 +1,7 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+
+from bot.router import callback_data
 
 class Keyboards:
     @staticmethod
@@ -38,7 +40,7 @@ class Keyboards:
             keyboard.append([
                 InlineKeyboardButton(
                     f"{tariff['name']} - {tariff['price']} руб.",
-                    callback_data=f"tariff_{tariff['id']}"
+                    callback_data=callback_data("tariff", tariff['id'])
                 )
             ])
         keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="main_menu")])
@@ -48,7 +50,7 @@ class Keyboards:
     def tariff_info_keyboard(tariff_id: int) -> InlineKeyboardMarkup:
         """Клавиатура для конкретного тарифа"""
         keyboard = [
-            [InlineKeyboardButton("💳 Оплатить", callback_data=f"pay_{tariff_id}")],
+            [InlineKeyboardButton("💳 Оплатить", callback_data=callback_data("pay", tariff_id))],
             [InlineKeyboardButton("◀️ Назад", callback_data="tariffs")]
         ]
         return InlineKeyboardMarkup(keyboard)
@@ -61,10 +63,10 @@ class Keyboards:
             keyboard.append([
                 InlineKeyboardButton(
                     method['name'],
-                    callback_data=f"payment_method_{method['id']}_{tariff_id}"
+                    callback_data=callback_data("payment_method", method['id'], tariff_id)
                 )
             ])
-        keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data=f"tariff_{tariff_id}")])
+        keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data=callback_data("tariff", tariff_id))])
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
@@ -85,8 +87,8 @@ class Keyboards:
     def configs_keyboard() -> InlineKeyboardMarkup:
         """Клавиатура для выбора типа конфигурации"""
         keyboard = [
-            [InlineKeyboardButton("OpenVPN", callback_data="config_openvpn")],
-            [InlineKeyboardButton("WireGuard", callback_data="config_wireguard")],
+            [InlineKeyboardButton("OpenVPN", callback_data=callback_data("config", "openvpn"))],
+            [InlineKeyboardButton("WireGuard", callback_data=callback_data("config", "wireguard"))],
             [InlineKeyboardButton("◀️ Назад", callback_data="profile")]
         ]
         return InlineKeyboardMarkup(keyboard)
@@ -99,7 +101,7 @@ class Keyboards:
             keyboard.append([
                 InlineKeyboardButton(
                     item['question'],
-                    callback_data=f"faq_item_{i}"
+                    callback_data=callback_data("faq_item", i)
                 )
             ])
         keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="main_menu")])
@@ -126,19 +128,31 @@ class Keyboards:
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
-    def admin_users_keyboard(page: int = 0, total_pages: int = 0) -> InlineKeyboardMarkup:
-        """Клавиатура для просмотра пользователей с пагинацией"""
+    def admin_users_keyboard(
+        page: int = 0,
+        total_pages: int = 0,
+        first_key: Optional[Tuple[int, int]] = None,
+        last_key: Optional[Tuple[int, int]] = None,
+    ) -> InlineKeyboardMarkup:
+        """Клавиатура для просмотра пользователей с пагинацией.
+
+        first_key и last_key - ключи (registration_date, user_id) первой и последней
+        строки страницы; они передаются в callback_data как курсор соседней страницы.
+        """
         keyboard = []
+
+        def cursor_data(target_page: int, direction: str, key: Tuple[int, int]) -> str:
+            return callback_data("admin_users_page", target_page, direction, key[0], key[1])
         
         # Навигация по страницам
         nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton("◀️", callback_data=f"admin_users_page_{page-1}"))
+        if page > 0 and first_key:
+            nav_buttons.append(InlineKeyboardButton("◀️", callback_data=cursor_data(page - 1, "p", first_key)))
         
         nav_buttons.append(InlineKeyboardButton(f"{page+1}/{total_pages+1}", callback_data="ignore"))
         
-        if page < total_pages:
-            nav_buttons.append(InlineKeyboardButton("▶️", callback_data=f"admin_users_page_{page+1}"))
+        if page < total_pages and last_key:
+            nav_buttons.append(InlineKeyboardButton("▶️", callback_data=cursor_data(page + 1, "n", last_key)))
         
         if nav_buttons:
             keyboard.append(nav_buttons)
@@ -150,7 +164,7 @@ class Keyboards:
     def check_payment_keyboard(payment_id: int) -> InlineKeyboardMarkup:
         """Клавиатура для проверки статуса платежа"""
         keyboard = [
-            [InlineKeyboardButton("🔄 Проверить оплату", callback_data=f"check_payment_{payment_id}")],
+            [InlineKeyboardButton("🔄 Проверить оплату", callback_data=callback_data("check_payment", payment_id))],
             [InlineKeyboardButton("❌ Отменить", callback_data="tariffs")]
         ]
         return InlineKeyboardMarkup(keyboard)
@@ -0,0 +1,211 @@
+import time
+from array import array
+from itertools import islice
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+# Чтение сохраненных сообщений пользователя: упакованные записи или None
+LoadFn = Callable[[int], Awaitable[Optional[bytes]]]
+# Запись состояния: [(user_id, упакованные записи, updated_at), ...] и граница устаревания
+SaveFn = Callable[[List[Tuple[int, bytes, int]], int], Awaitable[None]]
+
+# Telegram не дает боту удалять сообщения старше 48 часов
+DELETE_WINDOW = 48 * 3600
+
+# message_id записи-отметки "сообщений нет": перекрывает сохраненные в базе записи
+_CLEARED = 0
+
+
+def _pack(sent_at: int, message_id: int) -> int:
+    """Запись о сообщении в одном 64-битном числе: время отправки и message_id.
+
+    message_id в личном чате помещается в 32 бита.
+    """
+    return (sent_at << 32) | message_id
+
+
+def _sent_at(entry: int) -> int:
+    """Время отправки из записи"""
+    return entry >> 32
+
+
+def _message_id(entry: int) -> int:
+    """message_id из записи"""
+    return entry & 0xFFFFFFFF
+
+
+def _encode(entries: List[int]) -> Union[int, bytes]:
+    """Одна запись хранится как число, несколько - как упакованные bytes"""
+    if len(entries) == 1:
+        return entries[0]
+    return array("Q", entries).tobytes()
+
+
+def _decode(value: Union[int, bytes]) -> List[int]:
+    """Записи пользователя из числа или упакованных bytes"""
+    if isinstance(value, int):
+        return [value]
+    entries = array("Q")
+    entries.frombytes(value)
+    return entries.tolist()
+
+
+class MessageTracker:
+    """Ограниченный учет сообщений бота, которые нужно удалить при смене экрана.
+
+    Для каждого пользователя хранится не больше max_per_user записей, каждая
+    запись - одно 64-битное число (время отправки и message_id). Обычно у
+    пользователя одно сообщение-экран, и оно хранится как одно число,
+    несколько записей упаковываются в bytes. Сообщения старше ttl
+    отбрасываются: Telegram все равно не даст их удалить.
+
+    Порядок вытеснения задает обычный dict: обновленный пользователь
+    переставляется в конец, поэтому в начале лежат давно не обновлявшиеся.
+    Вытеснение идет пачками, общее число пользователей ограничено max_users.
+
+    При остановке состояние записывается в SQLite, после перезапуска записи
+    пользователя читаются из базы при первом обращении к нему. Пользователь
+    без сообщений хранится отметкой с временем очистки (message_id 0): она
+    перекрывает записи в базе, пока они не устареют, и при сохранении
+    затирает их.
+
+    Методы вызываются из общего цикла событий (async_bridge).
+    """
+
+    def __init__(
+        self,
+        load_fn: LoadFn,
+        save_fn: SaveFn,
+        max_per_user: int = 10,
+        max_users: int = 200000,
+        ttl: float = DELETE_WINDOW,
+    ):
+        """
+        Инициализация учета сообщений
+
+        :param load_fn: Корутина чтения сохраненных записей пользователя
+        :param save_fn: Корутина записи состояния при остановке
+        :param max_per_user: Сколько последних сообщений помнить для одного пользователя
+        :param max_users: Сколько пользователей держать в памяти
+        :param ttl: Через сколько секунд после отправки сообщение забывается
+        """
+        self.load_fn = load_fn
+        self.save_fn = save_fn
+        self.max_per_user = max(1, max_per_user)
+        self.max_users = max(1, max_users)
+        self.ttl = int(ttl)
+
+        # user_id -> записи в порядке отправки; в начале - давно не обновлявшиеся пользователи
+        self._users: Dict[int, Union[int, bytes]] = {}
+        self._ops_since_sweep = 0
+
+        # Счетчики
+        self.loaded = 0
+        self.expired = 0
+        self.evicted = 0
+        self.dropped = 0
+
+    async def _entries(self, user_id: int, now: int) -> List[int]:
+        """Актуальные записи пользователя; при первом обращении - из базы"""
+        value = self._users.get(user_id)
+        if value is None:
+            value = await self.load_fn(user_id)
+            if value is None:
+                return []
+            self.loaded += 1
+        return [
+            entry for entry in _decode(value)
+            if _message_id(entry) != _CLEARED and now - _sent_at(entry) < self.ttl
+        ]
+
+    def _store(self, user_id: int, entries: List[int], now: int) -> None:
+        """Сохранить записи пользователя и переместить его в конец порядка вытеснения"""
+        if len(entries) > self.max_per_user:
+            self.dropped += len(entries) - self.max_per_user
+            entries = entries[-self.max_per_user:]
+        # Удаление и повторная вставка переставляют пользователя в конец
+        self._users.pop(user_id, None)
+        self._users[user_id] = _encode(entries) if entries else _pack(now, _CLEARED)
+        excess = len(self._users) - self.max_users
+        if excess > 0:
+            # Пачкой в 1%, чтобы не искать начало словаря при каждой вставке
+            victims = list(islice(self._users, excess + self.max_users // 100))
+            for victim in victims:
+                del self._users[victim]
+            self.evicted += len(victims)
+        self._maybe_sweep()
+
+    async def get(self, user_id: int) -> List[int]:
+        """ID сообщений пользователя, которые еще можно удалить"""
+        now = int(time.time())
+        return [_message_id(entry) for entry in await self._entries(user_id, now)]
+
+    async def add(self, user_id: int, message_id: int) -> None:
+        """Запомнить отправленное пользователю сообщение"""
+        now = int(time.time())
+        entries = await self._entries(user_id, now)
+        if any(_message_id(entry) == message_id for entry in entries):
+            return
+        entries.append(_pack(now, message_id))
+        self._store(user_id, entries, now)
+
+    async def replace(self, user_id: int, keep: Optional[int] = None) -> List[int]:
+        """Забыть все сообщения пользователя, кроме keep, и вернуть ID забытых для удаления"""
+        now = int(time.time())
+        entries = await self._entries(user_id, now)
+        removed = [_message_id(entry) for entry in entries if _message_id(entry) != keep]
+        if keep is None:
+            # Отметка очистки перекрывает записи, сохраненные в базе
+            self._store(user_id, [], now)
+            return removed
+        kept = [entry for entry in entries if _message_id(entry) == keep]
+        self._store(user_id, kept or [_pack(now, keep)], now)
+        return removed
+
+    def _maybe_sweep(self) -> None:
+        """Время от времени удалять пользователей, все сообщения которых устарели"""
+        self._ops_since_sweep += 1
+        if self._ops_since_sweep < 1000:
+            return
+        self._ops_since_sweep = 0
+        self.sweep()
+
+    def sweep(self, now: Optional[int] = None) -> int:
+        """Удалить с начала порядка пользователей, последняя запись которых устарела.
+
+        Отметка очистки удаляется тоже только после ttl: к этому времени
+        устаревают и записи, которые она перекрывает в базе.
+        """
+        now = int(time.time()) if now is None else now
+        expired = []
+        for user_id, value in self._users.items():
+            entries = _decode(value)
+            if now - _sent_at(entries[-1]) < self.ttl:
+                break
+            expired.append(user_id)
+        for user_id in expired:
+            del self._users[user_id]
+        self.expired += len(expired)
+        return len(expired)
+
+    async def save(self) -> int:
+        """Записать состояние в базу (при остановке); возвращает число пользователей"""
+        now = int(time.time())
+        self.sweep(now)
+        rows = []
+        for user_id, value in self._users.items():
+            entries = _decode(value)
+            # Для отметки очистки записывается пустой список, он затирает строку в базе
+            live = [entry for entry in entries if _message_id(entry) != _CLEARED]
+            rows.append((user_id, array("Q", live).tobytes(), _sent_at(entries[-1])))
+        await self.save_fn(rows, now - self.ttl)
+        return len(rows)
+
+    def stats(self) -> Dict[str, int]:
+        """Размер и счетчики вытеснения"""
+        return {
+            "users": len(self._users),
+            "loaded": self.loaded,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,170 @@
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+
+class LimiterStore(ABC):
+    """Хранилище состояния ведер RateLimiter.
+
+    Ведро хранится в форме GCRA: по ключу лежит теоретический момент
+    следующего запроса (tat). Запрос разрешен, если tat опережает текущее
+    время не больше чем на tolerance; тогда tat сдвигается на interval.
+    """
+
+    # Как часто (в секундах) вызывать sweep
+    sweep_interval = 60.0
+
+    @abstractmethod
+    def clock(self) -> float:
+        """Текущее время в шкале, общей для всех пользователей хранилища"""
+
+    @abstractmethod
+    def acquire(self, key: int, now: float, interval: float, tolerance: float) -> bool:
+        """Атомарно проверить ведро и, если запрос разрешен, забрать токен"""
+
+    @abstractmethod
+    def get(self, key: int) -> Optional[float]:
+        """tat ведра или None, если ведро полное"""
+
+    @abstractmethod
+    def sweep(self, now: float) -> int:
+        """Удалить записи полных ведер; возвращает количество удаленных"""
+
+    @abstractmethod
+    def size(self) -> int:
+        """Количество хранимых записей"""
+
+    def close(self) -> None:
+        """Освободить ресурсы хранилища"""
+
+
+class MemoryStore(LimiterStore):
+    """Состояние в памяти процесса: каждый процесс считает лимиты отдельно"""
+
+    def __init__(self, sweep_interval: float = 60.0):
+        """
+        :param sweep_interval: Как часто (в секундах) удалять записи полных ведер
+        """
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        # Ключ -> tat; в начале словаря - давно не обновлявшиеся записи
+        self._tat: Dict[int, float] = {}
+
+    def clock(self) -> float:
+        return time.monotonic()
+
+    def acquire(self, key: int, now: float, interval: float, tolerance: float) -> bool:
+        with self._lock:
+            tat = self._tat.pop(key, now)
+            if tat - now > tolerance:
+                self._tat[key] = tat
+                return False
+            # Повторная вставка переносит запись в конец порядка очистки
+            self._tat[key] = max(tat, now) + interval
+            return True
+
+    def get(self, key: int) -> Optional[float]:
+        with self._lock:
+            return self._tat.get(key)
+
+    def sweep(self, now: float) -> int:
+        with self._lock:
+            idle = []
+            for key, tat in self._tat.items():
+                if tat > now:
+                    break
+                idle.append(key)
+            for key in idle:
+                del self._tat[key]
+            return len(idle)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._tat)
+
+
+class SQLiteStore(LimiterStore):
+    """Общее для процессов на одном хосте состояние в отдельном файле SQLite.
+
+    Проверка - один атомарный UPSERT: строка обновляется, только если
+    запрос укладывается в лимит, а результат определяется по числу
+    измененных строк. Время берется по часам системы, чтобы шкала была
+    общей для всех процессов. Записи полных ведер удаляются пачками по
+    диапазонам ключей, чтобы не держать блокировку на запись долго.
+    Потеря файла при сбое безопасна: лимиты просто начнутся заново.
+    """
+
+    ACQUIRE_QUERY = """
+        INSERT INTO rate_limits (key, tat) VALUES (:key, :now + :interval)
+        ON CONFLICT (key) DO UPDATE SET tat = max(tat, :now) + :interval
+        WHERE tat - :now <= :tolerance
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        sweep_interval: float = 1.0,
+        sweep_batch: int = 5000,
+        busy_timeout_ms: int = 1000,
+    ):
+        """
+        :param db_path: Путь к файлу базы, общему для процессов бота
+        :param sweep_interval: Как часто (в секундах) удалять очередную пачку записей полных ведер
+        :param sweep_batch: Сколько записей просматривать за одну очистку
+        :param busy_timeout_ms: Сколько ждать блокировки, занятой другим процессом
+        """
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = max(1, sweep_batch)
+        self._lock = threading.Lock()
+        # Последний просмотренный при очистке ключ
+        self._sweep_after = -1
+
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        # Состояние лимитов не требует устойчивости к сбою питания
+        self._conn.execute("PRAGMA synchronous = OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits (key INTEGER PRIMARY KEY, tat REAL NOT NULL)"
+        )
+
+    def clock(self) -> float:
+        return time.time()
+
+    def acquire(self, key: int, now: float, interval: float, tolerance: float) -> bool:
+        params = {"key": key, "now": now, "interval": interval, "tolerance": tolerance}
+        with self._lock:
+            return self._conn.execute(self.ACQUIRE_QUERY, params).rowcount == 1
+
+    def get(self, key: int) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def sweep(self, now: float) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT max(key) FROM (SELECT key FROM rate_limits WHERE key > ? ORDER BY key LIMIT ?)",
+                (self._sweep_after, self.sweep_batch),
+            ).fetchone()
+            upper = row[0]
+            if upper is None:
+                # Дошли до конца таблицы - следующий проход с начала
+                self._sweep_after = -1
+                return 0
+            removed = self._conn.execute(
+                "DELETE FROM rate_limits WHERE key > ? AND key <= ? AND tat <= ?",
+                (self._sweep_after, upper, now),
+            ).rowcount
+            self._sweep_after = upper
+            return removed
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,79 +1,147 @@
-import time
-from typing import Dict, Tuple, Callable, Any, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
 from telegram import Update
-from telegram.ext import CallbackContext
+from telegram.ext import CallbackContext, DispatcherHandlerStop
+
+from bot.middlewares.limiter_store import LimiterStore, MemoryStore
+from bot.router import RouteClassifier
+from utils import outbound
+from utils.async_bridge import run_sync, submit
+
+# Классы маршрутов по умолчанию: до 8 классов, номер класса хранится в младших битах ключа
+DEFAULT_CLASS = "menu"
+_CLASS_BITS = 3
 
 
 class RateLimiter:
-    """Middleware для ограничения частоты запросов к боту"""
-    
-    def __init__(self, rate_limit: int = 5, time_window: int = 60):
+    """Ограничение частоты запросов пользователя по классам маршрутов.
+
+    Для каждой пары (пользователь, класс маршрута) работает ведро токенов
+    вместимостью limit, которое пополняется за window секунд. Ведро хранится
+    в форме GCRA одним числом - теоретическим моментом следующего запроса,
+    поэтому проверка выполняется за O(1), а запись занимает один float.
+    Состояние лежит в хранилище: в памяти процесса (MemoryStore) или в общем
+    для нескольких процессов файле SQLite (SQLiteStore). Записи полных ведер
+    периодически удаляются.
+
+    Регистрируется отдельной группой Dispatcher перед обработчиками: запрос
+    сверх лимита останавливает обработку до обращений к базе данных.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[int, float]],
+        default_class: str = DEFAULT_CLASS,
+        store: Optional[LimiterStore] = None,
+    ):
         """
         Инициализация ограничителя частоты запросов
-        
-        :param rate_limit: Максимальное количество запросов
-        :param time_window: Временное окно в секундах
-        """
-        self.user_requests: Dict[int, Tuple[int, float]] = {}  # {user_id: (count, first_request_time)}
-        self.rate_limit = rate_limit
-        self.time_window = time_window
-    
-    async def process_update(
-        self, update: Update, handler: Callable, context: CallbackContext
-    ) -> Optional[Any]:
-        """
-        Обработка обновления перед вызовом обработчика
-        
-        :param update: Объект обновления от Telegram
-        :param handler: Обработчик, который должен быть вызван
-        :param context: Контекст бота
-        :return: Результат обработки или None, если запрос ограничен
+
+        :param limits: Лимиты по классам маршрутов: {класс: (запросов, окно в секундах)};
+            лимит 0 отключает ограничение для класса
+        :param default_class: Класс маршрутов, не отнесенных ни к одному классу
+        :param store: Хранилище состояния ведер, по умолчанию - в памяти процесса
         """
-        # Если update не содержит effective_user, пропускаем
-        if not update.effective_user:
-            return await handler(update, context)
-        
-        user_id = update.effective_user.id
-        current_time = time.time()
-        
-        # Проверяем, есть ли запись для данного пользователя
-        if user_id in self.user_requests:
-            count, first_request_time = self.user_requests[user_id]
-            
-            # Проверяем, не истекло ли временное окно
-            if current_time - first_request_time > self.time_window:
-                # Сбрасываем счетчик
-                self.user_requests[user_id] = (1, current_time)
+        if len(limits) > 1 << _CLASS_BITS:
+            raise ValueError(f"Не больше {1 << _CLASS_BITS} классов маршрутов")
+        if default_class not in limits:
+            raise ValueError(f"Нет лимита для класса по умолчанию: {default_class}")
+        self.default_class = default_class
+        self.store = store or MemoryStore()
+
+        self._classifier = RouteClassifier(list(limits), default_class)
+        self._classes: List[str] = self._classifier.classes
+        # (интервал между запросами, допустимое опережение) по номеру класса; None - без лимита
+        self._params: List[Optional[Tuple[float, float]]] = []
+        for limit, window in limits.values():
+            if limit <= 0:
+                self._params.append(None)
             else:
-                # Инкрементируем счетчик
-                count += 1
-                
-                # Если превышен лимит, отклоняем запрос
-                if count > self.rate_limit:
-                    await self._handle_rate_limit(update, context)
-                    return None
-                
-                self.user_requests[user_id] = (count, first_request_time)
-        else:
-            # Первый запрос от пользователя
-            self.user_requests[user_id] = (1, current_time)
-        
-        # Вызываем обработчик
-        return await handler(update, context)
-    
-    async def _handle_rate_limit(self, update: Update, context: CallbackContext) -> None:
-        """
-        Обработка превышения лимита запросов
-        
-        :param update: Объект обновления от Telegram
-        :param context: Контекст бота
-        """
-        if update.callback_query:
-            await update.callback_query.answer(
-                "Пожалуйста, не нажимайте кнопки так часто. Подождите немного.",
-                show_alert=True
-            )
-        elif update.message:
-            await update.message.reply_text(
-                "Вы отправляете слишком много сообщений. Пожалуйста, подождите немного."
-            ) 
\ No newline at end of file
+                interval = window / limit
+                self._params.append((interval, interval * (limit - 1)))
+
+        # Ключ ведра -> до какого момента не предупреждать повторно
+        self._warned: Dict[int, float] = {}
+        self._next_sweep = self.store.clock() + self.store.sweep_interval
+
+        # Счетчики
+        self.checks = 0
+        self.rejected = {name: 0 for name in self._classes}
+        self.swept = 0
+
+    def classify_routes(self, route_class: str, *routes: str) -> None:
+        """Отнести маршруты (имена callback-маршрутов и команд) к классу"""
+        self._classifier.classify_routes(route_class, *routes)
+
+    def route_class(self, update: Update) -> int:
+        """Номер класса маршрута обновления"""
+        return self._classifier.route_class(update)
+
+    def allow(self, user_id: int, class_index: int, now: Optional[float] = None) -> bool:
+        """Проверить лимит и, если запрос разрешен, забрать токен"""
+        params = self._params[class_index]
+        if params is None:
+            return True
+        interval, tolerance = params
+        # Ключ ведра: user_id и номер класса в младших битах
+        key = user_id << _CLASS_BITS | class_index
+        now = self.store.clock() if now is None else now
+        self.checks += 1
+        if now >= self._next_sweep:
+            self._sweep(now)
+        return self.store.acquire(key, now, interval, tolerance)
+
+    def check(self, update: Update, context: CallbackContext) -> None:
+        """Обработчик Dispatcher: пропустить обновление или остановить его обработку"""
+        user = update.effective_user
+        if user is None:
+            return
+        class_index = self.route_class(update)
+        now = self.store.clock()
+        if self.allow(user.id, class_index, now):
+            return
+
+        self.rejected[self._classes[class_index]] += 1
+        self._notify(update, user.id, class_index, now)
+        raise DispatcherHandlerStop()
+
+    def _notify(self, update: Update, user_id: int, class_index: int, now: float) -> None:
+        """Сообщить о превышении лимита один раз за период ограничения, не блокируя Dispatcher"""
+        key = user_id << _CLASS_BITS | class_index
+        _, tolerance = self._params[class_index]
+        warn = now >= self._warned.get(key, 0.0)
+        if warn:
+            # Следующий запрос будет разрешен, когда опережение снова станет допустимым
+            tat = self.store.get(key)
+            self._warned[key] = (tat if tat is not None else now) - tolerance
+        if update.callback_query is not None:
+            # На нажатие нужно ответить в любом случае, иначе кнопка останется в ожидании
+            if warn:
+                submit(run_sync(
+                    update.callback_query.answer,
+                    "Пожалуйста, не нажимайте кнопки так часто. Подождите немного.",
+                    show_alert=True,
+                ))
+            else:
+                submit(run_sync(update.callback_query.answer))
+        elif warn and update.message is not None:
+            submit(outbound.send(
+                update.effective_chat.id,
+                update.message.reply_text,
+                "Вы отправляете слишком много сообщений. Пожалуйста, подождите немного.",
+            ))
+
+    def _sweep(self, now: float) -> None:
+        """Удалить записи полных ведер и истекшие отметки предупреждений"""
+        self._next_sweep = now + self.store.sweep_interval
+        self.swept += self.store.sweep(now)
+        self._warned = {key: until for key, until in self._warned.items() if until > now}
+
+    def stats(self) -> Dict[str, Any]:
+        """Количество проверок, отклонений по классам и отслеживаемых записей"""
+        return {
+            "checks": self.checks,
+            "rejected": dict(self.rejected),
+            "tracked": self.store.size(),
+            "swept": self.swept,
+        }
@@ -0,0 +1,275 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import CallbackContext
+
+from utils.async_bridge import async_handler, run_sync, submit
+from utils.response_timer import get_response_timer
+
+logger = logging.getLogger(__name__)
+
+# Разделитель имени маршрута и аргументов в callback_data: "tariff:3"
+SEPARATOR = ":"
+
+Handler = Callable[[Update, CallbackContext], Any]
+# Текст подтверждения нажатия (всплывающее уведомление) или None - без текста
+AckText = Callable[[Update], Optional[str]]
+
+# Отметка выполняющегося обработчика в реестре повторных нажатий
+_RUNNING = -1.0
+
+
+def callback_data(route: str, *args: Any) -> str:
+    """Собрать callback_data для кнопки: имя маршрута и аргументы через двоеточие"""
+    return SEPARATOR.join([route, *map(str, args)])
+
+
+class RouteClassifier:
+    """Отнесение обновлений к классам по маршруту.
+
+    Маршрут - имя callback-маршрута (первая часть callback_data) или имя
+    команды. Обновления с маршрутом, не отнесенным ни к одному классу, и
+    прочие обновления попадают в класс по умолчанию.
+    """
+
+    def __init__(self, classes: List[str], default_class: str):
+        """
+        :param classes: Имена классов; номер класса - его позиция в списке
+        :param default_class: Класс маршрутов, не отнесенных ни к одному классу
+        """
+        if default_class not in classes:
+            raise ValueError(f"Неизвестный класс по умолчанию: {default_class}")
+        self.classes = list(classes)
+        self.default_class = default_class
+        self._class_index = {name: index for index, name in enumerate(self.classes)}
+        self._routes: Dict[str, int] = {}
+
+    def index(self, route_class: str) -> int:
+        """Номер класса по имени"""
+        return self._class_index[route_class]
+
+    def classify_routes(self, route_class: str, *routes: str) -> None:
+        """Отнести маршруты (имена callback-маршрутов и команд) к классу"""
+        index = self._class_index[route_class]
+        for route in routes:
+            self._routes[route] = index
+
+    def route_class(self, update: Update) -> int:
+        """Номер класса маршрута обновления"""
+        route = None
+        if update.callback_query is not None:
+            data = update.callback_query.data or ""
+            route = data.split(SEPARATOR, 1)[0]
+            if route not in self._routes:
+                # Старый формат "tariff_3": самое длинное известное имя-префикс
+                parts = data.split("_")
+                for end in range(len(parts) - 1, 0, -1):
+                    if "_".join(parts[:end]) in self._routes:
+                        route = "_".join(parts[:end])
+                        break
+        elif update.message is not None and update.message.text:
+            text = update.message.text
+            if text.startswith("/"):
+                route = text[1:].split(maxsplit=1)[0].split("@", 1)[0] if len(text) > 1 else None
+        index = self._routes.get(route)
+        return index if index is not None else self._class_index[self.default_class]
+
+
+class CallbackRouter:
+    """Маршрутизатор callback-запросов.
+
+    Вместо цепочки CallbackQueryHandler с регулярными выражениями используется
+    один обработчик: имя маршрута ищется в словаре, аргументы приводятся к
+    нужным типам один раз и передаются обработчику в context.args.
+    Некорректные данные отклоняются до вызова обработчика.
+
+    Каждое нажатие подтверждается (answerCallbackQuery) сразу при разборе,
+    не дожидаясь обработчика, который работает в дорожке пользователя.
+    Задержки подтверждения, показа экрана и работы обработчика учитываются
+    в общем ResponseTimer.
+
+    Повторные нажатия той же кнопки схлопываются: пока обработчик для пары
+    (user_id, callback_data) выполняется, повтор только убирает индикатор
+    загрузки на кнопке. Для маршрутов, отмеченных idempotent, повтор
+    поглощается еще dedupe_window секунд после завершения обработчика;
+    повторное нажатие остальных кнопок (обновить, следующая страница)
+    после завершения выполняется. Завершение отмечает задание, поставленное
+    в дорожку пользователя сразу после обработчика (без дорожек отметка
+    ставится сразу).
+    """
+
+    def __init__(self, dedupe_window: float = 1.0):
+        """
+        :param dedupe_window: Сколько секунд после завершения обработчика idempotent-маршрута
+            считать повторное нажатие той же кнопки дубликатом
+        """
+        self.dedupe_window = dedupe_window
+        self._routes: Dict[
+            str, Tuple[Handler, Tuple[Callable[[str], Any], ...], Optional[AckText], bool]
+        ] = {}
+        # (user_id, callback_data) -> момент завершения обработчика или _RUNNING;
+        # пишется из потока Dispatcher и из цикла событий, поэтому под блокировкой
+        self._inflight: Dict[Tuple[int, str], float] = {}
+        self._inflight_lock = threading.Lock()
+        self._dispatches_since_sweep = 0
+        self.hits: Dict[str, int] = {}
+        self.rejected = 0
+        self.collapsed = 0
+
+    def add(
+        self,
+        route: str,
+        handler: Handler,
+        *arg_types: Callable[[str], Any],
+        ack_text: Optional[AckText] = None,
+        idempotent: bool = False,
+    ) -> None:
+        """
+        Зарегистрировать маршрут
+
+        :param route: Имя маршрута (первая часть callback_data)
+        :param handler: Обработчик (update, context)
+        :param arg_types: Типы аргументов, например int или str
+        :param ack_text: Текст уведомления при подтверждении нажатия, например об
+            отказе в доступе; вызывается в потоке Dispatcher и должен быть быстрым
+        :param idempotent: Повтор не меняет результат (например, повторная отправка того же
+            файла), поэтому повторное нажатие сразу после завершения тоже не выполняется
+        """
+        if SEPARATOR in route:
+            raise ValueError(f"Имя маршрута не может содержать '{SEPARATOR}': {route}")
+        if route in self._routes:
+            raise ValueError(f"Маршрут уже зарегистрирован: {route}")
+        self._routes[route] = (handler, arg_types, ack_text, idempotent)
+        self.hits[route] = 0
+
+    def resolve(self, data: Optional[str]) -> Optional[Tuple[str, List[Any]]]:
+        """Найти маршрут и разобрать аргументы; None, если данные некорректны"""
+        if not data:
+            return None
+        route, *raw_args = data.split(SEPARATOR)
+        entry = self._routes.get(route)
+        if entry is None and not raw_args:
+            route, raw_args = self._resolve_legacy(data)
+            entry = self._routes.get(route)
+        if entry is None:
+            return None
+
+        _, arg_types, _, _ = entry
+        if len(raw_args) != len(arg_types):
+            return None
+        try:
+            args = [convert(value) for convert, value in zip(arg_types, raw_args)]
+        except ValueError:
+            return None
+        return route, args
+
+    def _resolve_legacy(self, data: str) -> Tuple[str, List[str]]:
+        """Разобрать старый формат "tariff_3" у кнопок, отправленных до перехода на двоеточие"""
+        parts = data.split("_")
+        # Самое длинное зарегистрированное имя, являющееся префиксом данных
+        for end in range(len(parts) - 1, 0, -1):
+            route = "_".join(parts[:end])
+            if route in self._routes:
+                return route, parts[end:]
+        return data, []
+
+    def dispatch(self, update: Update, context: CallbackContext) -> None:
+        """Единый обработчик callback-запросов для Dispatcher"""
+        query = update.callback_query
+        timer = get_response_timer()
+        timer.received(update.update_id)
+        resolved = self.resolve(query.data)
+        if resolved is None:
+            self.rejected += 1
+            logger.warning("Некорректные callback_data от %s: %r", update.effective_user.id, query.data)
+            self.answer_only(update, context)
+            return
+
+        route, args = resolved
+        handler, _, ack_text, idempotent = self._routes[route]
+        key = (update.effective_user.id, query.data)
+        with self._inflight_lock:
+            finished = self._inflight.get(key)
+            duplicate = finished is not None and (
+                finished == _RUNNING or time.monotonic() - finished < self.dedupe_window
+            )
+            if not duplicate:
+                self._inflight[key] = _RUNNING
+                self._maybe_sweep()
+        if duplicate:
+            # Повторное нажатие во время обработки (или сразу после idempotent-обработчика)
+            self.collapsed += 1
+            self.answer_only(update, context)
+            return
+
+        self.hits[route] += 1
+        # Подтверждаем нажатие сразу, обработчик покажет экран позже
+        submit(self._acknowledge(update, ack_text(update) if ack_text is not None else None))
+        context.args = args
+        self._start(update, context)
+        try:
+            handler(update, context)
+        finally:
+            self._release(update, context, idempotent)
+
+    @staticmethod
+    async def _acknowledge(update: Update, text: Optional[str] = None) -> None:
+        """Подтвердить нажатие и учесть задержку подтверждения"""
+        try:
+            await run_sync(update.callback_query.answer, text)
+        except TelegramError as e:
+            # Нажатие устарело (например, ждало в очереди дольше 15 секунд)
+            logger.debug("Не удалось подтвердить нажатие: %s", e)
+            return
+        get_response_timer().acked(update.update_id)
+
+    @async_handler
+    async def _start(self, update: Update, context: CallbackContext) -> None:
+        """Отметить начало обработчика: задание стоит в дорожке пользователя перед ним"""
+        get_response_timer().started(update.update_id)
+
+    @async_handler
+    async def _release(self, update: Update, context: CallbackContext, idempotent: bool) -> None:
+        """Отметить завершение обработчика: задание стоит в дорожке пользователя после него"""
+        key = (update.effective_user.id, update.callback_query.data)
+        with self._inflight_lock:
+            if idempotent and self.dedupe_window > 0:
+                # Запоздавшие повторы поглощаются еще dedupe_window секунд
+                self._inflight[key] = time.monotonic()
+            else:
+                self._inflight.pop(key, None)
+        get_response_timer().finished(update.update_id)
+
+    def _maybe_sweep(self) -> None:
+        """Время от времени удалять из реестра завершенные нажатия старше dedupe_window.
+
+        Вызывается под self._inflight_lock.
+        """
+        self._dispatches_since_sweep += 1
+        if self._dispatches_since_sweep < 1000:
+            return
+        self._dispatches_since_sweep = 0
+        now = time.monotonic()
+        expired = [
+            key for key, finished in self._inflight.items()
+            if finished != _RUNNING and now - finished >= self.dedupe_window
+        ]
+        for key in expired:
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    def answer_only(update: Update, context: CallbackContext) -> None:
+        """Только убрать индикатор загрузки на кнопке, не блокируя поток Dispatcher"""
+        submit(CallbackRouter._acknowledge(update))
+
+    @staticmethod
+    def ignore(update: Update, context: CallbackContext) -> None:
+        """Обработчик кнопок без действия: нажатие уже подтверждено маршрутизатором"""
+
+    def stats(self) -> Dict[str, Any]:
+        """Количество срабатываний маршрутов, отклоненных и схлопнутых повторных нажатий"""
+        return {"hits": dict(self.hits), "rejected": self.rejected, "collapsed": self.collapsed}
@@ -0,0 +1,332 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from telegram import Bot
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError, Unauthorized
+
+from bot.keyboards.keyboards import Keyboards
+from database.models import DatabaseManager
+from utils import outbound
+
+logger = logging.getLogger(__name__)
+
+# Результаты отправки получателю
+SENT = "sent"
+BLOCKED = "blocked"
+FAILED = "failed"
+RETRYABLE = "retryable"
+
+# Пауза перед повторной отправкой получателям с временной ошибкой
+RETRY_DELAY = 10.0
+
+
+class BroadcastService:
+    """Фоновые рассылки с контрольной точкой.
+
+    Задание рассылки хранится в БД: курсор по user_id сдвигается после каждой
+    пачки, а результат отправки записывается для каждого получателя сразу.
+    Получатели с записанным результатом пропускаются, поэтому после
+    перезапуска рассылка продолжается с места остановки без повторов.
+    Сообщения отправляются через общую очередь исходящих запросов с
+    ограниченным числом одновременных отправок и уступают интерактивным
+    ответам. Администратор видит ход рассылки в одном сообщении, которое
+    обновляется раз в несколько секунд.
+
+    Методы вызываются из общего цикла событий (async_bridge).
+    """
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        concurrency: int = 10,
+        progress_interval: float = 5.0,
+        batch_size: int = 200,
+        max_attempts: int = 3,
+    ):
+        """
+        Инициализация сервиса рассылок
+
+        :param db_manager: Менеджер базы данных
+        :param concurrency: Сколько сообщений одной рассылки отправляется одновременно
+        :param progress_interval: Как часто (в секундах) обновлять сообщение с ходом рассылки
+        :param batch_size: Сколько получателей читается из БД за раз
+        :param max_attempts: Сколько раз пытаться отправить получателю с временной ошибкой
+        """
+        self.db_manager = db_manager
+        self.concurrency = max(1, concurrency)
+        self.progress_interval = progress_interval
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+
+        # Метрики обновляются только в потоке цикла событий
+        self.totals = {SENT: 0, BLOCKED: 0, FAILED: 0, RETRYABLE: 0}
+
+    async def start(self, bot: Bot, admin_id: int, text: str) -> int:
+        """Создать задание рассылки всем пользователям и запустить его в фоне.
+
+        :return: id задания
+        """
+        total = await self.db_manager.count_users()
+        job_id = await self.db_manager.create_broadcast(admin_id, text, total)
+        job = {
+            "id": job_id,
+            "admin_id": admin_id,
+            "text": text,
+            "cursor": 0,
+            "total": total,
+            "progress_chat_id": None,
+            "progress_message_id": None,
+        }
+        progress = _Progress(job, {})
+        message = await outbound.send(
+            admin_id,
+            bot.send_message,
+            chat_id=admin_id,
+            text=progress.render(),
+            parse_mode="HTML",
+        )
+        job["progress_chat_id"] = admin_id
+        job["progress_message_id"] = message.message_id
+        await self.db_manager.set_broadcast_progress_message(job_id, admin_id, message.message_id)
+        self._spawn(job, progress, bot)
+        return job_id
+
+    async def resume(self, bot: Bot) -> int:
+        """Продолжить рассылки, прерванные остановкой бота.
+
+        :return: Количество продолженных заданий
+        """
+        jobs = await self.db_manager.get_unfinished_broadcasts()
+        for job in jobs:
+            if job["id"] in self._tasks:
+                continue
+            counts = await self.db_manager.get_broadcast_counts(job["id"])
+            logger.info(
+                "Продолжение рассылки #%d: обработано %d из %d",
+                job["id"], sum(counts.values()), job["total"],
+            )
+            self._spawn(job, _Progress(job, counts), bot)
+        return len(jobs)
+
+    def _spawn(self, job: Dict[str, Any], progress: "_Progress", bot: Bot) -> None:
+        """Запустить задачу рассылки"""
+        job_id = job["id"]
+        task = asyncio.ensure_future(self._run(job, progress, bot))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda t: self._job_done(job_id, t))
+
+    def _job_done(self, job_id: int, task: asyncio.Task) -> None:
+        """Убрать завершившуюся задачу и записать в лог ее ошибку"""
+        self._tasks.pop(job_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                "Рассылка #%d прервана ошибкой, продолжится после перезапуска: %s",
+                job_id, task.exception(), exc_info=task.exception(),
+            )
+
+    async def _run(self, job: Dict[str, Any], progress: "_Progress", bot: Bot) -> None:
+        """Выполнить рассылку: основной проход по курсору и повторы временных ошибок"""
+        job_id = job["id"]
+        reporter = asyncio.ensure_future(self._report_progress(job, progress, bot))
+        try:
+            await self._deliver_pass(
+                job, progress, bot,
+                lambda after: self.db_manager.get_broadcast_batch(job_id, after, self.batch_size),
+                start_after=job["cursor"],
+                checkpoint=True,
+            )
+            for _ in range(self.max_attempts - 1):
+                if self._stopping.is_set() or not progress.counts[RETRYABLE]:
+                    break
+                await self._sleep(RETRY_DELAY)
+                await self._deliver_pass(
+                    job, progress, bot,
+                    lambda after: self.db_manager.get_broadcast_retryable(
+                        job_id, self.max_attempts, after, self.batch_size
+                    ),
+                    previous=RETRYABLE,
+                )
+            if self._stopping.is_set():
+                progress.paused = True
+                return
+            await self.db_manager.finish_broadcast(job_id)
+            progress.finished = True
+            logger.info("Рассылка #%d завершена: %s", job_id, progress.counts)
+        finally:
+            reporter.cancel()
+            if progress.finished or progress.paused:
+                await self._update_progress(job, progress, bot)
+
+    async def _deliver_pass(
+        self,
+        job: Dict[str, Any],
+        progress: "_Progress",
+        bot: Bot,
+        fetch: Callable[[int], Awaitable[List[int]]],
+        start_after: int = 0,
+        checkpoint: bool = False,
+        previous: Optional[str] = None,
+    ) -> None:
+        """Пройти получателей по возрастанию user_id пачками.
+
+        :param fetch: Следующая пачка получателей после указанного user_id
+        :param start_after: С какого user_id начинать
+        :param checkpoint: Сдвигать контрольную точку задания после каждой пачки
+        :param previous: Прошлый результат получателей пачки (при повторе)
+        """
+        after = start_after
+        while not self._stopping.is_set():
+            batch = await fetch(after)
+            if not batch:
+                return
+            recipients = iter(batch)
+
+            async def worker() -> None:
+                for user_id in recipients:
+                    if self._stopping.is_set():
+                        return
+                    await self._deliver(job, progress, bot, user_id, previous)
+
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(batch)))))
+            if self._stopping.is_set():
+                # Пачка обработана не полностью: курсор остается на месте
+                return
+            after = batch[-1]
+            if checkpoint:
+                await self.db_manager.advance_broadcast_cursor(job["id"], after)
+
+    async def _deliver(
+        self, job: Dict[str, Any], progress: "_Progress", bot: Bot, user_id: int, previous: Optional[str]
+    ) -> None:
+        """Отправить сообщение одному получателю и сразу записать результат"""
+        error = None
+        try:
+            await outbound.send(
+                user_id,
+                bot.send_message,
+                chat_id=user_id,
+                text=f"📢 <b>Уведомление от EarthVPN</b>\n\n{job['text']}",
+                parse_mode="HTML",
+                bulk=True,
+            )
+            status = SENT
+        except Unauthorized as e:
+            # Пользователь заблокировал бота или удалил аккаунт
+            status, error = BLOCKED, str(e)
+        except BadRequest as e:
+            status, error = FAILED, str(e)
+        except (RetryAfter, NetworkError) as e:
+            status, error = RETRYABLE, str(e)
+        except TelegramError as e:
+            status, error = FAILED, str(e)
+        except Exception as e:
+            # Непредвиденная ошибка одного получателя не должна прерывать рассылку
+            logger.warning("Рассылка #%d: ошибка отправки пользователю %d: %r", job["id"], user_id, e)
+            status, error = FAILED, repr(e)
+
+        await self.db_manager.record_broadcast_result(job["id"], user_id, status, error)
+        progress.record(status, previous)
+        self.totals[status] += 1
+
+    async def _report_progress(self, job: Dict[str, Any], progress: "_Progress", bot: Bot) -> None:
+        """Периодически обновлять сообщение администратора с ходом рассылки"""
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            await self._update_progress(job, progress, bot)
+
+    async def _update_progress(self, job: Dict[str, Any], progress: "_Progress", bot: Bot) -> None:
+        """Отредактировать сообщение с ходом рассылки, если текст изменился"""
+        if job["progress_message_id"] is None:
+            return
+        text = progress.render()
+        if text == progress.last_text:
+            return
+        try:
+            await outbound.call(
+                bot.edit_message_text,
+                chat_id=job["progress_chat_id"],
+                message_id=job["progress_message_id"],
+                text=text,
+                parse_mode="HTML",
+                reply_markup=Keyboards.back_keyboard("admin") if progress.finished else None,
+            )
+            progress.last_text = text
+        except TelegramError as e:
+            logger.debug("Не удалось обновить ход рассылки #%d: %s", job["id"], e)
+
+    async def _sleep(self, delay: float) -> None:
+        """Подождать, прервавшись при остановке сервиса"""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """Остановить рассылки: дождаться уже начатых отправок и сохранить результаты.
+
+        :param timeout: Сколько секунд ждать, None - без ограничения
+        """
+        self._stopping.set()
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики рассылок: активные задания и результаты отправки"""
+        return {"running": len(self._tasks), **self.totals}
+
+
+class _Progress:
+    """Ход одной рассылки для сообщения администратору"""
+
+    def __init__(self, job: Dict[str, Any], counts: Dict[str, int]):
+        self.job_id = job["id"]
+        self.total = job["total"]
+        self.counts = {status: counts.get(status, 0) for status in (SENT, BLOCKED, FAILED, RETRYABLE)}
+        self.started = time.monotonic()
+        self.processed_at_start = sum(self.counts.values())
+        self.finished = False
+        self.paused = False
+        self.last_text: Optional[str] = None
+
+    def record(self, status: str, previous: Optional[str]) -> None:
+        """Учесть результат отправки (previous - прошлый результат при повторе)"""
+        if previous is not None:
+            self.counts[previous] -= 1
+        self.counts[status] += 1
+
+    def render(self) -> str:
+        """Текст сообщения с ходом рассылки"""
+        processed = sum(self.counts.values())
+        if self.finished:
+            title = f"✅ <b>Рассылка #{self.job_id} завершена</b>"
+        elif self.paused:
+            title = f"⏸ <b>Рассылка #{self.job_id} приостановлена</b> и продолжится после перезапуска"
+        else:
+            title = f"📨 <b>Рассылка #{self.job_id}</b>"
+        lines = [
+            title,
+            "",
+            f"Обработано: {processed} из {self.total}",
+            f"Доставлено: {self.counts[SENT]}",
+            f"Заблокировали бота: {self.counts[BLOCKED]}",
+            f"Ошибки: {self.counts[FAILED]}",
+        ]
+        if self.counts[RETRYABLE]:
+            lines.append(f"Ожидают повтора: {self.counts[RETRYABLE]}")
+        if not self.finished and not self.paused:
+            elapsed = time.monotonic() - self.started
+            rate = (processed - self.processed_at_start) / elapsed if elapsed > 0 else 0.0
+            if rate > 0:
+                left = max(0, self.total - processed) / rate
+                lines.append(f"Скорость: {rate:.1f} сообщ./с, осталось ~{left / 60:.0f} мин")
+        return "\n".join(lines)
@@ -10,6 +10,74 @@ ADMIN_IDS = list(map(int, os.getenv("ADMIN_IDS", "").split(",")))
 DATABASE_PATH = os.getenv("DATABASE_PATH", "./database.db")
 PAYMENT_TOKEN = os.getenv("PAYMENT_TOKEN", "")
 
+# Настройки базы данных
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_WAL_MODE = os.getenv("DB_WAL_MODE", "0").lower() in ("1", "true", "yes")
+DB_WRITE_QUEUE = os.getenv("DB_WRITE_QUEUE", "0").lower() in ("1", "true", "yes")
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "64"))
+DB_WRITE_BATCH_DELAY_MS = float(os.getenv("DB_WRITE_BATCH_DELAY_MS", "5"))
+# Максимальная задержка записи last_activity в секундах (0 - писать сразу)
+DB_ACTIVITY_FLUSH_INTERVAL = float(os.getenv("DB_ACTIVITY_FLUSH_INTERVAL", "5"))
+# Кэш активных подписок: максимум записей (0 - без кэша) и время жизни записи "нет подписки"
+SUBSCRIPTION_CACHE_SIZE = int(os.getenv("SUBSCRIPTION_CACHE_SIZE", "10000"))
+SUBSCRIPTION_CACHE_TTL = float(os.getenv("SUBSCRIPTION_CACHE_TTL", "300"))
+
+# Настройки обработки обновлений
+# Потоки для блокирующих вызовов Telegram API из общего цикла событий
+BOT_IO_THREADS = int(os.getenv("BOT_IO_THREADS", "16"))
+# Дорожки планировщика: обновления одного пользователя идут по порядку (0 - без упорядочивания)
+BOT_UPDATE_LANES = int(os.getenv("BOT_UPDATE_LANES", "32"))
+BOT_LANE_QUEUE_SIZE = int(os.getenv("BOT_LANE_QUEUE_SIZE", "100"))
+# Сколько секунд при остановке ждать дообработки уже принятых обновлений
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "20"))
+
+# Лимиты исходящих запросов к Bot API: всего в секунду, сообщений в чат в секунду,
+# сколько сообщений в чат можно отправить подряд и сколько раз повторять после 429
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", "3"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+
+# Рассылки: сколько сообщений отправлять одновременно и как часто обновлять ход рассылки (с)
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "5"))
+
+# Учет сообщений бота для удаления при смене экрана: сообщений на пользователя и пользователей в памяти
+MESSAGE_TRACKER_PER_USER = int(os.getenv("MESSAGE_TRACKER_PER_USER", "10"))
+MESSAGE_TRACKER_MAX_USERS = int(os.getenv("MESSAGE_TRACKER_MAX_USERS", "200000"))
+
+# Ограничение частоты запросов пользователя: сколько запросов за RATE_LIMIT_WINDOW секунд
+# для навигации по меню, оплаты и админки (0 - без ограничения)
+RATE_LIMIT_WINDOW = float(os.getenv("RATE_LIMIT_WINDOW", "60"))
+RATE_LIMIT_MENU = int(os.getenv("RATE_LIMIT_MENU", "60"))
+RATE_LIMIT_PAYMENT = int(os.getenv("RATE_LIMIT_PAYMENT", "15"))
+RATE_LIMIT_ADMIN = int(os.getenv("RATE_LIMIT_ADMIN", "0"))
+# Где хранить состояние лимитов: memory - в процессе, sqlite - общий файл для всех процессов бота
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", "./rate_limits.db")
+
+# Прием обновлений с приоритетами: при перегрузке второстепенные экраны ждут или сбрасываются.
+# Перегрузка - когда в дорожках не меньше INTAKE_MAX_BACKLOG незавершенных обновлений
+INTAKE_QUEUE_SIZE = int(os.getenv("INTAKE_QUEUE_SIZE", "1000"))
+INTAKE_MAX_BACKLOG = int(os.getenv("INTAKE_MAX_BACKLOG", "32"))
+# Сколько секунд обновление может ждать при перегрузке до сброса: обычные и второстепенные экраны
+INTAKE_NORMAL_MAX_WAIT = float(os.getenv("INTAKE_NORMAL_MAX_WAIT", "10"))
+INTAKE_LOW_MAX_WAIT = float(os.getenv("INTAKE_LOW_MAX_WAIT", "2"))
+
+# Сколько секунд после обработки нажатия повтор той же кнопки считается дубликатом
+# (только для маршрутов с повторяемым результатом, например скачивания конфигурации)
+CALLBACK_DEDUPE_WINDOW = float(os.getenv("CALLBACK_DEDUPE_WINDOW", "1"))
+
+# Настройки режима webhook (python main.py --mode webhook)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # публичный адрес, например https://example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8443")))
+# Пустой секрет - сгенерировать новый при каждом запуске
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_INTAKE_SIZE = int(os.getenv("WEBHOOK_INTAKE_SIZE", "1000"))
+
 # Тарифные планы VPN
 TARIFFS = [
     {
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.loop_thread import LoopThread
+
+# Функция записи пачки отметок: [(last_activity в секундах unix, user_id), ...]
+FlushFn = Callable[[List[Tuple[int, int]]], Awaitable[None]]
+
+
+class ActivityBuffer:
+    """Буфер отложенной записи last_activity.
+
+    Повторные отметки одного пользователя схлопываются в памяти, а в базу
+    уходит одна пачка UPDATE раз в max_staleness секунд и при остановке.
+    """
+
+    def __init__(self, flush_fn: FlushFn, loop_thread: LoopThread, max_staleness: float = 5.0):
+        """
+        Инициализация буфера активности
+
+        :param flush_fn: Корутина, записывающая пачку отметок в базу
+        :param loop_thread: Поток, в цикле которого работает периодический сброс
+        :param max_staleness: Максимальная задержка записи отметки в секундах
+        """
+        self.flush_fn = flush_fn
+        self.loop_thread = loop_thread
+        self.max_staleness = max_staleness
+
+        self._lock = threading.Lock()
+        self._pending: Dict[int, float] = {}
+        self._task: Optional[Future] = None
+        self._closed = False
+
+        # Счетчики
+        self.touches = 0
+        self.merged = 0
+        self.flushed = 0
+        self.flushes = 0
+
+    def start(self) -> None:
+        """Запустить периодический сброс"""
+        self.loop_thread.start()
+        self._task = self.loop_thread.submit(self._run())
+
+    def touch(self, user_id: int) -> None:
+        """Отметить активность пользователя без ожидания записи"""
+        now = time.time()
+        with self._lock:
+            self.touches += 1
+            if user_id in self._pending:
+                self.merged += 1
+            self._pending[user_id] = now
+
+    async def _run(self) -> None:
+        """Периодически сбрасывать буфер"""
+        while True:
+            await asyncio.sleep(self.max_staleness)
+            try:
+                await self.flush()
+            except Exception:
+                # Отметки вернулись в буфер, попробуем в следующий раз
+                pass
+
+    async def flush(self) -> int:
+        """Записать накопленные отметки одной пачкой"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        rows = [(int(ts), user_id) for user_id, ts in pending.items()]
+        try:
+            await self.flush_fn(rows)
+        except BaseException:
+            # Возвращаем отметки, не затирая более свежие
+            with self._lock:
+                for user_id, ts in pending.items():
+                    if self._pending.get(user_id, 0) < ts:
+                        self._pending[user_id] = ts
+            raise
+
+        with self._lock:
+            self.flushed += len(rows)
+            self.flushes += 1
+        return len(rows)
+
+    async def close(self) -> None:
+        """Остановить периодический сброс и записать остаток"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        """Статистика буфера"""
+        with self._lock:
+            return {
+                "touches": self.touches,
+                "merged": self.merged,
+                "flushed": self.flushed,
+                "flushes": self.flushes,
+                "pending": len(self._pending),
+            }
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class ExpiringLRUCache:
+    """Потокобезопасный LRU-кэш, у каждой записи которого свой момент истечения.
+
+    Размер ограничен max_size записями: при переполнении вытесняется
+    давно не использованная запись. Для защиты от гонки «чтение старого
+    значения - инвалидация - запись старого значения в кэш» используется
+    поколение: set() с устаревшим поколением игнорируется.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        """
+        Инициализация кэша
+
+        :param max_size: Максимальное количество записей
+        """
+        self.max_size = max(1, max_size)
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._generation = 0
+
+        # Счетчики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        """Текущее поколение кэша; запоминается до чтения из базы"""
+        return self._generation
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Получить значение; истекшая запись считается промахом"""
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                value, expires_at = item
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, expires_at: float, generation: Optional[int] = None) -> None:
+        """Сохранить значение до момента expires_at (unix time)"""
+        if expires_at <= time.time():
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                # Пока читали из базы, данные успели измениться
+                return
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Удалить запись после изменения данных"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Очистить кэш"""
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Статистика кэша"""
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,263 @@
+import sqlite3
+from typing import List, Sequence, Tuple
+
+# Текущее время в секундах unix, вычисляемое на стороне SQLite
+NOW_EPOCH_SQL = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+# Упорядоченный список миграций: (версия, описание, SQL-запросы).
+# Версия хранится в PRAGMA user_version. Запросы должны быть идемпотентными,
+# чтобы повторный запуск после сбоя не ломал базу.
+MIGRATIONS: List[Tuple[int, str, Sequence[str]]] = [
+    (
+        1,
+        "Индексы для выборок подписок",
+        [
+            # Покрывающий индекс: get_active_subscription читает строку целиком из индекса
+            """
+            CREATE INDEX IF NOT EXISTS idx_subscriptions_user_active_end
+            ON subscriptions (user_id, is_active, end_date, tariff_id, start_date)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_subscriptions_user_start
+            ON subscriptions (user_id, start_date)
+            """,
+        ],
+    ),
+    (
+        2,
+        "Индексы для истории платежей и конфигураций",
+        [
+            """
+            CREATE INDEX IF NOT EXISTS idx_payments_user_created
+            ON payments (user_id, created_at)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_configs_user_created
+            ON configs (user_id, created_at)
+            """,
+        ],
+    ),
+    (
+        3,
+        "Индекс для списка пользователей",
+        [
+            """
+            CREATE INDEX IF NOT EXISTS idx_users_registration_date
+            ON users (registration_date)
+            """,
+        ],
+    ),
+    (
+        4,
+        "Даты в секундах unix (INTEGER) вместо текстовых TIMESTAMP",
+        [
+            # Пользователи: registration_date и last_activity записывались как CURRENT_TIMESTAMP (UTC)
+            "DROP TABLE IF EXISTS users_new",
+            f"""
+            CREATE TABLE users_new (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_name TEXT,
+                last_name TEXT,
+                registration_date INTEGER DEFAULT ({NOW_EPOCH_SQL}),
+                last_activity INTEGER DEFAULT ({NOW_EPOCH_SQL})
+            )
+            """,
+            """
+            INSERT INTO users_new
+            SELECT user_id, username, first_name, last_name,
+                   CAST(strftime('%s', registration_date) AS INTEGER),
+                   CAST(strftime('%s', last_activity) AS INTEGER)
+            FROM users
+            """,
+            "DROP TABLE users",
+            "ALTER TABLE users_new RENAME TO users",
+            """
+            CREATE INDEX IF NOT EXISTS idx_users_registration_date
+            ON users (registration_date)
+            """,
+            # Подписки: start_date в UTC, а end_date записывалась по локальному времени сервера
+            "DROP TABLE IF EXISTS subscriptions_new",
+            f"""
+            CREATE TABLE subscriptions_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                tariff_id INTEGER,
+                start_date INTEGER DEFAULT ({NOW_EPOCH_SQL}),
+                end_date INTEGER,
+                is_active BOOLEAN DEFAULT 1,
+                FOREIGN KEY (user_id) REFERENCES users(user_id)
+            )
+            """,
+            """
+            INSERT INTO subscriptions_new
+            SELECT id, user_id, tariff_id,
+                   CAST(strftime('%s', start_date) AS INTEGER),
+                   CAST(strftime('%s', end_date, 'utc') AS INTEGER),
+                   is_active
+            FROM subscriptions
+            """,
+            "DROP TABLE subscriptions",
+            "ALTER TABLE subscriptions_new RENAME TO subscriptions",
+            """
+            CREATE INDEX IF NOT EXISTS idx_subscriptions_user_active_end
+            ON subscriptions (user_id, is_active, end_date, tariff_id, start_date)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_subscriptions_user_start
+            ON subscriptions (user_id, start_date)
+            """,
+            # Платежи
+            "DROP TABLE IF EXISTS payments_new",
+            f"""
+            CREATE TABLE payments_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                tariff_id INTEGER,
+                amount REAL,
+                payment_method TEXT,
+                payment_id TEXT,
+                status TEXT,
+                created_at INTEGER DEFAULT ({NOW_EPOCH_SQL}),
+                FOREIGN KEY (user_id) REFERENCES users(user_id)
+            )
+            """,
+            """
+            INSERT INTO payments_new
+            SELECT id, user_id, tariff_id, amount, payment_method, payment_id, status,
+                   CAST(strftime('%s', created_at) AS INTEGER)
+            FROM payments
+            """,
+            "DROP TABLE payments",
+            "ALTER TABLE payments_new RENAME TO payments",
+            """
+            CREATE INDEX IF NOT EXISTS idx_payments_user_created
+            ON payments (user_id, created_at)
+            """,
+            # Конфигурации
+            "DROP TABLE IF EXISTS configs_new",
+            f"""
+            CREATE TABLE configs_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                config_type TEXT,
+                config_data TEXT,
+                created_at INTEGER DEFAULT ({NOW_EPOCH_SQL}),
+                FOREIGN KEY (user_id) REFERENCES users(user_id)
+            )
+            """,
+            """
+            INSERT INTO configs_new
+            SELECT id, user_id, config_type, config_data,
+                   CAST(strftime('%s', created_at) AS INTEGER)
+            FROM configs
+            """,
+            "DROP TABLE configs",
+            "ALTER TABLE configs_new RENAME TO configs",
+            """
+            CREATE INDEX IF NOT EXISTS idx_configs_user_created
+            ON configs (user_id, created_at)
+            """,
+        ],
+    ),
+    (
+        5,
+        "Связь платежа с созданной по нему подпиской",
+        [
+            "ALTER TABLE payments ADD COLUMN subscription_id INTEGER",
+        ],
+    ),
+    (
+        6,
+        "Задания рассылки с контрольной точкой и результатом по каждому получателю",
+        [
+            f"""
+            CREATE TABLE IF NOT EXISTS broadcast_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                admin_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'running',
+                cursor INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                progress_chat_id INTEGER,
+                progress_message_id INTEGER,
+                created_at INTEGER DEFAULT ({NOW_EPOCH_SQL}),
+                finished_at INTEGER
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS broadcast_recipients (
+                job_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 1,
+                error TEXT,
+                PRIMARY KEY (job_id, user_id)
+            ) WITHOUT ROWID
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status
+            ON broadcast_jobs (status)
+            """,
+        ],
+    ),
+    (
+        7,
+        "Сообщения бота, которые нужно удалить при смене экрана (сохраняются при остановке)",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS bot_messages (
+                user_id INTEGER PRIMARY KEY,
+                message_ids BLOB NOT NULL,
+                updated_at INTEGER NOT NULL
+            )
+            """,
+        ],
+    ),
+]
+
+# Версия схемы после применения всех миграций
+LATEST_SCHEMA_VERSION = max(version for version, _, _ in MIGRATIONS)
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Текущая версия схемы"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn: sqlite3.Connection) -> List[int]:
+    """Применить все миграции новее текущей версии схемы.
+
+    Каждая миграция выполняется в своей транзакции вместе с повышением
+    user_version, поэтому частично примененных миграций не бывает.
+    Возвращает список примененных версий.
+    """
+    applied = []
+    current = get_schema_version(conn)
+    for version, _, statements in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version <= current:
+            continue
+        conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+def find_unindexed_queries(conn: sqlite3.Connection, queries: Sequence[Tuple[str, tuple]]) -> List[str]:
+    """Вернуть запросы, план которых содержит полный просмотр таблицы или сортировку без индекса"""
+    problems = []
+    for query, params in queries:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        for row in plan:
+            detail = row[-1]
+            full_scan = detail.startswith("SCAN") and "USING" not in detail
+            if full_scan or "TEMP B-TREE" in detail:
+                problems.append(f"{' '.join(query.split())} -> {detail}")
+    return problems
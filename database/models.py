@@ -1,20 +1,195 @@
 import sqlite3
-import aiosqlite
 import json
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional, Union
+import logging
+import time
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+from database.activity import ActivityBuffer
+from database.cache import ExpiringLRUCache
+from database.migrations import (
+    LATEST_SCHEMA_VERSION,
+    NOW_EPOCH_SQL,
+    apply_migrations,
+    find_unindexed_queries,
+    get_schema_version,
+)
+from database.pool import ConnectionPool
+from database.writer import WriteOp, WriteQueue
+from utils.loop_thread import LoopThread
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
 
 
 class DatabaseManager:
-    def __init__(self, db_path: str):
+    # Запросы DatabaseManager, планы которых проверяются на использование индексов
+    QUERY_PLAN_CHECKS = [
+        ("SELECT * FROM users WHERE user_id = ?", (0,)),
+        ("UPDATE users SET last_activity = ? WHERE user_id = ?", (0, 0)),
+        (
+            f"""
+            SELECT * FROM subscriptions
+            WHERE user_id = ? AND is_active = 1 AND end_date > {NOW_EPOCH_SQL}
+            ORDER BY end_date DESC LIMIT 1
+            """,
+            (0,),
+        ),
+        ("SELECT user_id FROM subscriptions WHERE id = ?", (0,)),
+        ("UPDATE subscriptions SET is_active = 0 WHERE id = ?", (0,)),
+        ("UPDATE payments SET payment_id = ?, status = ? WHERE id = ?", ("", "", 0)),
+        (
+            "UPDATE payments SET payment_id = ?, status = 'success' WHERE id = ? AND status = 'pending'",
+            ("", 0),
+        ),
+        ("SELECT user_id, tariff_id, status, subscription_id FROM payments WHERE id = ?", (0,)),
+        ("SELECT * FROM payments WHERE id = ?", (0,)),
+        ("SELECT * FROM configs WHERE user_id = ? ORDER BY created_at DESC", (0,)),
+        ("SELECT * FROM users ORDER BY registration_date DESC", ()),
+        ("SELECT * FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?", (0, 500)),
+        (
+            """
+            SELECT u.user_id FROM users u
+            LEFT JOIN broadcast_recipients r ON r.job_id = ? AND r.user_id = u.user_id
+            WHERE u.user_id > ? AND r.user_id IS NULL
+            ORDER BY u.user_id LIMIT ?
+            """,
+            (0, 0, 200),
+        ),
+        (
+            """
+            SELECT user_id FROM broadcast_recipients
+            WHERE job_id = ? AND status = 'retryable' AND attempts < ? AND user_id > ?
+            ORDER BY user_id LIMIT ?
+            """,
+            (0, 3, 0, 200),
+        ),
+        ("SELECT * FROM broadcast_jobs WHERE status = 'running' ORDER BY id", ()),
+        ("SELECT message_ids FROM bot_messages WHERE user_id = ?", (0,)),
+        (
+            """
+            SELECT * FROM users WHERE (registration_date, user_id) < (?, ?)
+            ORDER BY registration_date DESC, user_id DESC LIMIT ?
+            """,
+            (0, 0, 5),
+        ),
+        (
+            """
+            SELECT * FROM users WHERE (registration_date, user_id) > (?, ?)
+            ORDER BY registration_date ASC, user_id ASC LIMIT ?
+            """,
+            (0, 0, 5),
+        ),
+        ("SELECT * FROM subscriptions WHERE user_id = ? ORDER BY start_date DESC", (0,)),
+        ("SELECT * FROM payments WHERE user_id = ? ORDER BY created_at DESC", (0,)),
+    ]
+
+    # Общее число пользователей (строка с tariff_id = NULL) и число активных
+    # подписок по тарифам; у пользователя учитывается только подписка
+    # с самой поздней датой окончания, как в get_active_subscription
+    SUBSCRIPTION_STATS_QUERY = f"""
+        WITH latest AS (
+            SELECT tariff_id,
+                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY end_date DESC) AS rn
+            FROM subscriptions
+            WHERE is_active = 1 AND end_date > {NOW_EPOCH_SQL}
+              AND user_id IN (SELECT user_id FROM users)
+        )
+        SELECT NULL AS tariff_id, COUNT(*) AS count FROM users
+        UNION ALL
+        SELECT tariff_id, COUNT(*) AS count FROM latest WHERE rn = 1 GROUP BY tariff_id
+    """
+
+    # Поля пользователя вместе с датой регистрации в формате дд.мм.гггг
+    USER_COLUMNS = (
+        "*, strftime('%d.%m.%Y', registration_date, 'unixepoch', 'localtime') AS registration_date_display"
+    )
+
+    def __init__(
+        self,
+        db_path: str,
+        pool_size: int = 4,
+        wal_mode: bool = False,
+        busy_timeout_ms: int = 5000,
+        write_queue: bool = False,
+        write_batch_size: int = 64,
+        write_batch_delay_ms: float = 5.0,
+        activity_flush_interval: float = 5.0,
+        subscription_cache_size: int = 10000,
+        subscription_cache_ttl: float = 300.0,
+        loop_thread: Optional[LoopThread] = None,
+    ):
         self.db_path = db_path
+        self.wal_mode = wal_mode
+        # Кэш количества пользователей: (значение, время вычисления)
+        self._users_count: Optional[Tuple[int, float]] = None
+        self.users_count_ttl = 60.0
         self._init_db()
 
+        pragmas = {
+            "busy_timeout": str(busy_timeout_ms),
+            "temp_store": "MEMORY",
+            "cache_size": "-8000",
+        }
+        if wal_mode:
+            # В режиме WAL fsync нужен только при checkpoint, а не на каждый commit
+            pragmas["synchronous"] = "NORMAL"
+
+        # Соединения открываются один раз и переиспользуются всеми методами
+        self.pool = ConnectionPool(db_path, size=pool_size, pragmas=pragmas)
+
+        # Кэш get_active_subscription: запись о подписке живет до ее end_date,
+        # отсутствие подписки - subscription_cache_ttl секунд
+        self.subscription_cache: Optional[ExpiringLRUCache] = None
+        self.subscription_cache_ttl = subscription_cache_ttl
+        if subscription_cache_size > 0:
+            self.subscription_cache = ExpiringLRUCache(subscription_cache_size)
+
+        # Фоновый поток для писателя и периодического сброса буферов;
+        # можно передать общий поток приложения, чтобы не заводить отдельный
+        self._own_background = loop_thread is None
+        self.background = loop_thread or LoopThread("db-background")
+
+        # Необязательный единственный писатель с групповой фиксацией
+        self.writer: Optional[WriteQueue] = None
+        if write_queue:
+            self.writer = WriteQueue(
+                db_path,
+                pragmas=pragmas,
+                max_batch_size=write_batch_size,
+                max_batch_delay=write_batch_delay_ms / 1000,
+                loop_thread=self.background,
+            )
+            self.writer.start()
+
+        # Отметки last_activity копятся в памяти и пишутся пачкой
+        self.activity: Optional[ActivityBuffer] = None
+        if activity_flush_interval > 0:
+            self.activity = ActivityBuffer(
+                self._flush_activity,
+                loop_thread=self.background,
+                max_staleness=activity_flush_interval,
+            )
+            self.activity.start()
+
     def _init_db(self):
-        """Инициализация базы данных при первом запуске"""
+        """Инициализация базы данных при первом запуске.
+
+        Здесь создается базовая схема (версия 0); все последующие изменения
+        схемы описаны в database/migrations.py.
+        """
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
 
+        if self.wal_mode:
+            # Режим журнала сохраняется в файле базы данных
+            cursor.execute("PRAGMA journal_mode = WAL")
+
+        # Схема уже актуальна: при перезапуске не нужно ни создавать таблицы, ни мигрировать
+        if get_schema_version(conn) >= LATEST_SCHEMA_VERSION:
+            conn.close()
+            return
+
         # Таблица пользователей
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -68,12 +243,47 @@ class DatabaseManager:
         ''')
 
         conn.commit()
+
+        # Версионные миграции поверх базовой схемы
+        applied = apply_migrations(conn)
+        if applied:
+            logger.info("Применены миграции схемы: %s", applied)
+
         conn.close()
 
+    def check_query_plans(self) -> List[str]:
+        """Проверить, что горячие запросы используют индексы (диагностика, можно вызывать в фоне)"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            problems = find_unindexed_queries(conn, self.QUERY_PLAN_CHECKS)
+        finally:
+            conn.close()
+        for problem in problems:
+            logger.warning("Запрос выполняется без индекса: %s", problem)
+        return problems
+
+    async def _run_write(self, op: WriteOp) -> Any:
+        """Выполнить операцию записи через очередь писателя или напрямую через пул"""
+        if self.writer is not None:
+            return await self.writer.submit(op)
+        async with self.pool.connection() as db:
+            # Блокировка на запись берется сразу, чтобы ожидание шло через busy_timeout
+            await db.execute("BEGIN IMMEDIATE")
+            result = await op(db)
+            await db.commit()
+            return result
+
+    async def _execute_write(self, query: str, params: tuple) -> int:
+        """Выполнить один изменяющий запрос и вернуть id вставленной строки"""
+        async def op(db):
+            cursor = await db.execute(query, params)
+            return cursor.lastrowid
+
+        return await self._run_write(op)
+
     async def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Получить информацию о пользователе"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.connection() as db:
             async with db.execute(
                 "SELECT * FROM users WHERE user_id = ?", (user_id,)
             ) as cursor:
@@ -84,41 +294,86 @@ class DatabaseManager:
 
     async def add_user(self, user_id: int, username: str, first_name: str, last_name: str) -> bool:
         """Добавить нового пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            try:
-                await db.execute(
-                    """
-                    INSERT OR IGNORE INTO users (user_id, username, first_name, last_name)
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (user_id, username, first_name, last_name),
-                )
-                await db.commit()
-                return True
-            except Exception:
-                return False
+        self._users_count = None
+        try:
+            await self._execute_write(
+                """
+                INSERT OR IGNORE INTO users (user_id, username, first_name, last_name)
+                VALUES (?, ?, ?, ?)
+                """,
+                (user_id, username, first_name, last_name),
+            )
+            return True
+        except Exception:
+            return False
 
     async def update_user_activity(self, user_id: int) -> bool:
         """Обновить время последней активности пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            try:
-                await db.execute(
-                    "UPDATE users SET last_activity = CURRENT_TIMESTAMP WHERE user_id = ?",
-                    (user_id,),
-                )
-                await db.commit()
-                return True
-            except Exception:
-                return False
+        if self.activity is not None:
+            # Запись произойдет при ближайшем сбросе буфера
+            self.activity.touch(user_id)
+            return True
+        try:
+            await self._execute_write(
+                f"UPDATE users SET last_activity = {NOW_EPOCH_SQL} WHERE user_id = ?",
+                (user_id,),
+            )
+            return True
+        except Exception:
+            return False
+
+    async def _flush_activity(self, rows: List[Tuple[int, int]]) -> None:
+        """Записать пачку отметок активности одним executemany"""
+        async def op(db):
+            await db.executemany(
+                "UPDATE users SET last_activity = ? WHERE user_id = ?", rows
+            )
+
+        await self._run_write(op)
 
     async def get_active_subscription(self, user_id: int) -> Optional[Dict[str, Any]]:
-        """Получить активную подписку пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        """Получить активную подписку пользователя.
+
+        Кроме полей таблицы возвращает end_date_display (дд.мм.гггг) и days_left.
+        """
+        cache = self.subscription_cache
+        if cache is None:
+            return self._with_days_left(await self._fetch_active_subscription(user_id))
+
+        cached = cache.get(user_id, _MISSING)
+        if cached is not _MISSING:
+            return self._with_days_left(dict(cached) if cached else None)
+
+        generation = cache.generation
+        subscription = await self._fetch_active_subscription(user_id)
+        if subscription:
+            expires_at = subscription["end_date"]
+        else:
+            expires_at = time.time() + self.subscription_cache_ttl
+        cache.set(user_id, dict(subscription) if subscription else None, expires_at, generation)
+        return self._with_days_left(subscription)
+
+    @staticmethod
+    def _with_days_left(subscription: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Добавить число полных дней до окончания подписки"""
+        if subscription:
+            # Значение может прийти из кэша, поэтому считается на момент вызова
+            subscription["days_left"] = max(0, (subscription["end_date"] - int(time.time())) // 86400)
+        return subscription
+
+    def _invalidate_subscription(self, user_id: int) -> None:
+        """Сбросить кэш подписки пользователя после изменения"""
+        if self.subscription_cache is not None:
+            self.subscription_cache.invalidate(user_id)
+
+    async def _fetch_active_subscription(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Прочитать активную подписку пользователя из базы"""
+        async with self.pool.connection() as db:
             async with db.execute(
-                """
-                SELECT * FROM subscriptions 
-                WHERE user_id = ? AND is_active = 1 AND end_date > CURRENT_TIMESTAMP
+                f"""
+                SELECT *, strftime('%d.%m.%Y', end_date, 'unixepoch', 'localtime') AS end_date_display
+                FROM subscriptions
+                WHERE user_id = ? AND is_active = 1 AND end_date > {NOW_EPOCH_SQL}
                 ORDER BY end_date DESC LIMIT 1
                 """,
                 (user_id,),
@@ -130,67 +385,133 @@ class DatabaseManager:
 
     async def add_subscription(self, user_id: int, tariff_id: int, duration_days: int) -> int:
         """Добавить новую подписку"""
-        end_date = (datetime.now() + timedelta(days=duration_days)).strftime("%Y-%m-%d %H:%M:%S")
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                """
+        try:
+            return await self._execute_write(
+                f"""
                 INSERT INTO subscriptions (user_id, tariff_id, end_date)
-                VALUES (?, ?, ?)
+                VALUES (?, ?, {NOW_EPOCH_SQL} + ? * 86400)
                 """,
-                (user_id, tariff_id, end_date),
+                (user_id, tariff_id, duration_days),
             )
-            await db.commit()
-            return cursor.lastrowid
+        finally:
+            self._invalidate_subscription(user_id)
 
     async def deactivate_subscription(self, subscription_id: int) -> bool:
         """Деактивировать подписку"""
-        async with aiosqlite.connect(self.db_path) as db:
-            try:
-                await db.execute(
-                    "UPDATE subscriptions SET is_active = 0 WHERE id = ?",
-                    (subscription_id,),
-                )
-                await db.commit()
-                return True
-            except Exception:
-                return False
+        async def op(db):
+            async with db.execute(
+                "SELECT user_id FROM subscriptions WHERE id = ?", (subscription_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            await db.execute(
+                "UPDATE subscriptions SET is_active = 0 WHERE id = ?",
+                (subscription_id,),
+            )
+            return row[0] if row else None
+
+        try:
+            user_id = await self._run_write(op)
+        except Exception:
+            return False
+        if user_id is not None:
+            self._invalidate_subscription(user_id)
+        return True
 
     async def create_payment(
         self, user_id: int, tariff_id: int, amount: float, payment_method: str
     ) -> int:
         """Создать новую запись о платеже"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
+        return await self._execute_write(
+            """
+            INSERT INTO payments (user_id, tariff_id, amount, payment_method, status)
+            VALUES (?, ?, ?, ?, 'pending')
+            """,
+            (user_id, tariff_id, amount, payment_method),
+        )
+
+    async def update_payment(self, payment_id: int, payment_external_id: str, status: str) -> bool:
+        """Обновить статус платежа"""
+        try:
+            await self._execute_write(
                 """
-                INSERT INTO payments (user_id, tariff_id, amount, payment_method, status)
-                VALUES (?, ?, ?, ?, 'pending')
+                UPDATE payments 
+                SET payment_id = ?, status = ?
+                WHERE id = ?
                 """,
-                (user_id, tariff_id, amount, payment_method),
+                (payment_external_id, status, payment_id),
             )
-            await db.commit()
-            return cursor.lastrowid
+            return True
+        except Exception:
+            return False
 
-    async def update_payment(self, payment_id: int, payment_external_id: str, status: str) -> bool:
-        """Обновить статус платежа"""
-        async with aiosqlite.connect(self.db_path) as db:
-            try:
+    async def activate_payment(
+        self,
+        payment_id: int,
+        payment_external_id: str,
+        duration_days: int,
+        configs: Dict[str, Dict],
+    ) -> Optional[Dict[str, Any]]:
+        """Атомарно активировать оплаченный платеж.
+
+        В одной транзакции платеж переводится из pending в success, создается
+        подписка и сохраняются конфигурации. Переход выполняется условным
+        UPDATE, поэтому повторный или параллельный вызов ничего не создает,
+        а возвращает уже существующий результат.
+
+        :return: {"activated", "status", "subscription_id", "user_id"} или None, если платежа нет
+        """
+        async def op(db):
+            cursor = await db.execute(
+                "UPDATE payments SET payment_id = ?, status = 'success' WHERE id = ? AND status = 'pending'",
+                (payment_external_id, payment_id),
+            )
+            activated = cursor.rowcount == 1
+            if activated:
+                cursor = await db.execute(
+                    f"""
+                    INSERT INTO subscriptions (user_id, tariff_id, end_date)
+                    SELECT user_id, tariff_id, {NOW_EPOCH_SQL} + ? * 86400 FROM payments WHERE id = ?
+                    """,
+                    (duration_days, payment_id),
+                )
                 await db.execute(
+                    "UPDATE payments SET subscription_id = ? WHERE id = ?",
+                    (cursor.lastrowid, payment_id),
+                )
+                await db.executemany(
                     """
-                    UPDATE payments 
-                    SET payment_id = ?, status = ?
-                    WHERE id = ?
+                    INSERT INTO configs (user_id, config_type, config_data)
+                    SELECT user_id, ?, ? FROM payments WHERE id = ?
                     """,
-                    (payment_external_id, status, payment_id),
+                    [
+                        (config_type, json.dumps(config_data), payment_id)
+                        for config_type, config_data in configs.items()
+                    ],
                 )
-                await db.commit()
-                return True
-            except Exception:
-                return False
+
+            async with db.execute(
+                "SELECT user_id, tariff_id, status, subscription_id FROM payments WHERE id = ?",
+                (payment_id,),
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row is None:
+                return None
+            return {
+                "activated": activated,
+                "user_id": row[0],
+                "tariff_id": row[1],
+                "status": row[2],
+                "subscription_id": row[3],
+            }
+
+        result = await self._run_write(op)
+        if result and result["activated"]:
+            self._invalidate_subscription(result["user_id"])
+        return result
 
     async def get_payment(self, payment_id: int) -> Optional[Dict[str, Any]]:
         """Получить информацию о платеже"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.connection() as db:
             async with db.execute(
                 "SELECT * FROM payments WHERE id = ?", (payment_id,)
             ) as cursor:
@@ -202,21 +523,17 @@ class DatabaseManager:
     async def save_config(self, user_id: int, config_type: str, config_data: Dict) -> int:
         """Сохранить конфигурационный файл пользователя"""
         config_json = json.dumps(config_data)
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                """
-                INSERT INTO configs (user_id, config_type, config_data)
-                VALUES (?, ?, ?)
-                """,
-                (user_id, config_type, config_json),
-            )
-            await db.commit()
-            return cursor.lastrowid
+        return await self._execute_write(
+            """
+            INSERT INTO configs (user_id, config_type, config_data)
+            VALUES (?, ?, ?)
+            """,
+            (user_id, config_type, config_json),
+        )
 
     async def get_configs(self, user_id: int) -> List[Dict[str, Any]]:
         """Получить все конфигурационные файлы пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.connection() as db:
             configs = []
             async with db.execute(
                 "SELECT * FROM configs WHERE user_id = ? ORDER BY created_at DESC", (user_id,)
@@ -229,18 +546,59 @@ class DatabaseManager:
 
     async def get_all_users(self) -> List[Dict[str, Any]]:
         """Получить список всех пользователей (для админки)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.connection() as db:
             users = []
             async with db.execute("SELECT * FROM users ORDER BY registration_date DESC") as cursor:
                 async for row in cursor:
                     users.append(dict(row))
             return users
 
+    async def get_users_page(
+        self, cursor: Optional[Tuple[int, int]] = None, limit: int = 5, backward: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Получить страницу пользователей (для админки).
+
+        Пагинация по ключу (registration_date, user_id) в порядке убывания:
+        cursor - ключ последней строки предыдущей страницы или первой строки
+        следующей страницы при backward=True. Стоимость не зависит от номера страницы.
+        """
+        async with self.pool.connection() as db:
+            if cursor is None:
+                query = f"SELECT {self.USER_COLUMNS} FROM users ORDER BY registration_date DESC, user_id DESC LIMIT ?"
+                params: tuple = (limit,)
+            elif backward:
+                query = f"""
+                    SELECT {self.USER_COLUMNS} FROM users WHERE (registration_date, user_id) > (?, ?)
+                    ORDER BY registration_date ASC, user_id ASC LIMIT ?
+                """
+                params = (cursor[0], cursor[1], limit)
+            else:
+                query = f"""
+                    SELECT {self.USER_COLUMNS} FROM users WHERE (registration_date, user_id) < (?, ?)
+                    ORDER BY registration_date DESC, user_id DESC LIMIT ?
+                """
+                params = (cursor[0], cursor[1], limit)
+            async with db.execute(query, params) as db_cursor:
+                users = [dict(row) for row in await db_cursor.fetchall()]
+
+        if backward:
+            users.reverse()
+        return users
+
+    async def count_users(self) -> int:
+        """Получить количество пользователей (с кэшированием)"""
+        cached = self._users_count
+        if cached is not None and time.monotonic() - cached[1] < self.users_count_ttl:
+            return cached[0]
+        async with self.pool.connection() as db:
+            async with db.execute("SELECT COUNT(*) FROM users") as cursor:
+                count = (await cursor.fetchone())[0]
+        self._users_count = (count, time.monotonic())
+        return count
+
     async def get_user_subscriptions(self, user_id: int) -> List[Dict[str, Any]]:
         """Получить все подписки пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.connection() as db:
             subscriptions = []
             async with db.execute(
                 "SELECT * FROM subscriptions WHERE user_id = ? ORDER BY start_date DESC", (user_id,)
@@ -251,12 +609,166 @@ class DatabaseManager:
 
     async def get_user_payments(self, user_id: int) -> List[Dict[str, Any]]:
         """Получить все платежи пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.connection() as db:
             payments = []
             async with db.execute(
-                "SELECT * FROM payments WHERE user_id = ? ORDER BY created_at DESC", (user_id,)
+                """
+                SELECT *, strftime('%d.%m.%Y %H:%M', created_at, 'unixepoch', 'localtime') AS created_at_display
+                FROM payments WHERE user_id = ? ORDER BY created_at DESC
+                """,
+                (user_id,),
             ) as cursor:
                 async for row in cursor:
                     payments.append(dict(row))
-            return payments 
\ No newline at end of file
+            return payments
+
+    async def get_subscription_stats(self) -> Dict[str, Any]:
+        """Получить число пользователей и активных подписок по тарифам (для админки)"""
+        stats = {"total_users": 0, "active_subscriptions": 0, "by_tariff": {}}
+        async with self.pool.connection() as db:
+            async with db.execute(self.SUBSCRIPTION_STATS_QUERY) as cursor:
+                async for row in cursor:
+                    if row["tariff_id"] is None:
+                        stats["total_users"] = row["count"]
+                    else:
+                        stats["by_tariff"][row["tariff_id"]] = row["count"]
+                        stats["active_subscriptions"] += row["count"]
+        return stats
+
+    async def create_broadcast(self, admin_id: int, text: str, total: int) -> int:
+        """Создать задание рассылки и вернуть его id"""
+        return await self._execute_write(
+            "INSERT INTO broadcast_jobs (admin_id, text, total) VALUES (?, ?, ?)",
+            (admin_id, text, total),
+        )
+
+    async def set_broadcast_progress_message(self, job_id: int, chat_id: int, message_id: int) -> None:
+        """Запомнить сообщение, в котором администратор видит ход рассылки"""
+        await self._execute_write(
+            "UPDATE broadcast_jobs SET progress_chat_id = ?, progress_message_id = ? WHERE id = ?",
+            (chat_id, message_id, job_id),
+        )
+
+    async def get_unfinished_broadcasts(self) -> List[Dict[str, Any]]:
+        """Получить незавершенные задания рассылки (для продолжения после перезапуска)"""
+        async with self.pool.connection() as db:
+            async with db.execute(
+                "SELECT * FROM broadcast_jobs WHERE status = 'running' ORDER BY id"
+            ) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def get_broadcast_batch(self, job_id: int, after_user_id: int, limit: int) -> List[int]:
+        """Следующие получатели рассылки после контрольной точки.
+
+        Пользователи, для которых результат уже записан, пропускаются: после
+        перезапуска никто не получит сообщение повторно, даже если контрольная
+        точка не успела сдвинуться.
+        """
+        async with self.pool.connection() as db:
+            async with db.execute(
+                """
+                SELECT u.user_id FROM users u
+                LEFT JOIN broadcast_recipients r ON r.job_id = ? AND r.user_id = u.user_id
+                WHERE u.user_id > ? AND r.user_id IS NULL
+                ORDER BY u.user_id LIMIT ?
+                """,
+                (job_id, after_user_id, limit),
+            ) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def record_broadcast_result(
+        self, job_id: int, user_id: int, status: str, error: Optional[str] = None
+    ) -> None:
+        """Записать результат отправки получателю: sent, blocked, failed или retryable"""
+        await self._execute_write(
+            """
+            INSERT INTO broadcast_recipients (job_id, user_id, status, error)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (job_id, user_id) DO UPDATE SET
+                status = excluded.status,
+                error = excluded.error,
+                attempts = attempts + 1
+            """,
+            (job_id, user_id, status, error),
+        )
+
+    async def advance_broadcast_cursor(self, job_id: int, cursor: int) -> None:
+        """Сдвинуть контрольную точку рассылки: все получатели до cursor обработаны"""
+        await self._execute_write(
+            "UPDATE broadcast_jobs SET cursor = ? WHERE id = ? AND cursor < ?",
+            (cursor, job_id, cursor),
+        )
+
+    async def get_broadcast_counts(self, job_id: int) -> Dict[str, int]:
+        """Количество получателей рассылки по результатам"""
+        async with self.pool.connection() as db:
+            async with db.execute(
+                "SELECT status, COUNT(*) FROM broadcast_recipients WHERE job_id = ? GROUP BY status",
+                (job_id,),
+            ) as cursor:
+                return {row[0]: row[1] for row in await cursor.fetchall()}
+
+    async def get_broadcast_retryable(
+        self, job_id: int, max_attempts: int, after_user_id: int, limit: int
+    ) -> List[int]:
+        """Получатели с временной ошибкой, у которых еще остались попытки"""
+        async with self.pool.connection() as db:
+            async with db.execute(
+                """
+                SELECT user_id FROM broadcast_recipients
+                WHERE job_id = ? AND status = 'retryable' AND attempts < ? AND user_id > ?
+                ORDER BY user_id LIMIT ?
+                """,
+                (job_id, max_attempts, after_user_id, limit),
+            ) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def finish_broadcast(self, job_id: int) -> None:
+        """Отметить рассылку завершенной"""
+        await self._execute_write(
+            f"UPDATE broadcast_jobs SET status = 'done', finished_at = {NOW_EPOCH_SQL} WHERE id = ?",
+            (job_id,),
+        )
+
+    async def get_bot_messages(self, user_id: int) -> Optional[bytes]:
+        """Получить сохраненные при остановке сообщения бота пользователю (упакованные)"""
+        async with self.pool.connection() as db:
+            async with db.execute(
+                "SELECT message_ids FROM bot_messages WHERE user_id = ?", (user_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else None
+
+    async def save_bot_messages(self, rows: List[Tuple[int, bytes, int]], expired_before: int) -> None:
+        """Сохранить сообщения бота пользователям одной транзакцией и удалить устаревшие.
+
+        :param rows: [(user_id, упакованные записи, время последнего сообщения), ...]
+        :param expired_before: Записи, обновленные раньше этого момента, удаляются
+        """
+        async def op(db):
+            await db.executemany(
+                "INSERT OR REPLACE INTO bot_messages (user_id, message_ids, updated_at) VALUES (?, ?, ?)",
+                rows,
+            )
+            await db.execute("DELETE FROM bot_messages WHERE updated_at < ?", (expired_before,))
+
+        await self._run_write(op)
+
+    async def close(self) -> None:
+        """Закрыть все соединения с базой данных.
+
+        Ошибка на одном шаге (например, при записи остатка буфера) не мешает
+        закрыть остальное: незакрытое соединение aiosqlite держит поток,
+        и процесс не завершится.
+        """
+        try:
+            if self.activity is not None:
+                await self.activity.close()
+        finally:
+            try:
+                if self.writer is not None:
+                    await self.writer.close()
+            finally:
+                if self._own_background:
+                    self.background.stop()
+                await self.pool.close()
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+
+class ConnectionPool:
+    """Пул долгоживущих соединений aiosqlite.
+
+    Пул не привязан к конкретному циклу событий: ожидание свободного
+    соединения построено на concurrent.futures.Future, поэтому им можно
+    пользоваться из циклов разных потоков Dispatcher.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = 4,
+        pragmas: Optional[Dict[str, str]] = None,
+        health_check_interval: float = 30.0,
+    ):
+        """
+        Инициализация пула соединений
+
+        :param db_path: Путь к файлу базы данных
+        :param size: Максимальное количество открытых соединений
+        :param pragmas: PRAGMA, применяемые один раз при открытии соединения
+        :param health_check_interval: Через сколько секунд простоя соединение проверяется перед выдачей
+        """
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.pragmas = pragmas or {}
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Lock()
+        self._idle: Deque[Tuple[aiosqlite.Connection, float]] = deque()
+        self._waiters: Deque[Future] = deque()
+        self._opened = 0
+        self._closed = False
+
+    async def _open(self) -> aiosqlite.Connection:
+        """Открыть новое соединение и применить к нему PRAGMA"""
+        db = await aiosqlite.connect(self.db_path)
+        db.row_factory = aiosqlite.Row
+        try:
+            for name, value in self.pragmas.items():
+                await db.execute(f"PRAGMA {name} = {value}")
+        except Exception:
+            await db.close()
+            raise
+        return db
+
+    async def _is_healthy(self, db: aiosqlite.Connection) -> bool:
+        """Проверить, что соединение живо"""
+        try:
+            async with db.execute("SELECT 1") as cursor:
+                await cursor.fetchone()
+            return True
+        except Exception:
+            return False
+
+    async def acquire(self) -> aiosqlite.Connection:
+        """Получить соединение из пула, при необходимости дождавшись освобождения"""
+        while True:
+            waiter = None
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Пул соединений закрыт")
+                if self._idle:
+                    db, released_at = self._idle.popleft()
+                elif self._opened < self.size:
+                    self._opened += 1
+                    db, released_at = None, 0.0
+                else:
+                    waiter = Future()
+                    self._waiters.append(waiter)
+
+            if waiter is not None:
+                db = await asyncio.wrap_future(waiter)
+                released_at = time.monotonic()
+
+            if db is None:
+                try:
+                    return await self._open()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+
+            if time.monotonic() - released_at < self.health_check_interval:
+                return db
+            if await self._is_healthy(db):
+                return db
+
+            # Соединение сломано: закрываем его и пробуем снова
+            await self._discard(db)
+
+    def release(self, db: aiosqlite.Connection) -> bool:
+        """Вернуть соединение в пул.
+
+        Возвращает False, если пул уже закрыт: тогда соединение должен
+        закрыть вызывающий, иначе его поток aiosqlite не остановится.
+        """
+        with self._lock:
+            if not self._closed:
+                while self._waiters:
+                    waiter = self._waiters.popleft()
+                    if waiter.set_running_or_notify_cancel():
+                        waiter.set_result(db)
+                        return True
+                self._idle.append((db, time.monotonic()))
+                return True
+        return False
+
+    async def _discard(self, db: aiosqlite.Connection) -> None:
+        """Закрыть соединение и освободить его место в пуле"""
+        with self._lock:
+            self._opened -= 1
+        try:
+            await db.close()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Контекстный менеджер для работы с соединением из пула"""
+        db = await self.acquire()
+        try:
+            yield db
+        finally:
+            # Незавершенная транзакция не должна попасть к следующему владельцу
+            if db.in_transaction:
+                try:
+                    await db.rollback()
+                except Exception:
+                    await self._discard(db)
+                    db = None
+            if db is not None and not self.release(db):
+                # Пул уже закрыт, соединение возвращать некуда
+                await self._discard(db)
+
+    async def close(self) -> None:
+        """Закрыть все соединения пула"""
+        with self._lock:
+            self._closed = True
+            idle: List[aiosqlite.Connection] = [db for db, _ in self._idle]
+            self._idle.clear()
+            self._opened -= len(idle)
+            waiters = list(self._waiters)
+            self._waiters.clear()
+
+        for waiter in waiters:
+            if waiter.set_running_or_notify_cancel():
+                waiter.set_exception(RuntimeError("Пул соединений закрыт"))
+
+        for db in idle:
+            try:
+                await db.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        """Текущее состояние пула"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "idle": len(self._idle),
+                "waiting": len(self._waiters),
+            }
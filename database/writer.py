@@ -0,0 +1,177 @@
+import asyncio
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from utils.loop_thread import LoopThread
+
+# Операция записи: корутина, выполняющая запросы на переданном соединении
+WriteOp = Callable[[aiosqlite.Connection], Awaitable[Any]]
+
+
+class WriteQueue:
+    """Единственный писатель SQLite с групповой фиксацией транзакций.
+
+    Операции записи из любых потоков складываются в очередь, а отдельная
+    задача выполняет их пачками в одной транзакции и делает один commit
+    на пачку. Каждая операция выполняется в своей точке сохранения, поэтому
+    ошибка одной операции не откатывает остальные. Результат операции
+    становится доступен вызывающему только после commit.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        pragmas: Optional[Dict[str, str]] = None,
+        max_batch_size: int = 64,
+        max_batch_delay: float = 0.005,
+        loop_thread: Optional[LoopThread] = None,
+    ):
+        """
+        Инициализация очереди записи
+
+        :param db_path: Путь к файлу базы данных
+        :param pragmas: PRAGMA для соединения писателя
+        :param max_batch_size: Максимальное количество операций в одной транзакции
+        :param max_batch_delay: Сколько секунд ждать новых операций перед commit
+        :param loop_thread: Общий фоновый поток; если не передан, писатель запускает свой
+        """
+        self.db_path = db_path
+        self.pragmas = pragmas or {}
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_batch_delay = max(0.0, max_batch_delay)
+
+        self._own_thread = loop_thread is None
+        self._thread = loop_thread or LoopThread("db-writer")
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[Future] = None
+        self._closed = False
+
+        # Статистика групповой фиксации
+        self.batches = 0
+        self.operations = 0
+
+    def start(self) -> None:
+        """Запустить поток писателя"""
+        self._queue = asyncio.Queue()
+        self._thread.start()
+        self._task = self._thread.submit(self._run())
+
+    async def submit(self, op: WriteOp) -> Any:
+        """Поставить операцию в очередь и дождаться ее фиксации"""
+        if self._closed:
+            raise RuntimeError("Очередь записи закрыта")
+        future: Future = Future()
+        self._thread.loop.call_soon_threadsafe(self._put, (op, future))
+        return await asyncio.wrap_future(future)
+
+    def _put(self, item: Optional[Tuple[WriteOp, Future]]) -> None:
+        """Положить элемент в очередь (выполняется в цикле писателя)"""
+        self._queue.put_nowait(item)
+
+    async def _run(self) -> None:
+        """Основной цикл писателя"""
+        db = await aiosqlite.connect(self.db_path)
+        loop = asyncio.get_running_loop()
+        stopping = False
+        try:
+            for name, value in self.pragmas.items():
+                await db.execute(f"PRAGMA {name} = {value}")
+
+            while not stopping:
+                item = await self._queue.get()
+                if item is None:
+                    break
+                batch = [item]
+
+                # Собираем пачку: ограничение по размеру или по времени ожидания
+                deadline = loop.time() + self.max_batch_delay
+                while len(batch) < self.max_batch_size:
+                    if not self._queue.empty():
+                        item = self._queue.get_nowait()
+                    else:
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        try:
+                            item = await asyncio.wait_for(self._queue.get(), timeout)
+                        except asyncio.TimeoutError:
+                            break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+                await self._commit_batch(db, batch)
+        finally:
+            # Дописываем все, что успели поставить в очередь до остановки
+            pending: List[Tuple[WriteOp, Future]] = []
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not None:
+                    pending.append(item)
+            if pending:
+                await self._commit_batch(db, pending)
+            await db.close()
+
+    async def _commit_batch(self, db: aiosqlite.Connection, batch: List[Tuple[WriteOp, Future]]) -> None:
+        """Выполнить пачку операций в одной транзакции"""
+        done: List[Tuple[Future, Any]] = []
+        try:
+            await db.execute("BEGIN IMMEDIATE")
+        except Exception as e:
+            for _, future in batch:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return
+
+        for op, future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                await db.execute("SAVEPOINT write_op")
+                result = await op(db)
+                await db.execute("RELEASE write_op")
+                done.append((future, result))
+            except Exception as e:
+                try:
+                    await db.execute("ROLLBACK TO write_op")
+                    await db.execute("RELEASE write_op")
+                except Exception:
+                    pass
+                future.set_exception(e)
+
+        try:
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            for future, _ in done:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.operations += len(done)
+        for future, result in done:
+            future.set_result(result)
+
+    async def close(self) -> None:
+        """Дописать очередь и остановить писателя"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self._task is not None:
+                self._thread.loop.call_soon_threadsafe(self._put, None)
+                await asyncio.wrap_future(self._task)
+        finally:
+            if self._own_thread:
+                self._thread.stop()
+
+    def stats(self) -> Dict[str, float]:
+        """Статистика групповой фиксации"""
+        return {
+            "batches": self.batches,
+            "operations": self.operations,
+            "avg_batch_size": self.operations / self.batches if self.batches else 0.0,
+        }
@@ -1,6 +1,31 @@
 import sys
 import subprocess
 import os
+from typing import List
+
+# Версии, без которых бот не запустится (остальное ставится из requirements.txt при сборке)
+REQUIRED_VERSIONS = {
+    "python-telegram-bot": "13.10",
+    "urllib3": "1.26.15",
+    "six": "1.16.0",
+}
+
+
+def check_dependencies() -> List[str]:
+    """Проверить установленные версии без вызова pip; вернуть список проблем"""
+    from importlib import metadata
+
+    problems = []
+    for package, version in REQUIRED_VERSIONS.items():
+        try:
+            installed = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            problems.append(f"{package} не установлен (нужен {version})")
+            continue
+        if installed != version:
+            problems.append(f"{package} {installed} вместо {version}")
+    return problems
+
 
 def fix_dependencies():
     print("Fixing dependencies...")
@@ -1,50 +1,16 @@
-# Проверка и исправление зависимостей перед импортом telegram
-try:
-    import fix_dependencies
-    fix_dependencies.fix_dependencies()
-except ImportError:
-    print("Warning: fix_dependencies.py not found, skipping dependency check")
+import time
+
+# Отсчет времени запуска для --measure-startup
+STARTED_AT = time.perf_counter()
 
 import os
 import logging
 import sys
+import argparse
+import secrets
+import signal
+import threading
 from typing import Dict, Any, Optional
-import asyncio
-
-# Теперь импортируем telegram
-try:
-    from telegram import Update, Bot
-    from telegram.ext import (
-        Updater,
-        CommandHandler,
-        CallbackQueryHandler,
-        MessageHandler,
-        Filters,
-        CallbackContext,
-    )
-except ImportError as e:
-    print(f"Error importing telegram: {e}")
-    print("Attempting to install dependencies...")
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "urllib3==1.26.15", "six==1.16.0", "python-telegram-bot==13.10"])
-    
-    # Повторная попытка импорта
-    from telegram import Update, Bot
-    from telegram.ext import (
-        Updater,
-        CommandHandler,
-        CallbackQueryHandler,
-        MessageHandler,
-        Filters,
-        CallbackContext,
-    )
-
-from config.config import BOT_TOKEN, DATABASE_PATH, ADMIN_IDS
-from database.models import DatabaseManager
-from bot.handlers.base_handlers import BaseHandlers
-from bot.handlers.admin_handlers import AdminHandlers
-from bot.services.vpn_service import VPNService
-
 
 # Настройка логирования
 logging.basicConfig(
@@ -57,6 +23,76 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Проверяем версии зависимостей без вызова pip: установка выполняется при сборке
+# (pip install -r requirements.txt), а вручную - через python fix_dependencies.py
+from fix_dependencies import check_dependencies
+
+for problem in check_dependencies():
+    logger.warning("%s. Запустите python fix_dependencies.py", problem)
+
+from telegram import Update, Bot
+from telegram.error import TelegramError
+from telegram.ext import (
+    Updater,
+    CommandHandler,
+    CallbackQueryHandler,
+    MessageHandler,
+    TypeHandler,
+    Filters,
+    CallbackContext,
+)
+
+from config.config import (
+    BOT_TOKEN,
+    DATABASE_PATH,
+    ADMIN_IDS,
+    DB_POOL_SIZE,
+    DB_BUSY_TIMEOUT_MS,
+    DB_WAL_MODE,
+    DB_WRITE_QUEUE,
+    DB_WRITE_BATCH_SIZE,
+    DB_WRITE_BATCH_DELAY_MS,
+    DB_ACTIVITY_FLUSH_INTERVAL,
+    SUBSCRIPTION_CACHE_SIZE,
+    SUBSCRIPTION_CACHE_TTL,
+    BOT_IO_THREADS,
+    BOT_UPDATE_LANES,
+    BOT_LANE_QUEUE_SIZE,
+    SHUTDOWN_TIMEOUT,
+    OUTBOUND_GLOBAL_RATE,
+    OUTBOUND_CHAT_RATE,
+    OUTBOUND_CHAT_BURST,
+    OUTBOUND_MAX_RETRIES,
+    BROADCAST_CONCURRENCY,
+    BROADCAST_PROGRESS_INTERVAL,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_INTAKE_SIZE,
+    RATE_LIMIT_WINDOW,
+    RATE_LIMIT_MENU,
+    RATE_LIMIT_PAYMENT,
+    RATE_LIMIT_ADMIN,
+    RATE_LIMIT_STORE,
+    RATE_LIMIT_DB_PATH,
+    INTAKE_QUEUE_SIZE,
+    INTAKE_MAX_BACKLOG,
+    INTAKE_NORMAL_MAX_WAIT,
+    INTAKE_LOW_MAX_WAIT,
+    CALLBACK_DEDUPE_WINDOW,
+)
+from database.models import DatabaseManager
+from bot.middlewares.limiter_store import MemoryStore, SQLiteStore
+from bot.middlewares.rate_limiter import RateLimiter
+from bot.router import CallbackRouter, RouteClassifier
+from utils import async_bridge, outbound
+from utils.async_bridge import async_handler, run_sync
+from utils.intake_queue import IntakeQueue
+from utils.response_timer import get_response_timer
+from utils.startup import StartupTimer
+
 
 def error_handler(update: Optional[object], context: CallbackContext) -> None:
     """Обработчик ошибок бота."""
@@ -66,110 +102,216 @@ def error_handler(update: Optional[object], context: CallbackContext) -> None:
 class EarthVPNBot:
     """Основной класс бота EarthVPN"""
     
-    def __init__(self, token: str, db_path: str):
+    def __init__(self, token: str, db_path: str, startup: Optional[StartupTimer] = None):
         """Инициализация бота"""
         self.token = token
-        self.db_manager = DatabaseManager(db_path)
+        self.startup = startup
+        self._first_update_marked = False
+        self._vpn_service = None
+        # Все асинхронные обработчики и фоновые задачи БД работают в одном цикле событий;
+        # обновления одного пользователя выполняются по порядку, разных - параллельно
+        async_bridge.configure(
+            BOT_IO_THREADS, lanes=BOT_UPDATE_LANES, lane_queue_size=BOT_LANE_QUEUE_SIZE
+        )
+        # Все запросы к Bot API из обработчиков идут через очередь с лимитами Telegram
+        outbound.configure(
+            OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST, OUTBOUND_MAX_RETRIES
+        )
+        self.db_manager = DatabaseManager(
+            db_path,
+            pool_size=DB_POOL_SIZE,
+            wal_mode=DB_WAL_MODE,
+            busy_timeout_ms=DB_BUSY_TIMEOUT_MS,
+            write_queue=DB_WRITE_QUEUE,
+            write_batch_size=DB_WRITE_BATCH_SIZE,
+            write_batch_delay_ms=DB_WRITE_BATCH_DELAY_MS,
+            activity_flush_interval=DB_ACTIVITY_FLUSH_INTERVAL,
+            subscription_cache_size=SUBSCRIPTION_CACHE_SIZE,
+            subscription_cache_ttl=SUBSCRIPTION_CACHE_TTL,
+            loop_thread=async_bridge.get_bridge(),
+        )
+        self._mark_startup("инициализация БД")
+
+        # Модули обработчиков подгружаются только при создании бота
+        from bot.handlers.base_handlers import BaseHandlers
+        from bot.handlers.admin_handlers import AdminHandlers
+        from bot.services.broadcast import BroadcastService
+
+        self.broadcasts = BroadcastService(
+            self.db_manager,
+            concurrency=BROADCAST_CONCURRENCY,
+            progress_interval=BROADCAST_PROGRESS_INTERVAL,
+        )
         self.base_handlers = BaseHandlers(self.db_manager)
-        self.admin_handlers = AdminHandlers(self.db_manager)
-        self.vpn_service = VPNService()
+        self.admin_handlers = AdminHandlers(self.db_manager, self.broadcasts)
+        self.webhook_server = None
+        self.router = CallbackRouter(dedupe_window=CALLBACK_DEDUPE_WINDOW)
+        # При нескольких процессах бота лимиты считаются в общем файле SQLite
+        if RATE_LIMIT_STORE == "sqlite":
+            limiter_store = SQLiteStore(RATE_LIMIT_DB_PATH)
+        else:
+            limiter_store = MemoryStore()
+        self.rate_limiter = RateLimiter(
+            {
+                "menu": (RATE_LIMIT_MENU, RATE_LIMIT_WINDOW),
+                "payment": (RATE_LIMIT_PAYMENT, RATE_LIMIT_WINDOW),
+                "admin": (RATE_LIMIT_ADMIN, RATE_LIMIT_WINDOW),
+            },
+            store=limiter_store,
+        )
         
+        # Приоритеты обновлений: оплата и администраторы обслуживаются первыми и не сбрасываются
+        self.priorities = RouteClassifier(["critical", "normal", "low"], default_class="normal")
+        self.intake = IntakeQueue(
+            self._update_priority,
+            self.priorities.classes,
+            max_wait={"normal": INTAKE_NORMAL_MAX_WAIT, "low": INTAKE_LOW_MAX_WAIT},
+            maxsize=INTAKE_QUEUE_SIZE,
+            overloaded=self._overloaded,
+            on_shed=self._shed_update,
+            on_admit=self._admit_update,
+        )
+
         # Инициализация бота для v13.x
         self.updater = Updater(token=token, use_context=True, request_kwargs={'read_timeout': 10, 'connect_timeout': 10})
         self.dispatcher = self.updater.dispatcher
+        # Updater и Dispatcher обмениваются обновлениями через очередь с приоритетами
+        self.updater.update_queue = self.dispatcher.update_queue = self.intake
         
         # Регистрация обработчиков
         self._register_handlers()
         
         # Регистрация обработчика ошибок
         self.dispatcher.add_error_handler(error_handler)
+        self._mark_startup("обработчики и Updater")
+
+    @property
+    def vpn_service(self):
+        """Сервис генерации VPN-конфигураций (создается при первом обращении)"""
+        if self._vpn_service is None:
+            from bot.services.vpn_service import VPNService
+            self._vpn_service = VPNService()
+        return self._vpn_service
+
+    def _update_priority(self, update: Update) -> int:
+        """Класс приоритета обновления: все запросы администраторов - критичные"""
+        user = update.effective_user
+        if user is not None and user.id in ADMIN_IDS:
+            return self.priorities.index("critical")
+        return self.priorities.route_class(update)
+
+    @staticmethod
+    def _overloaded() -> bool:
+        """Перегружены ли обработчики: в дорожках слишком много незавершенных обновлений"""
+        scheduler = async_bridge.get_scheduler()
+        return scheduler is not None and scheduler.pending() >= INTAKE_MAX_BACKLOG
+
+    @staticmethod
+    def _admit_update(update: Update, queued_at: float) -> None:
+        """Начать отсчет задержки ответа на нажатие с момента приема обновления"""
+        if isinstance(update, Update) and update.callback_query is not None:
+            get_response_timer().received(update.update_id, queued_at)
+
+    @staticmethod
+    def _shed_update(update: Update, priority: str) -> None:
+        """Ответить на сброшенное при перегрузке нажатие, чтобы кнопка не зависла"""
+        if update.callback_query is not None:
+            async_bridge.submit(run_sync(
+                update.callback_query.answer,
+                "Бот сейчас перегружен. Попробуйте еще раз через несколько секунд.",
+            ))
+
+    def _mark_startup(self, phase: str) -> None:
+        """Отметить завершение этапа запуска, если включен замер"""
+        if self.startup is not None:
+            self.startup.mark(phase)
+
+    def _after_start(self) -> None:
+        """Действия после начала приема обновлений"""
+        # Проверка планов запросов не нужна для обработки обновлений - выполняем ее в фоне
+        async_bridge.submit(run_sync(self.db_manager.check_query_plans))
+        # Рассылки, прерванные остановкой, продолжаются с контрольной точки
+        async_bridge.submit(self.broadcasts.resume(self.updater.bot))
+        if self.startup is not None:
+            logger.info("Ожидание первого обновления для замера запуска...")
+
+    def _mark_first_update(self, update: Update, context: CallbackContext) -> None:
+        """Поставить отметку первого обновления в дорожку пользователя после его обработчиков"""
+        if self._first_update_marked:
+            return
+        self._first_update_marked = True
+        self._first_update_handled(update, context)
+
+    @async_handler
+    async def _first_update_handled(self, update: Update, context: CallbackContext) -> None:
+        """Завершить замер запуска: дорожка дошла до отметки, значит обновление обработано"""
+        self._mark_startup("первое обновление обработано")
+        logger.info("Время запуска по этапам:\n%s", self.startup.report())
     
     def _register_handlers(self) -> None:
         """Регистрация обработчиков команд и сообщений"""
+        # Запросы сверх лимита отбрасываются до обработчиков и обращений к базе данных
+        self.rate_limiter.classify_routes("payment", "pay", "payment_method", "check_payment")
+        self.rate_limiter.classify_routes(
+            "admin", "admin", "admin_users", "admin_users_page", "admin_stats",
+            "admin_tariffs", "admin_broadcast",
+        )
+        self.dispatcher.add_handler(TypeHandler(Update, self.rate_limiter.check), group=-1)
+
+        # Классы приоритета для очереди приема; остальные маршруты - обычные
+        self.priorities.classify_routes("critical", "pay", "payment_method", "check_payment")
+        self.priorities.classify_routes(
+            "low", "about", "tariffs", "tariff", "faq", "faq_item", "support", "ignore",
+        )
+
         # Команды
         self.dispatcher.add_handler(CommandHandler("start", self.base_handlers.start))
         self.dispatcher.add_handler(CommandHandler("admin", self.admin_handlers.admin_panel))
         
-        # Обработчики callback-запросов (меню)
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.base_handlers.main_menu, pattern="^main_menu$"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.base_handlers.about, pattern="^about$"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.base_handlers.tariffs, pattern="^tariffs$"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.base_handlers.faq, pattern="^faq$"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.base_handlers.support, pattern="^support$"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.base_handlers.profile, pattern="^profile$"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.base_handlers.tariff_info, pattern="^tariff_"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.base_handlers.faq_item, pattern="^faq_item_"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.base_handlers.payment, pattern="^pay_"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.base_handlers.process_payment_method, pattern="^payment_method_"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.base_handlers.check_payment, pattern="^check_payment_"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.base_handlers.configs, pattern="^configs$"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.base_handlers.download_config, pattern="^config_"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.base_handlers.payment_history, pattern="^payment_history$"
-        ))
-        
-        # Админские обработчики
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.admin_handlers.admin_panel, pattern="^admin$"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.admin_handlers.admin_users, pattern="^admin_users"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.admin_handlers.admin_stats, pattern="^admin_stats$"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.admin_handlers.admin_tariffs, pattern="^admin_tariffs$"
-        ))
-        self.dispatcher.add_handler(CallbackQueryHandler(
-            self.admin_handlers.admin_broadcast, pattern="^admin_broadcast$"
-        ))
+        # Все callback-запросы проходят через один маршрутизатор
+        base = self.base_handlers
+        admin = self.admin_handlers
+        router = self.router
+        router.add("main_menu", base.main_menu)
+        router.add("about", base.about)
+        router.add("tariffs", base.tariffs)
+        router.add("faq", base.faq)
+        router.add("support", base.support)
+        router.add("profile", base.profile)
+        router.add("tariff", base.tariff_info, int)
+        router.add("faq_item", base.faq_item, int)
+        router.add("pay", base.payment, int)
+        router.add("payment_method", base.process_payment_method, str, int)
+        router.add("check_payment", base.check_payment, int)
+        router.add("configs", base.configs)
+        router.add("config", base.download_config, str, idempotent=True)
+        router.add("payment_history", base.payment_history)
+
+        # Админские маршруты
+        router.add("admin", admin.admin_panel)
+        router.add("admin_users", admin.admin_users, ack_text=admin.access_denied)
+        router.add("admin_users_page", admin.admin_users, int, str, int, int, ack_text=admin.access_denied)
+        router.add("admin_stats", admin.admin_stats, ack_text=admin.access_denied)
+        router.add("admin_tariffs", admin.admin_tariffs, ack_text=admin.access_denied)
+        router.add("admin_broadcast", admin.admin_broadcast, ack_text=admin.access_denied)
+
+        # Кнопка-счетчик страниц ничего не делает
+        router.add("ignore", router.ignore)
+
+        self.dispatcher.add_handler(CallbackQueryHandler(router.dispatch))
         
         # Обработчик для текстовых сообщений (например, для рассылки админом)
         self.dispatcher.add_handler(MessageHandler(
             Filters.text & ~Filters.command, self.process_text_message
         ))
+
+        # Отметка первого обработанного обновления для --measure-startup
+        if self.startup is not None:
+            self.dispatcher.add_handler(TypeHandler(Update, self._mark_first_update), group=1)
     
-    def process_text_message(self, update: Update, context: CallbackContext) -> None:
+    @async_handler
+    async def process_text_message(self, update: Update, context: CallbackContext) -> None:
         """Обработчик текстовых сообщений"""
-        # Получаем или создаем цикл событий
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        # Запускаем асинхронную функцию
-        loop.run_until_complete(self._process_text_message_async(update, context))
-    
-    async def _process_text_message_async(self, update: Update, context: CallbackContext) -> None:
-        """Асинхронная реализация обработчика текстовых сообщений"""
         user = update.effective_user
         
         # Проверяем, является ли это вводом текста для рассылки
@@ -177,17 +319,223 @@ class EarthVPNBot:
             await self.admin_handlers.process_broadcast_message(update, context)
         else:
             # Отправляем пользователя в главное меню, если он отправляет текст
-            # Удаляем await перед update.message.reply_text
-            update.message.reply_text(
+            await outbound.send(
+                update.effective_chat.id,
+                update.message.reply_text,
                 "Пожалуйста, используйте меню для навигации. Отправьте /start чтобы начать заново."
             )
     
     def run(self) -> None:
         """Запуск бота в цикле событий"""
         self.updater.start_polling()
+        self._mark_startup("запуск polling")
+        self._after_start()
         logger.info("Бот запущен. Нажмите Ctrl+C для остановки.")
         self.updater.idle()
 
+    def process_webhook_update(self, data: Dict[str, Any]) -> None:
+        """Передать JSON обновления, полученного через webhook, в очередь приема Dispatcher"""
+        self.intake.put(Update.de_json(data, self.updater.bot))
+
+    def run_webhook(self) -> None:
+        """Запуск бота в режиме webhook на встроенном aiohttp-сервере"""
+        from utils.webhook_server import WebhookServer
+
+        if not WEBHOOK_URL:
+            raise RuntimeError("Для режима webhook укажите WEBHOOK_URL в .env файле")
+
+        secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        self.webhook_server = WebhookServer(
+            self.process_webhook_update,
+            secret_token=secret_token,
+            host=WEBHOOK_HOST,
+            port=WEBHOOK_PORT,
+            path=WEBHOOK_PATH,
+            intake_size=WEBHOOK_INTAKE_SIZE,
+        )
+        self.webhook_server.start()
+
+        # secret_token появился в Bot API 6.1, поэтому передается через api_kwargs
+        self.updater.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            api_kwargs={"secret_token": secret_token},
+        )
+        # Dispatcher забирает обновления из очереди приема в своем потоке, как при polling
+        threading.Thread(target=self.dispatcher.start, name="dispatcher", daemon=True).start()
+        self._mark_startup("запуск webhook")
+        self._after_start()
+        logger.info("Бот запущен в режиме webhook. Нажмите Ctrl+C для остановки.")
+
+        # Updater.idle() завершает процесс без очистки, если polling не запущен
+        stopped = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGABRT):
+            signal.signal(sig, lambda signum, frame: stopped.set())
+        while not stopped.is_set():
+            stopped.wait(1)
+
+    def shutdown(self, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+        """Корректная остановка бота.
+
+        Прием обновлений прекращается, все уже полученные обновления (из
+        очереди приема и дорожек) дообрабатываются не дольше timeout секунд,
+        затем буферы записываются в БД и соединения закрываются.
+
+        Updater подтверждает Telegram каждую полученную пачку следующим
+        запросом getUpdates, поэтому обновления, не дообработанные за timeout,
+        теряются. Последняя пачка подтверждается только после того, как
+        дообработано все полученное.
+        """
+        started = time.perf_counter()
+
+        # Прекращаем прием новых обновлений
+        if self.updater.running:
+            self.updater.stop()
+            logger.info("Updater остановлен.")
+        if self.webhook_server is not None:
+            # Уже принятые запросы передаются в Dispatcher до закрытия сервера
+            self.webhook_server.close()
+            if self.dispatcher.running:
+                self.dispatcher.stop()
+        # Обновления, оставшиеся в очереди приема, ставим в дорожки без сброса
+        for update in self.intake.close():
+            self.dispatcher.process_update(update)
+
+        # Дообрабатываем обновления, стоящие в дорожках
+        scheduler = async_bridge.get_scheduler()
+        completed_before = scheduler.stats()["completed"] if scheduler is not None else 0
+        drain_started = time.perf_counter()
+        left = async_bridge.drain(max(0.0, timeout - (drain_started - started)))
+        drained = scheduler.stats()["completed"] - completed_before if scheduler is not None else 0
+        logger.info(
+            "Дообработано %d заданий за %.0f мс.", drained, (time.perf_counter() - drain_started) * 1000
+        )
+        if left:
+            logger.error(
+                "Не успели дообработаться %d обновлений: их получение уже подтверждено Telegram, "
+                "и после перезапуска они не придут. Увеличьте SHUTDOWN_TIMEOUT.",
+                left,
+            )
+
+        # Рассылки останавливаются после уже начатых отправок и продолжатся при запуске
+        async_bridge.submit(
+            self.broadcasts.stop(max(0.0, timeout - (time.perf_counter() - started)))
+        ).result()
+
+        # Последняя полученная пачка еще не подтверждена: подтверждаем ее, только если
+        # все дообработано, иначе пусть Telegram доставит ее новому процессу
+        if self.webhook_server is None and not left:
+            self._confirm_last_batch()
+
+        # Сохраняем сообщения бота, чтобы после запуска их можно было удалить при смене экрана
+        try:
+            saved = async_bridge.submit(self.base_handlers.user_message_ids.save()).result()
+            logger.info("Сохранены сообщения бота для %d пользователей.", saved)
+        except Exception as e:
+            logger.warning("Не удалось сохранить сообщения бота: %s", e)
+
+        # Записываем накопленные отметки активности и очередь записи, закрываем соединения
+        async_bridge.submit(self.db_manager.close()).result()
+        async_bridge.shutdown()
+        logger.info("Соединения с базой данных закрыты.")
+
+        self._log_stats()
+        self.rate_limiter.store.close()
+        logger.info("Остановка заняла %.0f мс.", (time.perf_counter() - started) * 1000)
+
+    def _confirm_last_batch(self) -> None:
+        """Подтвердить последнюю пачку getUpdates тем же offset, что передал бы Updater"""
+        # offset Updater - следующий за последним полученным update_id, он не уменьшается
+        offset = self.updater.last_update_id
+        if not offset:
+            return
+        try:
+            self.updater.bot.get_updates(offset=offset, limit=1, timeout=0)
+        except TelegramError as e:
+            logger.warning("Не удалось подтвердить последнюю пачку обновлений: %s", e)
+
+    def _log_stats(self) -> None:
+        """Вывести в лог накопленную статистику подсистем"""
+        if self.webhook_server is not None:
+            stats = self.webhook_server.stats()
+            logger.info(
+                "Webhook: %d принято, %d отклонено по токену, %d некорректных, "
+                "%d отбито при переполнении, макс. очередь %d",
+                stats["received"], stats["rejected"], stats["malformed"], stats["dropped"],
+                stats["max_depth"],
+            )
+        stats = self.router.stats()
+        top_routes = sorted(stats["hits"].items(), key=lambda item: item[1], reverse=True)[:5]
+        logger.info(
+            "Маршруты кнопок: %s; отклонено %d, схлопнуто повторных нажатий %d",
+            ", ".join(f"{route}={hits}" for route, hits in top_routes),
+            stats["rejected"], stats["collapsed"],
+        )
+        stats = self.rate_limiter.stats()
+        logger.info(
+            "Ограничение частоты: %d проверок, отклонено %s, отслеживается %d записей",
+            stats["checks"],
+            ", ".join(f"{name}={count}" for name, count in stats["rejected"].items()),
+            stats["tracked"],
+        )
+        stats = self.intake.stats()
+        logger.info(
+            "Прием обновлений: макс. очередь %d, передано %s, сброшено при перегрузке %s, "
+            "передано раньше ради порядка пользователя %d",
+            stats["max_depth"],
+            ", ".join(f"{name}={count}" for name, count in stats["admitted"].items()),
+            ", ".join(f"{name}={count}" for name, count in stats["shed"].items()),
+            stats["promoted"],
+        )
+        stats = get_response_timer().stats()
+        logger.info(
+            "Ответ на нажатия (p50/p95): подтверждение %.0f/%.0f мс, экран %.0f/%.0f мс, "
+            "обработчик %.0f/%.0f мс",
+            stats["ack"]["p50"] * 1000, stats["ack"]["p95"] * 1000,
+            stats["visible"]["p50"] * 1000, stats["visible"]["p95"] * 1000,
+            stats["handler"]["p50"] * 1000, stats["handler"]["p95"] * 1000,
+        )
+        stats = outbound.get_outbound().stats()
+        logger.info(
+            "Исходящие запросы: %d отправлено, %d ошибок, %d ответов 429, "
+            "среднее ожидание %.0f мс (рассылка %.0f мс), макс. %.0f мс",
+            stats["sent"], stats["failed"], stats["throttled"],
+            stats["avg_wait"]["interactive"] * 1000, stats["avg_wait"]["bulk"] * 1000,
+            stats["max_wait"]["interactive"] * 1000,
+        )
+        stats = self.broadcasts.stats()
+        if any(stats.values()):
+            logger.info(
+                "Рассылки: %d доставлено, %d заблокировали бота, %d ошибок, %d ждут повтора",
+                stats["sent"], stats["blocked"], stats["failed"], stats["retryable"],
+            )
+        scheduler = async_bridge.get_scheduler()
+        if scheduler is not None:
+            stats = scheduler.stats()
+            logger.info(
+                "Дорожки обновлений: %d обработано, %d ошибок, макс. очередь %d, "
+                "%d ожиданий места (%.2f с)",
+                stats["completed"], stats["failed"], stats["max_depth"],
+                stats["blocked"], stats["blocked_time"],
+            )
+        stats = self.base_handlers.user_message_ids.stats()
+        logger.info(
+            "Сообщения бота: %d пользователей в памяти, %d загружено из БД, "
+            "%d устарело, %d вытеснено",
+            stats["users"], stats["loaded"], stats["expired"], stats["evicted"],
+        )
+        if self.db_manager.activity is not None:
+            stats = self.db_manager.activity.stats()
+            logger.info(
+                "Отметки активности: %d касаний, %d схлопнуто, %d записано",
+                stats["touches"], stats["merged"], stats["flushed"],
+            )
+        if self.db_manager.subscription_cache is not None:
+            stats = self.db_manager.subscription_cache.stats()
+            logger.info(
+                "Кэш подписок: %d попаданий, %d промахов, %d вытеснено",
+                stats["hits"], stats["misses"], stats["evictions"],
+            )
+
 
 if __name__ == "__main__":
     # Проверяем наличие токена
@@ -195,26 +543,35 @@ if __name__ == "__main__":
         logger.error("Ошибка: Токен бота не найден. Укажите BOT_TOKEN в .env файле.")
         sys.exit(1)
 
-    # Получаем или создаем цикл событий asyncio
-    # try:
-    #     loop = asyncio.get_event_loop()
-    # except RuntimeError:
-    #     loop = asyncio.new_event_loop()
-    #     asyncio.set_event_loop(loop)
+    parser = argparse.ArgumentParser(description="EarthVPN Telegram бот")
+    parser.add_argument(
+        "--mode", choices=("polling", "webhook"), default="polling",
+        help="способ получения обновлений от Telegram",
+    )
+    parser.add_argument(
+        "--measure-startup", action="store_true",
+        help="вывести длительность этапов запуска после первого обработанного обновления",
+    )
+    args = parser.parse_args()
+
+    startup = None
+    if args.measure_startup:
+        startup = StartupTimer(STARTED_AT)
+        startup.mark("импорт модулей")
 
     # Создаем и запускаем бота
-    bot = EarthVPNBot(BOT_TOKEN, DATABASE_PATH)
+    bot = EarthVPNBot(BOT_TOKEN, DATABASE_PATH, startup=startup)
     
     try:
-        # Возвращаем стандартный вызов run()
-        logger.info("Запуск бота...")
-        bot.run()
+        logger.info("Запуск бота в режиме %s...", args.mode)
+        if args.mode == "webhook":
+            bot.run_webhook()
+        else:
+            bot.run()
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем.")
     except Exception as e:
         logger.error(f"Произошла непредвиденная ошибка: {e}", exc_info=True)
     finally:
-        if bot.updater.running:
-            bot.updater.stop()
-            logger.info("Updater остановлен.")
-        logger.info("Завершение работы бота.") 
\ No newline at end of file
+        bot.shutdown()
+        logger.info("Завершение работы бота.")
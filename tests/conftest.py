@@ -0,0 +1,65 @@
+import threading
+import time
+from typing import Callable, List
+
+import aiosqlite
+import pytest
+
+from bot.middlewares.limiter_store import MemoryStore, SQLiteStore
+
+
+@pytest.fixture
+def db_path(tmp_path) -> str:
+    """Путь к файлу базы данных во временном каталоге"""
+    return str(tmp_path / "test.db")
+
+
+@pytest.fixture
+def connection_threads() -> Callable[..., List[aiosqlite.Connection]]:
+    """Потоки соединений aiosqlite, открытых во время теста и так и не закрытых.
+
+    Такие потоки не являются daemon и не дают процессу завершиться.
+    Возвращает функцию, которая ждет их остановки не дольше timeout секунд
+    и возвращает оставшиеся.
+    """
+    before = set(threading.enumerate())
+
+    def alive(timeout: float = 2.0) -> List[aiosqlite.Connection]:
+        deadline = time.monotonic() + timeout
+        threads = [
+            thread for thread in threading.enumerate()
+            if isinstance(thread, aiosqlite.Connection) and thread not in before
+        ]
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        return [thread for thread in threads if thread.is_alive()]
+
+    return alive
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def limiter_store(request, tmp_path):
+    """Хранилище RateLimiter каждого вида"""
+    if request.param == "memory":
+        store = MemoryStore()
+    else:
+        store = SQLiteStore(str(tmp_path / "limits.db"))
+    yield store
+    store.close()
+
+
+def pytest_addoption(parser):
+    parser.addoption("--run-slow", action="store_true", help="Запустить нагрузочные тесты (slow)")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: нагрузочный тест, запускается с --run-slow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-slow"):
+        return
+    skip = pytest.mark.skip(reason="нагрузочный тест, запустите с --run-slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
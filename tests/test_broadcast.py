@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import BadRequest, NetworkError, Unauthorized
+
+from bot.services.broadcast import BLOCKED, FAILED, RETRYABLE, SENT, BroadcastService
+from database.models import DatabaseManager
+from utils import outbound
+
+ADMIN_ID = 1000
+
+
+class FakeBot:
+    """Bot, который отвечает ошибками заданным получателям"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.sent = []
+
+    def send_message(self, chat_id, text, parse_mode=None):
+        if chat_id in self.errors:
+            raise self.errors[chat_id]
+        self.sent.append(chat_id)
+        return SimpleNamespace(message_id=len(self.sent))
+
+    def edit_message_text(self, **kwargs):
+        pass
+
+
+@pytest.fixture
+def db_manager(db_path):
+    db_manager = DatabaseManager(db_path, activity_flush_interval=0)
+    yield db_manager
+    asyncio.run(db_manager.close())
+
+
+@pytest.fixture(autouse=True)
+def fast_outbound(monkeypatch):
+    monkeypatch.setattr(outbound, "_outbound", outbound.OutboundQueue(1000.0, 1000.0, 10.0, 0))
+
+
+def run_broadcast(db_manager, bot, user_ids):
+    service = BroadcastService(db_manager, concurrency=3, batch_size=2, max_attempts=1)
+
+    async def scenario():
+        for user_id in user_ids:
+            await db_manager.add_user(user_id, f"user{user_id}", "Имя", "")
+        job_id = await service.start(bot, ADMIN_ID, "Новости")
+        while service.stats()["running"]:
+            await asyncio.sleep(0.01)
+        async with db_manager.pool.connection() as db:
+            async with db.execute(
+                "SELECT user_id, status, error FROM broadcast_recipients WHERE job_id = ? ORDER BY user_id",
+                (job_id,),
+            ) as cursor:
+                return [tuple(row) for row in await cursor.fetchall()]
+
+    return service, asyncio.run(scenario())
+
+
+def test_each_recipient_gets_an_outcome(db_manager):
+    bot = FakeBot({
+        2: Unauthorized("Forbidden: bot was blocked by the user"),
+        3: BadRequest("Chat not found"),
+        4: NetworkError("Connection reset"),
+    })
+
+    service, outcomes = run_broadcast(db_manager, bot, range(1, 6))
+
+    assert [(user_id, status) for user_id, status, _ in outcomes] == [
+        (1, SENT), (2, BLOCKED), (3, FAILED), (4, RETRYABLE), (5, SENT),
+    ]
+    assert outcomes[1][2] == "Forbidden: bot was blocked by the user"
+    assert sorted(bot.sent) == [1, 5, ADMIN_ID]
+    assert service.stats() == {"running": 0, SENT: 2, BLOCKED: 1, FAILED: 1, RETRYABLE: 1}
+
+
+def test_unexpected_error_does_not_stop_broadcast(db_manager):
+    bot = FakeBot({2: ValueError("неожиданный ответ")})
+
+    service, outcomes = run_broadcast(db_manager, bot, range(1, 8))
+
+    assert [(user_id, status) for user_id, status, _ in outcomes] == [
+        (user_id, FAILED if user_id == 2 else SENT) for user_id in range(1, 8)
+    ]
+    assert "неожиданный ответ" in outcomes[1][2]
+    assert sorted(bot.sent) == [1, 3, 4, 5, 6, 7, ADMIN_ID]
@@ -0,0 +1,198 @@
+import threading
+import time
+from queue import Empty
+from types import SimpleNamespace
+
+import pytest
+
+from utils.intake_queue import IntakeQueue
+
+CLASSES = ["critical", "normal", "low"]
+
+
+def update(update_id, priority, user=None):
+    effective_user = SimpleNamespace(id=user) if user is not None else None
+    return SimpleNamespace(update_id=update_id, priority=priority, effective_user=effective_user)
+
+
+class Intake:
+    """Очередь с тремя классами и записью сброшенных и переданных обновлений"""
+
+    def __init__(self, **options):
+        self.overloaded = False
+        self.shed = []
+        self.admitted = []
+        options.setdefault("max_wait", {"normal": 10.0, "low": 0.05})
+        self.queue = IntakeQueue(
+            lambda item: CLASSES.index(item.priority),
+            CLASSES,
+            overloaded=lambda: self.overloaded,
+            on_shed=lambda item, name: self.shed.append((item.update_id, name)),
+            on_admit=lambda item, queued_at: self.admitted.append(getattr(item, "update_id", None)),
+            poll_interval=0.01,
+            **options,
+        )
+
+    def drain(self):
+        items = []
+        while True:
+            try:
+                items.append(self.queue.get(timeout=0).update_id)
+            except Empty:
+                return items
+
+
+def test_higher_class_first_and_fifo_within_class():
+    intake = Intake()
+    for update_id, priority in [(1, "low"), (2, "normal"), (3, "critical"), (4, "normal"), (5, "low")]:
+        intake.queue.put(update(update_id, priority))
+
+    assert intake.drain() == [3, 2, 4, 1, 5]
+    assert intake.admitted == [3, 2, 4, 1, 5]
+    assert intake.queue.stats()["admitted"] == {"critical": 1, "normal": 2, "low": 2}
+
+
+def test_updates_of_one_user_keep_arrival_order():
+    intake = Intake()
+    intake.queue.put(update(1, "low", user=1))
+    intake.queue.put(update(2, "normal", user=2))
+    intake.queue.put(update(3, "critical", user=1))
+    intake.queue.put(update(4, "critical", user=3))
+
+    # Раннее обновление пользователя 1 уходит вместе с его срочным, другие пользователи - по приоритету
+    assert intake.drain() == [1, 3, 4, 2]
+    assert intake.queue.stats()["promoted"] == 1
+    assert intake.queue.stats()["admitted"] == {"critical": 2, "normal": 1, "low": 1}
+
+
+def test_earlier_update_is_not_held_by_overload():
+    intake = Intake()
+    intake.overloaded = True
+    intake.queue.put(update(1, "normal", user=1))
+    intake.queue.put(update(2, "low", user=2))
+    intake.queue.put(update(3, "critical", user=1))
+
+    assert intake.queue.get(timeout=0).update_id == 1
+    assert intake.queue.get(timeout=0).update_id == 3
+    with pytest.raises(Empty):
+        intake.queue.get(timeout=0.05)
+
+
+def test_shed_update_releases_later_ones():
+    intake = Intake(maxsize=2)
+    intake.queue.put(update(1, "normal", user=1))
+    intake.queue.put(update(2, "low", user=2))
+    intake.queue.put(update(3, "normal", user=2))
+
+    # Вытесненное обновление больше не задерживает следующие обновления пользователя
+    assert intake.shed == [(2, "low")]
+    assert intake.drain() == [1, 3]
+
+
+def test_service_objects_are_most_urgent():
+    intake = Intake()
+    intake.overloaded = True
+    intake.queue.put(update(1, "normal"))
+    error = RuntimeError("ошибка polling")
+    intake.queue.put(error)
+
+    # Объект без update_id относится к первому классу и не задерживается при перегрузке
+    assert intake.queue.get(timeout=0) is error
+
+
+def test_overload_holds_sheddable_classes():
+    intake = Intake()
+    intake.overloaded = True
+    intake.queue.put(update(1, "normal"))
+    intake.queue.put(update(2, "critical"))
+
+    assert intake.queue.get(timeout=0.05).update_id == 2
+    with pytest.raises(Empty):
+        intake.queue.get(timeout=0.05)
+
+    intake.overloaded = False
+    assert intake.queue.get(timeout=0.05).update_id == 1
+    assert intake.shed == []
+
+
+def test_stale_updates_are_shed_under_overload():
+    intake = Intake()
+    intake.overloaded = True
+    intake.queue.put(update(1, "low"))
+    intake.queue.put(update(2, "normal"))
+    time.sleep(0.1)
+
+    with pytest.raises(Empty):
+        intake.queue.get(timeout=0.05)
+    assert intake.shed == [(1, "low")]
+
+    intake.overloaded = False
+    assert intake.drain() == [2]
+    assert intake.queue.stats()["shed"] == {"critical": 0, "normal": 0, "low": 1}
+
+
+def test_full_queue_sheds_newest_lowest_class():
+    intake = Intake(maxsize=3)
+    intake.queue.put(update(1, "low"))
+    intake.queue.put(update(2, "low"))
+    intake.queue.put(update(3, "normal"))
+
+    # Место для более приоритетного обновления освобождает самое новое из низшего класса
+    intake.queue.put(update(4, "normal"))
+    assert intake.shed == [(2, "low")]
+
+    # Нового обновления низшего класса некуда положить - сбрасывается оно само
+    intake.queue.put(update(5, "low"))
+    assert intake.shed == [(2, "low"), (5, "low")]
+
+    intake.queue.put(update(6, "critical"))
+    assert intake.shed == [(2, "low"), (5, "low"), (1, "low")]
+    assert intake.drain() == [6, 3, 4]
+
+
+def test_unsheddable_class_may_exceed_maxsize():
+    intake = Intake(maxsize=1)
+    for update_id in range(3):
+        intake.queue.put(update(update_id, "critical"))
+
+    assert intake.queue.qsize() == 3
+    assert intake.shed == []
+    assert intake.drain() == [0, 1, 2]
+
+
+def test_blocking_get_wakes_on_put():
+    intake = Intake()
+    received = []
+
+    def consumer():
+        received.append(intake.queue.get(timeout=5).update_id)
+
+    thread = threading.Thread(target=consumer)
+    thread.start()
+    time.sleep(0.05)
+    intake.queue.put(update(1, "normal"))
+    thread.join(5)
+
+    assert received == [1]
+
+
+def test_close_returns_waiting_updates():
+    intake = Intake()
+    intake.overloaded = True
+    intake.queue.put(update(1, "low"))
+    intake.queue.put(update(2, "critical"))
+    intake.queue.put(update(3, "normal"))
+
+    assert [item.update_id for item in intake.queue.close()] == [2, 3, 1]
+    assert intake.queue.empty()
+    assert intake.shed == []
+
+
+def test_close_keeps_order_of_one_user():
+    intake = Intake()
+    intake.overloaded = True
+    intake.queue.put(update(1, "low", user=1))
+    intake.queue.put(update(2, "normal", user=2))
+    intake.queue.put(update(3, "critical", user=1))
+
+    assert [item.update_id for item in intake.queue.close()] == [1, 3, 2]
@@ -0,0 +1,116 @@
+import threading
+from typing import Optional
+
+import pytest
+
+from bot.middlewares.limiter_store import LimiterStore, MemoryStore, SQLiteStore
+
+
+def test_acquire_moves_tat(limiter_store):
+    now = limiter_store.clock()
+
+    assert limiter_store.get(1) is None
+    assert limiter_store.acquire(1, now, 1.0, 1.0)
+    assert limiter_store.get(1) == pytest.approx(now + 1.0)
+    assert limiter_store.acquire(1, now, 1.0, 1.0)
+    assert limiter_store.get(1) == pytest.approx(now + 2.0)
+
+    # Опережение больше tolerance: отказ, tat не меняется
+    assert not limiter_store.acquire(1, now, 1.0, 1.0)
+    assert limiter_store.get(1) == pytest.approx(now + 2.0)
+
+    # Полное ведро: отсчет идет от текущего времени, а не от старого tat
+    assert limiter_store.acquire(1, now + 100.0, 1.0, 1.0)
+    assert limiter_store.get(1) == pytest.approx(now + 101.0)
+    assert limiter_store.size() == 1
+
+
+def test_sweep_removes_only_full_buckets(limiter_store):
+    now = limiter_store.clock()
+    limiter_store.acquire(1, now, 1.0, 0.0)
+    limiter_store.acquire(2, now, 10.0, 0.0)
+
+    assert limiter_store.sweep(now + 5.0) == 1
+    assert limiter_store.get(1) is None
+    assert limiter_store.get(2) is not None
+    assert limiter_store.size() == 1
+
+
+def test_concurrent_acquire_is_atomic(limiter_store):
+    now = limiter_store.clock()
+    allowed = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(50):
+            if limiter_store.acquire(1, now, 1.0, 9.0):
+                with lock:
+                    allowed.append(1)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Вместимость ведра - tolerance / interval + 1 запросов
+    assert len(allowed) == 10
+
+
+def test_sqlite_store_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "limits.db")
+    first, second = SQLiteStore(path), SQLiteStore(path)
+    try:
+        now = first.clock()
+        assert first.acquire(1, now, 1.0, 0.0)
+        assert not second.acquire(1, now, 1.0, 0.0)
+        assert second.get(1) == pytest.approx(now + 1.0)
+    finally:
+        first.close()
+        second.close()
+
+
+def test_sqlite_store_sweeps_in_batches(tmp_path):
+    store = SQLiteStore(str(tmp_path / "limits.db"), sweep_batch=2)
+    try:
+        now = store.clock()
+        for key in range(5):
+            store.acquire(key, now, 1.0, 0.0)
+        store.acquire(10, now, 100.0, 0.0)
+
+        later = now + 10.0
+        # Пачки по два ключа: 0-1, 2-3, 4 и 10; затем проход начинается заново
+        assert [store.sweep(later) for _ in range(4)] == [2, 2, 1, 0]
+        assert store.size() == 1
+        assert store.get(10) is not None
+    finally:
+        store.close()
+
+
+def test_memory_store_keeps_recent_keys_last():
+    store = MemoryStore()
+    now = store.clock()
+    store.acquire(1, now, 1.0, 10.0)
+    store.acquire(2, now, 5.0, 10.0)
+    # Обновленная запись переносится в конец порядка очистки
+    store.acquire(1, now, 10.0, 10.0)
+
+    # Очистка останавливается на первой непустой записи в порядке обновления
+    assert store.sweep(now + 6.0) == 1
+    assert store.get(2) is None
+    assert store.get(1) is not None
+
+
+def test_store_must_implement_all_methods():
+    class PartialStore(LimiterStore):
+        def clock(self) -> float:
+            return 0.0
+
+        def acquire(self, key: int, now: float, interval: float, tolerance: float) -> bool:
+            return True
+
+        def get(self, key: int) -> Optional[float]:
+            return None
+
+    with pytest.raises(TypeError):
+        PartialStore()
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import pytest
+
+from bot.message_tracker import MessageTracker
+from database.models import DatabaseManager
+
+
+@pytest.fixture
+def db_manager(db_path):
+    db_manager = DatabaseManager(db_path, activity_flush_interval=0)
+    yield db_manager
+    asyncio.run(db_manager.close())
+
+
+def make_tracker(db_manager, **options):
+    return MessageTracker(db_manager.get_bot_messages, db_manager.save_bot_messages, **options)
+
+
+def test_add_get_replace(db_manager):
+    tracker = make_tracker(db_manager, max_per_user=3)
+
+    async def scenario():
+        for message_id in [10, 11, 11, 12, 13]:
+            await tracker.add(1, message_id)
+        tracked = await tracker.get(1)
+        removed = await tracker.replace(1, keep=13)
+        kept = await tracker.get(1)
+        return tracked, removed, kept
+
+    tracked, removed, kept = asyncio.run(scenario())
+    # Повтор не добавляется, самое старое сообщение вытесняется
+    assert tracked == [11, 12, 13]
+    assert tracker.stats()["dropped"] == 1
+    assert removed == [11, 12]
+    assert kept == [13]
+
+
+def test_messages_survive_restart(db_manager):
+    async def scenario():
+        tracker = make_tracker(db_manager)
+        await tracker.add(1, 10)
+        await tracker.add(1, 11)
+        await tracker.add(2, 20)
+        assert await tracker.save() == 2
+
+        restarted = make_tracker(db_manager)
+        return await restarted.get(1), await restarted.get(2), await restarted.get(3)
+
+    assert asyncio.run(scenario()) == ([10, 11], [20], [])
+
+
+def test_cleared_user_is_not_resurrected_from_database(db_manager):
+    async def scenario():
+        tracker = make_tracker(db_manager)
+        await tracker.add(1, 10)
+        await tracker.save()
+
+        restarted = make_tracker(db_manager)
+        removed = await restarted.replace(1)
+        # Очистка до ttl не удаляет отметку, иначе записи из базы вернулись бы
+        restarted.sweep(int(time.time()) + 1)
+        after_sweep = await restarted.get(1)
+        await restarted.save()
+
+        return removed, after_sweep, await make_tracker(db_manager).get(1)
+
+    assert asyncio.run(scenario()) == ([10], [], [])
+
+
+def test_sweep_forgets_expired_users(db_manager):
+    tracker = make_tracker(db_manager, ttl=10)
+
+    async def scenario():
+        await tracker.add(1, 10)
+        await tracker.replace(2)
+
+    asyncio.run(scenario())
+    now = int(time.time())
+    assert tracker.sweep(now + 1) == 0
+    assert tracker.sweep(now + 11) == 2
+    assert tracker.stats()["users"] == 0
+
+
+def test_users_are_evicted_in_batches(db_manager):
+    tracker = make_tracker(db_manager, max_users=100)
+
+    async def scenario():
+        for user_id in range(101):
+            await tracker.add(user_id, 1)
+        # Самый давний пользователь вытеснен, недавно обновленный - нет
+        return await tracker.get(0), await tracker.get(100)
+
+    assert asyncio.run(scenario()) == ([], [1])
+    assert tracker.stats()["evicted"] == 2
+    assert tracker.stats()["users"] == 99
@@ -0,0 +1,195 @@
+import asyncio
+import calendar
+import sqlite3
+import time
+
+import pytest
+
+from database import migrations
+from database.migrations import (
+    LATEST_SCHEMA_VERSION,
+    apply_migrations,
+    find_unindexed_queries,
+    get_schema_version,
+)
+from database.models import DatabaseManager
+
+# Базовая схема (версия 0), как ее создавали первые версии бота
+LEGACY_SCHEMA = [
+    """
+    CREATE TABLE users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE subscriptions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        tariff_id INTEGER,
+        start_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        end_date TIMESTAMP,
+        is_active BOOLEAN DEFAULT 1
+    )
+    """,
+    """
+    CREATE TABLE payments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        tariff_id INTEGER,
+        amount REAL,
+        payment_method TEXT,
+        payment_id TEXT,
+        status TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE configs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        config_type TEXT,
+        config_data TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+
+def epoch(text: str) -> int:
+    """Секунды unix для времени UTC в формате SQLite"""
+    return calendar.timegm(time.strptime(text, "%Y-%m-%d %H:%M:%S"))
+
+
+@pytest.fixture
+def legacy_db(db_path):
+    conn = sqlite3.connect(db_path)
+    for statement in LEGACY_SCHEMA:
+        conn.execute(statement)
+    conn.execute(
+        "INSERT INTO users VALUES (1, 'user', 'First', 'Last', '2024-01-02 03:04:05', '2024-02-03 04:05:06')"
+    )
+    conn.execute(
+        "INSERT INTO subscriptions (user_id, tariff_id, start_date, end_date) "
+        "VALUES (1, 2, '2024-01-02 03:04:05', '2024-02-01 00:00:00')"
+    )
+    conn.execute(
+        "INSERT INTO payments (user_id, tariff_id, amount, payment_method, status, created_at) "
+        "VALUES (1, 2, 100.0, 'card', 'success', '2024-01-02 03:04:05')"
+    )
+    conn.execute(
+        "INSERT INTO configs (user_id, config_type, config_data, created_at) "
+        "VALUES (1, 'vpn', '{}', '2024-01-02 03:04:05')"
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def index_names(conn):
+    return {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def table_names(conn):
+    return {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_legacy_schema_is_migrated_to_latest(legacy_db):
+    assert get_schema_version(legacy_db) == 0
+
+    applied = apply_migrations(legacy_db)
+
+    assert applied == sorted(version for version, _, _ in migrations.MIGRATIONS)
+    assert get_schema_version(legacy_db) == LATEST_SCHEMA_VERSION
+    assert {
+        "idx_subscriptions_user_active_end",
+        "idx_subscriptions_user_start",
+        "idx_payments_user_created",
+        "idx_configs_user_created",
+        "idx_users_registration_date",
+        "idx_broadcast_jobs_status",
+    } <= index_names(legacy_db)
+    assert {"broadcast_jobs", "broadcast_recipients", "bot_messages"} <= table_names(legacy_db)
+    assert not {name for name in table_names(legacy_db) if name.endswith("_new")}
+
+
+def test_timestamps_are_converted_to_epoch(legacy_db):
+    apply_migrations(legacy_db)
+
+    user = legacy_db.execute(
+        "SELECT registration_date, last_activity FROM users WHERE user_id = 1"
+    ).fetchone()
+    assert user == (epoch("2024-01-02 03:04:05"), epoch("2024-02-03 04:05:06"))
+
+    start_date, end_date = legacy_db.execute(
+        "SELECT start_date, end_date FROM subscriptions WHERE user_id = 1"
+    ).fetchone()
+    assert start_date == epoch("2024-01-02 03:04:05")
+    # end_date записывалась по локальному времени сервера
+    expected_end = legacy_db.execute(
+        "SELECT CAST(strftime('%s', '2024-02-01 00:00:00', 'utc') AS INTEGER)"
+    ).fetchone()[0]
+    assert end_date == expected_end
+
+    payment = legacy_db.execute(
+        "SELECT created_at, subscription_id, status FROM payments WHERE user_id = 1"
+    ).fetchone()
+    assert payment == (epoch("2024-01-02 03:04:05"), None, "success")
+
+    config = legacy_db.execute("SELECT created_at FROM configs WHERE user_id = 1").fetchone()
+    assert config == (epoch("2024-01-02 03:04:05"),)
+
+
+def test_migrations_are_applied_once(legacy_db):
+    apply_migrations(legacy_db)
+    assert apply_migrations(legacy_db) == []
+    assert legacy_db.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+
+
+def test_failed_migration_is_rolled_back(legacy_db, monkeypatch):
+    failing = (
+        1,
+        "Сломанная миграция",
+        [
+            "CREATE INDEX idx_users_username ON users (username)",
+            "CREATE INDEX idx_broken ON missing_table (x)",
+        ],
+    )
+    monkeypatch.setattr(migrations, "MIGRATIONS", [failing])
+
+    with pytest.raises(sqlite3.OperationalError):
+        apply_migrations(legacy_db)
+
+    assert get_schema_version(legacy_db) == 0
+    assert "idx_users_username" not in index_names(legacy_db)
+
+
+def test_new_database_uses_indexes_for_hot_queries(db_path):
+    db_manager = DatabaseManager(db_path, activity_flush_interval=0)
+    try:
+        conn = sqlite3.connect(db_path)
+        try:
+            assert get_schema_version(conn) == LATEST_SCHEMA_VERSION
+            assert find_unindexed_queries(conn, DatabaseManager.QUERY_PLAN_CHECKS) == []
+        finally:
+            conn.close()
+    finally:
+        asyncio.run(db_manager.close())
+
+
+def test_restart_keeps_data(db_path):
+    db_manager = DatabaseManager(db_path, activity_flush_interval=0)
+    asyncio.run(db_manager.add_user(1, "user", "First", "Last"))
+    asyncio.run(db_manager.close())
+
+    db_manager = DatabaseManager(db_path, activity_flush_interval=0)
+    try:
+        user = asyncio.run(db_manager.get_user(1))
+    finally:
+        asyncio.run(db_manager.close())
+    assert user["username"] == "user"
+    assert isinstance(user["registration_date"], int)
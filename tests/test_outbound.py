@@ -0,0 +1,219 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+import pytest
+from telegram.error import BadRequest, RetryAfter
+
+from utils.outbound import OutboundQueue, TokenBucket
+
+# Допуск на разброс момента выполнения запроса в пуле потоков
+JITTER = 0.05
+
+
+class FakeBot:
+    """Поддельный Bot API с лимитами Telegram.
+
+    Как настоящий сервер, отвечает 429 (RetryAfter), если в скользящем окне
+    в 1 секунду больше global_rate запросов или если сообщения в чат идут
+    чаще chat_rate в секунду сверх запаса chat_burst. Первые throttle_times
+    ответов можно сделать 429 принудительно.
+    """
+
+    def __init__(self, global_rate=30.0, chat_rate=1.0, chat_burst=3.0, retry_after=1.0, throttle_times=0):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.retry_after = retry_after
+        self.throttle_times = throttle_times
+        self.calls = []
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self._chats = {}
+
+    def request(self, name):
+        """Запрос, на который действует только общий лимит"""
+        return self._handle(name, None)
+
+    def send_message(self, chat_id, text):
+        """Новое сообщение: общий лимит и лимит чата"""
+        return self._handle(text, chat_id)
+
+    def _handle(self, name, chat_id):
+        with self._lock:
+            now = time.monotonic()
+            if self.throttle_times:
+                self.throttle_times -= 1
+                raise RetryAfter(self.retry_after)
+            while self._recent and now - self._recent[0] >= 1.0 - JITTER:
+                self._recent.popleft()
+            if len(self._recent) >= self.global_rate:
+                self.rejected += 1
+                raise RetryAfter(self.retry_after)
+            if chat_id is not None:
+                tokens, updated = self._chats.get(chat_id, (self.chat_burst, now))
+                tokens = min(self.chat_burst, tokens + (now - updated) * self.chat_rate)
+                if tokens < 1 - JITTER * self.chat_rate:
+                    self.rejected += 1
+                    raise RetryAfter(self.retry_after)
+                self._chats[chat_id] = (tokens - 1, now)
+            self._recent.append(now)
+            self.calls.append((name, now))
+        return name
+
+
+def span(calls):
+    return calls[-1][1] - calls[0][1]
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2.0, capacity=2.0)
+    now = bucket.updated
+
+    assert bucket.delay(now) == 0.0
+    bucket.take()
+    bucket.take()
+    assert bucket.delay(now) == pytest.approx(0.5)
+    assert not bucket.full(now)
+    assert bucket.delay(now + 0.5) == 0.0
+    assert bucket.full(now + 10.0)
+    assert bucket.tokens == 2.0
+
+
+def test_global_rate_limit():
+    queue = OutboundQueue(global_rate=20.0)
+    bot = FakeBot(global_rate=20.0)
+
+    async def scenario():
+        await asyncio.gather(*[queue.call(bot.request, index) for index in range(6)])
+
+    asyncio.run(scenario())
+    assert [name for name, _ in bot.calls] == list(range(6))
+    assert bot.rejected == 0
+    # Первый запрос сразу, остальные - по одному раз в 1/20 секунды
+    assert span(bot.calls) >= 0.2
+    assert queue.stats()["sent"] == 6
+
+
+def test_chat_rate_limit_keeps_order():
+    queue = OutboundQueue(global_rate=1000.0, chat_rate=10.0, chat_burst=2.0)
+    bot = FakeBot(global_rate=1000.0, chat_rate=10.0, chat_burst=2.0)
+
+    async def scenario():
+        await asyncio.gather(
+            *[queue.send(1, bot.send_message, 1, index) for index in range(4)],
+            queue.send(2, bot.send_message, 2, "other"),
+        )
+
+    asyncio.run(scenario())
+    assert bot.rejected == 0
+    chat = [(name, at) for name, at in bot.calls if name != "other"]
+    assert [name for name, _ in chat] == [0, 1, 2, 3]
+    # Запас в два сообщения, дальше - не чаще 10 в секунду
+    assert span(chat[:2]) < 0.05
+    assert span(chat) >= 0.15
+    # Другой чат не ждет первый
+    other = next(at for name, at in bot.calls if name == "other")
+    assert other < chat[2][1]
+
+
+def test_interactive_requests_go_before_bulk():
+    queue = OutboundQueue(global_rate=20.0)
+    bot = FakeBot(global_rate=20.0)
+
+    async def scenario():
+        bulk = [asyncio.ensure_future(queue.call(bot.request, f"bulk{i}", bulk=True)) for i in range(5)]
+        await asyncio.sleep(0.01)
+        await queue.call(bot.request, "interactive")
+        await asyncio.gather(*bulk)
+
+    asyncio.run(scenario())
+    order = [name for name, _ in bot.calls]
+    # Первый массовый запрос забрал свободный токен, остальные уступили интерактивному
+    assert order.index("interactive") == 1
+    assert queue.stats()["requests"] == {"interactive": 1, "bulk": 5}
+
+
+def test_sustained_load_stays_within_limits():
+    queue = OutboundQueue(global_rate=40.0, chat_rate=5.0, chat_burst=2.0)
+    bot = FakeBot(global_rate=40.0, chat_rate=5.0, chat_burst=2.0)
+
+    async def scenario():
+        # Рассылка по 20 чатам, частые сообщения в несколько чатов и редактирования
+        await asyncio.gather(
+            *[queue.send(chat_id, bot.send_message, chat_id, f"bulk{chat_id}", bulk=True) for chat_id in range(20)],
+            *[queue.send(100 + index % 3, bot.send_message, 100 + index % 3, f"chat{index}") for index in range(24)],
+            *[queue.call(bot.request, f"edit{index}") for index in range(36)],
+        )
+
+    asyncio.run(scenario())
+    assert len(bot.calls) == 80
+    assert bot.rejected == 0
+    assert queue.stats()["throttled"] == 0
+    assert queue.stats()["sent"] == 80
+    # 80 запросов при 40 в секунду
+    assert span(bot.calls) >= 1.9
+
+
+def test_cancelled_requests_leave_no_depth():
+    queue = OutboundQueue(global_rate=5.0, chat_rate=1.0, chat_burst=1.0)
+    bot = FakeBot(global_rate=5.0, chat_rate=1.0, chat_burst=1.0)
+
+    async def scenario():
+        await queue.send(1, bot.send_message, 1, "first")
+        # Ждет лимита чата, ждет очереди чата, ждет токена общего ведра
+        blocked = [
+            asyncio.ensure_future(queue.send(1, bot.send_message, 1, "second")),
+            asyncio.ensure_future(queue.send(1, bot.send_message, 1, "third")),
+            asyncio.ensure_future(queue.call(bot.request, "edit")),
+        ]
+        await asyncio.sleep(0.05)
+        depth = queue.stats()["depth"]
+        for task in blocked:
+            task.cancel()
+        await asyncio.gather(*blocked, return_exceptions=True)
+        return depth
+
+    assert asyncio.run(scenario()) == 3
+    assert queue.stats()["depth"] == 0
+    assert [name for name, _ in bot.calls] == ["first"]
+
+
+def test_retry_after_pauses_and_retries():
+    queue = OutboundQueue(global_rate=1000.0, max_retries=3)
+    bot = FakeBot(global_rate=1000.0, retry_after=0.2, throttle_times=1)
+
+    async def scenario():
+        started = time.monotonic()
+        result = await queue.call(bot.request, "message")
+        return result, time.monotonic() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == "message"
+    assert elapsed >= 0.2
+    assert queue.stats()["throttled"] == 1
+    assert queue.stats()["failed"] == 0
+
+
+def test_retry_limit():
+    queue = OutboundQueue(global_rate=1000.0, max_retries=1)
+    bot = FakeBot(global_rate=1000.0, retry_after=0.01, throttle_times=5)
+
+    with pytest.raises(RetryAfter):
+        asyncio.run(queue.send(1, bot.send_message, 1, "message"))
+    assert queue.stats()["throttled"] == 2
+    assert queue.stats()["failed"] == 1
+
+
+def test_error_is_raised_without_retry():
+    queue = OutboundQueue()
+
+    def broken():
+        raise BadRequest("Message is not modified")
+
+    with pytest.raises(BadRequest):
+        asyncio.run(queue.call(broken))
+    assert queue.stats()["failed"] == 1
+    assert queue.stats()["depth"] == 0
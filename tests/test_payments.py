@@ -0,0 +1,117 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from database.models import DatabaseManager
+
+MODES = [
+    {},
+    {"wal_mode": True},
+    {"wal_mode": True, "write_queue": True},
+]
+MODE_IDS = ["default", "wal", "wal+write_queue"]
+
+CONFIGS = {"vless": {"uuid": "a"}, "wireguard": {"key": "b"}}
+
+
+@pytest.fixture(params=MODES, ids=MODE_IDS)
+def db_manager(request, db_path, connection_threads):
+    db_manager = DatabaseManager(db_path, activity_flush_interval=0, **request.param)
+    yield db_manager
+    asyncio.run(db_manager.close())
+    assert connection_threads() == []
+
+
+@pytest.fixture
+def payment_id(db_manager):
+    async def prepare():
+        await db_manager.add_user(1, "user", "First", "Last")
+        return await db_manager.create_payment(1, 2, 100.0, "card")
+
+    return asyncio.run(prepare())
+
+
+def count(db_path, query):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(query).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_concurrent_activation_happens_once(db_manager, payment_id):
+    async def activate_many():
+        return await asyncio.gather(
+            *[db_manager.activate_payment(payment_id, "ext-1", 30, CONFIGS) for _ in range(10)]
+        )
+
+    # Часть вызовов идет из одного цикла событий, часть - из разных потоков
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        batch = asyncio.run(activate_many())
+        with lock:
+            results.extend(batch)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 40
+    assert sum(result["activated"] for result in results) == 1
+    assert {result["subscription_id"] for result in results} == {results[0]["subscription_id"]}
+    assert {result["status"] for result in results} == {"success"}
+
+    db_path = db_manager.db_path
+    assert count(db_path, "SELECT COUNT(*) FROM subscriptions WHERE user_id = 1") == 1
+    assert count(db_path, "SELECT COUNT(*) FROM configs WHERE user_id = 1") == len(CONFIGS)
+    assert count(db_path, "SELECT subscription_id FROM payments WHERE user_id = 1") == results[0]["subscription_id"]
+
+
+def test_repeated_activation_returns_existing_result(db_manager, payment_id):
+    async def scenario():
+        first = await db_manager.activate_payment(payment_id, "ext-1", 30, CONFIGS)
+        second = await db_manager.activate_payment(payment_id, "ext-2", 30, CONFIGS)
+        payment = await db_manager.get_payment(payment_id)
+        return first, second, payment
+
+    first, second, payment = asyncio.run(scenario())
+    assert first["activated"] and not second["activated"]
+    assert second["subscription_id"] == first["subscription_id"]
+    assert payment["payment_id"] == "ext-1"
+
+
+def test_activation_of_missing_payment(db_manager, payment_id):
+    assert asyncio.run(db_manager.activate_payment(payment_id + 1, "ext", 30, CONFIGS)) is None
+
+
+def test_activation_invalidates_cached_subscription(db_manager, payment_id):
+    async def scenario():
+        before = await db_manager.get_active_subscription(1)
+        await db_manager.activate_payment(payment_id, "ext-1", 30, CONFIGS)
+        after = await db_manager.get_active_subscription(1)
+        return before, after
+
+    before, after = asyncio.run(scenario())
+    assert before is None
+    assert after is not None and after["tariff_id"] == 2
+
+
+def test_failed_activation_leaves_payment_pending(db_manager, payment_id):
+    # Конфигурация, которую нельзя сериализовать, ломает транзакцию после UPDATE платежа
+    broken = {"vless": {"uuid": object()}}
+
+    with pytest.raises(TypeError):
+        asyncio.run(db_manager.activate_payment(payment_id, "ext-1", 30, broken))
+
+    db_path = db_manager.db_path
+    assert count(db_path, f"SELECT status FROM payments WHERE id = {payment_id}") == "pending"
+    assert count(db_path, "SELECT COUNT(*) FROM subscriptions") == 0
+
+    result = asyncio.run(db_manager.activate_payment(payment_id, "ext-1", 30, CONFIGS))
+    assert result["activated"]
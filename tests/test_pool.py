@@ -0,0 +1,163 @@
+import asyncio
+import threading
+
+import pytest
+
+from database.models import DatabaseManager
+from database.pool import ConnectionPool
+from utils.loop_thread import LoopThread
+
+
+def test_connection_is_reused(db_path):
+    async def scenario():
+        pool = ConnectionPool(db_path, size=2)
+        async with pool.connection() as first:
+            pass
+        async with pool.connection() as second:
+            pass
+        stats = pool.stats()
+        await pool.close()
+        return first, second, stats
+
+    first, second, stats = asyncio.run(scenario())
+    assert first is second
+    assert stats["opened"] == 1
+    assert stats["idle"] == 1
+
+
+def test_waiter_gets_released_connection(db_path):
+    async def scenario():
+        pool = ConnectionPool(db_path, size=1)
+
+        async def use():
+            async with pool.connection() as db:
+                await asyncio.sleep(0.01)
+                async with db.execute("SELECT 1") as cursor:
+                    return (await cursor.fetchone())[0]
+
+        results = await asyncio.gather(*[use() for _ in range(5)])
+        stats = pool.stats()
+        await pool.close()
+        return results, stats
+
+    results, stats = asyncio.run(scenario())
+    assert results == [1] * 5
+    assert stats["opened"] == 1
+    assert stats["waiting"] == 0
+
+
+def test_unfinished_transaction_is_rolled_back(db_path):
+    async def scenario():
+        pool = ConnectionPool(db_path, size=1)
+        async with pool.connection() as db:
+            await db.execute("CREATE TABLE t (x INTEGER)")
+            await db.commit()
+        with pytest.raises(RuntimeError):
+            async with pool.connection() as db:
+                await db.execute("INSERT INTO t VALUES (1)")
+                raise RuntimeError("сбой обработчика")
+        async with pool.connection() as db:
+            in_transaction = db.in_transaction
+            async with db.execute("SELECT COUNT(*) FROM t") as cursor:
+                count = (await cursor.fetchone())[0]
+        await pool.close()
+        return in_transaction, count
+
+    assert asyncio.run(scenario()) == (False, 0)
+
+
+def test_acquire_after_close_fails(db_path):
+    async def scenario():
+        pool = ConnectionPool(db_path, size=1)
+        await pool.close()
+        with pytest.raises(RuntimeError):
+            await pool.acquire()
+
+    asyncio.run(scenario())
+
+
+def test_close_stops_connection_threads(db_path, connection_threads):
+    async def scenario():
+        pool = ConnectionPool(db_path, size=3)
+        connections = await asyncio.gather(*[pool.acquire() for _ in range(3)])
+        for db in connections:
+            pool.release(db)
+        await pool.close()
+        return pool.stats()
+
+    assert asyncio.run(scenario())["opened"] == 0
+    assert connection_threads() == []
+
+
+def test_connection_returned_after_close_is_closed(db_path, connection_threads, monkeypatch):
+    """Соединение, занятое обработчиком при закрытии пула, закрывается при возврате"""
+    errors = []
+    monkeypatch.setattr(threading, "excepthook", errors.append)
+    thread = LoopThread("test-pool").start()
+    pool = ConnectionPool(db_path, size=2)
+    acquired = asyncio.Event()
+
+    async def holder():
+        async with pool.connection() as db:
+            await db.execute("SELECT 1")
+            thread.loop.call_soon(acquired.set)
+            await asyncio.sleep(10)
+
+    async def wait_acquired():
+        await acquired.wait()
+
+    thread.submit(holder())
+    thread.submit(wait_acquired()).result(5)
+    thread.submit(pool.close()).result(5)
+    # Остановка цикла отменяет обработчик, и он возвращает соединение в закрытый пул
+    thread.stop()
+
+    assert connection_threads() == []
+    # Соединение закрыто до остановки цикла, а не брошено незавершенной задачей
+    assert errors == []
+    assert pool.stats()["opened"] == 0
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"wal_mode": True},
+        {"wal_mode": True, "write_queue": True},
+    ],
+    ids=["default", "wal", "wal+write_queue"],
+)
+def test_database_manager_close_stops_all_threads(db_path, connection_threads, options):
+    db_manager = DatabaseManager(db_path, activity_flush_interval=0.05, **options)
+
+    async def scenario():
+        await db_manager.add_user(1, "user", "First", "Last")
+        db_manager.activity.touch(1)
+        readers = [asyncio.ensure_future(db_manager.get_user(1)) for _ in range(20)]
+        await asyncio.sleep(0)
+        await db_manager.close()
+        await asyncio.gather(*readers, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+    assert connection_threads() == []
+    assert not db_manager.background.running
+    assert db_manager.pool.stats()["opened"] == 0
+    # Отметка активности записана при закрытии
+    assert db_manager.activity.stats()["pending"] == 0
+
+
+def test_database_manager_close_survives_flush_error(db_path, connection_threads):
+    db_manager = DatabaseManager(db_path, activity_flush_interval=60, write_queue=True)
+
+    async def failing_flush(rows):
+        raise RuntimeError("база недоступна")
+
+    db_manager.activity.flush_fn = failing_flush
+    db_manager.activity.touch(1)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(db_manager.close())
+
+    assert connection_threads() == []
+    assert not db_manager.background.running
@@ -0,0 +1,121 @@
+import time
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from telegram.ext import DispatcherHandlerStop
+
+from bot.middlewares.limiter_store import MemoryStore
+from bot.middlewares.rate_limiter import RateLimiter
+
+
+def make_limiter(store, **limits):
+    limits = limits or {"menu": (3, 3.0)}
+    return RateLimiter(limits, default_class=next(iter(limits)), store=store)
+
+
+def callback_update(user_id, data):
+    query = SimpleNamespace(data=data, answer=Mock())
+    return SimpleNamespace(
+        callback_query=query,
+        message=None,
+        effective_user=SimpleNamespace(id=user_id),
+    )
+
+
+def test_burst_then_steady_rate(limiter_store):
+    limiter = make_limiter(limiter_store)
+    now = limiter_store.clock()
+
+    assert [limiter.allow(1, 0, now) for _ in range(4)] == [True, True, True, False]
+    # Токен возвращается раз в window / limit секунд
+    assert [limiter.allow(1, 0, now + 1.0) for _ in range(2)] == [True, False]
+    # За полное окно ведро снова наполняется целиком
+    assert [limiter.allow(1, 0, now + 10.0) for _ in range(4)] == [True, True, True, False]
+
+
+def test_rejected_request_does_not_take_token(limiter_store):
+    limiter = make_limiter(limiter_store)
+    now = limiter_store.clock()
+
+    for _ in range(3):
+        limiter.allow(1, 0, now)
+    for _ in range(100):
+        assert not limiter.allow(1, 0, now + 0.5)
+    assert limiter.allow(1, 0, now + 1.0)
+
+
+def test_users_and_classes_are_independent(limiter_store):
+    limiter = make_limiter(limiter_store, menu=(1, 60.0), payment=(1, 60.0))
+    now = limiter_store.clock()
+    # Номер класса - его позиция в limits
+    payment = 1
+
+    assert limiter.allow(1, 0, now)
+    assert not limiter.allow(1, 0, now)
+    assert limiter.allow(1, payment, now)
+    assert limiter.allow(2, 0, now)
+
+
+def test_zero_limit_disables_class(limiter_store):
+    limiter = make_limiter(limiter_store, menu=(1, 60.0), admin=(0, 60.0))
+    now = limiter_store.clock()
+    admin = 1
+
+    assert all(limiter.allow(1, admin, now) for _ in range(100))
+    assert limiter_store.size() == 0
+
+
+def test_full_buckets_are_swept(limiter_store):
+    limiter = make_limiter(limiter_store)
+    now = limiter_store.clock()
+
+    limiter.allow(1, 0, now)
+    limiter.allow(2, 0, now)
+    assert limiter.stats()["tracked"] == 2
+
+    # Через окно ведра полные, очистка удаляет их записи
+    limiter.allow(3, 0, now + limiter_store.sweep_interval + 10.0)
+    assert limiter.stats()["swept"] == 2
+    assert limiter.stats()["tracked"] == 1
+
+
+def test_route_classes(limiter_store):
+    limiter = make_limiter(limiter_store, menu=(60, 60.0), payment=(15, 60.0))
+    limiter.classify_routes("payment", "pay")
+
+    assert limiter.route_class(callback_update(1, "pay:3")) == 1
+    # Старый формат callback_data
+    assert limiter.route_class(callback_update(1, "pay_3")) == 1
+    assert limiter.route_class(callback_update(1, "tariffs")) == 0
+
+
+def test_check_stops_update_and_warns_once():
+    limiter = make_limiter(MemoryStore(), menu=(1, 60.0))
+
+    first = callback_update(1, "menu")
+    limiter.check(first, None)
+    first.callback_query.answer.assert_not_called()
+
+    rejected = [callback_update(1, "menu") for _ in range(2)]
+    for update in rejected:
+        with pytest.raises(DispatcherHandlerStop):
+            limiter.check(update, None)
+
+    # Ответ на нажатие отправляется в общем цикле событий
+    deadline = time.monotonic() + 5
+    while not all(update.callback_query.answer.called for update in rejected):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    warning, repeated = (update.callback_query.answer.call_args for update in rejected)
+    assert warning.kwargs == {"show_alert": True}
+    assert repeated.args == () and repeated.kwargs == {}
+    assert limiter.stats()["rejected"] == {"menu": 2}
+
+
+def test_invalid_limits():
+    with pytest.raises(ValueError):
+        RateLimiter({"menu": (1, 1.0)}, default_class="payment")
+    with pytest.raises(ValueError):
+        RateLimiter({f"class{i}": (1, 1.0) for i in range(9)}, default_class="class0")
@@ -0,0 +1,169 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+
+from bot.router import CallbackRouter, callback_data
+from utils import async_bridge
+
+
+def press(data, user_id=1, update_id=0):
+    return SimpleNamespace(
+        update_id=update_id,
+        callback_query=SimpleNamespace(data=data, answer=Mock()),
+        effective_user=SimpleNamespace(id=user_id),
+    )
+
+
+def settle():
+    """Дождаться заданий, уже отправленных в общий цикл событий (отметки завершения обработчиков)"""
+    async def barrier():
+        pass
+
+    async_bridge.submit(barrier()).result(5)
+
+
+def answered(update):
+    """Дождаться подтверждения нажатия: answer вызывается в пуле потоков общего цикла"""
+    answer = update.callback_query.answer
+    deadline = time.monotonic() + 5
+    while not answer.called and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return answer
+
+
+class Recorder:
+    """Обработчик, который записывает вызовы и может ждать разрешения завершиться"""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+        self.entered = threading.Event()
+
+    def __call__(self, update, context):
+        self.calls.append((update.update_id, list(context.args)))
+        self.entered.set()
+        self.release.wait(5)
+
+
+def dispatch(router, update):
+    router.dispatch(update, SimpleNamespace(args=None))
+
+
+def test_resolve():
+    router = CallbackRouter()
+    router.add("tariff", Recorder(), int)
+    router.add("payment_method", Recorder(), int, str)
+
+    assert callback_data("tariff", 3) == "tariff:3"
+    assert router.resolve("tariff:3") == ("tariff", [3])
+    assert router.resolve("payment_method:2:card") == ("payment_method", [2, "card"])
+    # Старый формат callback_data
+    assert router.resolve("tariff_3") == ("tariff", [3])
+    assert router.resolve("payment_method_2_card") == ("payment_method", [2, "card"])
+
+    assert router.resolve("tariff:x") is None
+    assert router.resolve("tariff") is None
+    assert router.resolve("tariff:1:2") is None
+    assert router.resolve("unknown:1") is None
+    assert router.resolve(None) is None
+
+    with pytest.raises(ValueError):
+        router.add("tariff", Recorder())
+    with pytest.raises(ValueError):
+        router.add("a:b", Recorder())
+
+
+def test_press_is_acknowledged_and_handled():
+    router = CallbackRouter()
+    handler = Recorder()
+    router.add("tariff", handler, int)
+
+    update = press("tariff:3", update_id=1)
+    dispatch(router, update)
+    assert handler.calls == [(1, [3])]
+    answered(update).assert_called_once_with(None)
+    assert router.stats()["hits"] == {"tariff": 1}
+
+
+def test_invalid_data_is_rejected_and_answered():
+    router = CallbackRouter()
+    handler = Recorder()
+    router.add("tariff", handler, int)
+
+    update = press("tariff:abc")
+    dispatch(router, update)
+    assert handler.calls == []
+    answered(update).assert_called_once_with(None)
+    assert router.stats()["rejected"] == 1
+
+
+def test_ack_text():
+    router = CallbackRouter()
+    router.add("admin", Recorder(), ack_text=lambda update: "Доступ запрещен")
+
+    update = press("admin")
+    dispatch(router, update)
+
+    answered(update).assert_called_once_with("Доступ запрещен")
+
+
+def test_repeated_press_while_running_is_collapsed():
+    router = CallbackRouter()
+    handler = Recorder()
+    handler.release.clear()
+    router.add("refresh", handler)
+
+    first = threading.Thread(target=dispatch, args=(router, press("refresh", update_id=1)))
+    first.start()
+    assert handler.entered.wait(5)
+
+    repeat = press("refresh", update_id=2)
+    dispatch(router, repeat)
+    # Нажатие другого пользователя не схлопывается
+    other = threading.Thread(target=dispatch, args=(router, press("refresh", user_id=2, update_id=3)))
+    other.start()
+
+    handler.release.set()
+    first.join(5)
+    other.join(5)
+
+    assert sorted(update_id for update_id, _ in handler.calls) == [1, 3]
+    answered(repeat).assert_called_once_with(None)
+    assert router.stats()["collapsed"] == 1
+
+
+def test_press_after_finish_runs_again():
+    router = CallbackRouter(dedupe_window=60.0)
+    handler = Recorder()
+    router.add("refresh", handler)
+
+    dispatch(router, press("refresh", update_id=1))
+    settle()
+    dispatch(router, press("refresh", update_id=2))
+    settle()
+
+    assert [update_id for update_id, _ in handler.calls] == [1, 2]
+    assert router.stats()["collapsed"] == 0
+
+
+def test_idempotent_route_absorbs_late_repeats():
+    router = CallbackRouter(dedupe_window=0.2)
+    handler = Recorder()
+    router.add("config", handler, str, idempotent=True)
+
+    dispatch(router, press("config:vless", update_id=1))
+    settle()
+    dispatch(router, press("config:vless", update_id=2))
+    # Другой аргумент - другая кнопка
+    dispatch(router, press("config:wireguard", update_id=3))
+    settle()
+    time.sleep(0.25)
+    dispatch(router, press("config:vless", update_id=4))
+    settle()
+
+    assert [update_id for update_id, _ in handler.calls] == [1, 3, 4]
+    assert router.stats()["collapsed"] == 1
@@ -0,0 +1,146 @@
+import asyncio
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from utils.loop_thread import LoopThread
+from utils.update_scheduler import UpdateScheduler
+
+
+@pytest.fixture
+def loop_thread():
+    thread = LoopThread("test-scheduler").start()
+    yield thread
+    thread.stop()
+
+
+def update(update_id, user_id):
+    return SimpleNamespace(update_id=update_id, effective_user=SimpleNamespace(id=user_id))
+
+
+def close(scheduler, timeout=None):
+    return scheduler.loop_thread.submit(scheduler.close(timeout)).result(10)
+
+
+def test_updates_of_one_user_run_in_order(loop_thread):
+    scheduler = UpdateScheduler(loop_thread, lanes=4).start()
+    done = []
+
+    def job(index):
+        async def run():
+            await asyncio.sleep(random.uniform(0, 0.005))
+            done.append(index)
+        return run
+
+    for index in range(30):
+        scheduler.schedule(update(index, 1), job(index), pytest.fail)
+    assert close(scheduler) == 0
+    assert done == list(range(30))
+
+
+def test_different_users_run_in_parallel(loop_thread):
+    scheduler = UpdateScheduler(loop_thread, lanes=4).start()
+
+    async def slow():
+        await asyncio.sleep(0.2)
+
+    started = time.monotonic()
+    for user_id in range(4):
+        scheduler.schedule(update(user_id, user_id), slow, pytest.fail)
+    close(scheduler)
+    assert time.monotonic() - started < 0.6
+    assert scheduler.stats()["completed"] == 4
+
+
+def test_error_is_reported_and_lane_continues(loop_thread):
+    scheduler = UpdateScheduler(loop_thread, lanes=1).start()
+    errors = []
+    done = []
+
+    async def failing():
+        raise ValueError("сбой")
+
+    async def ok():
+        done.append(True)
+
+    scheduler.schedule(update(1, 1), failing, errors.append)
+    scheduler.schedule(update(2, 1), ok, errors.append)
+    close(scheduler)
+
+    assert [type(error) for error in errors] == [ValueError]
+    assert done == [True]
+    assert scheduler.stats()["failed"] == 1
+    assert scheduler.stats()["completed"] == 2
+
+
+def test_pending_counts_updates(loop_thread):
+    scheduler = UpdateScheduler(loop_thread, lanes=2).start()
+    release = threading.Event()
+
+    async def wait():
+        await asyncio.get_running_loop().run_in_executor(None, release.wait)
+
+    async def noop():
+        pass
+
+    # Два задания одного обновления считаются одним незавершенным обновлением
+    scheduler.schedule(update(1, 1), wait, pytest.fail)
+    scheduler.schedule(update(1, 1), noop, pytest.fail)
+    scheduler.schedule(update(2, 2), wait, pytest.fail)
+    assert scheduler.pending() == 2
+
+    release.set()
+    assert close(scheduler) == 0
+    assert scheduler.pending() == 0
+
+
+def test_close_timeout_returns_unfinished(loop_thread):
+    scheduler = UpdateScheduler(loop_thread, lanes=2).start()
+
+    async def forever():
+        await asyncio.sleep(60)
+
+    async def noop():
+        pass
+
+    scheduler.schedule(update(1, 1), forever, pytest.fail)
+    scheduler.schedule(update(2, 1), noop, pytest.fail)
+    scheduler.schedule(update(3, 2), noop, pytest.fail)
+
+    assert close(scheduler, timeout=0.2) == 2
+    with pytest.raises(RuntimeError):
+        scheduler.schedule(update(4, 1), noop, pytest.fail)
+
+
+def test_full_lane_blocks_dispatcher(loop_thread):
+    scheduler = UpdateScheduler(loop_thread, lanes=1, queue_size=1).start()
+    release = threading.Event()
+
+    async def wait():
+        await asyncio.get_running_loop().run_in_executor(None, release.wait)
+
+    async def noop():
+        pass
+
+    scheduler.schedule(update(1, 1), wait, pytest.fail)
+    # Дожидаемся, пока исполнитель заберет первое задание и освободит очередь
+    deadline = time.monotonic() + 5
+    while scheduler.stats()["depth"]:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    scheduler.schedule(update(2, 1), noop, pytest.fail)
+
+    blocked = threading.Thread(target=scheduler.schedule, args=(update(3, 1), noop, pytest.fail))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+
+    release.set()
+    blocked.join(5)
+    assert not blocked.is_alive()
+    close(scheduler)
+    assert scheduler.stats()["blocked"] == 1
+    assert scheduler.stats()["completed"] == 3
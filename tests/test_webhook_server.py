@@ -0,0 +1,157 @@
+import asyncio
+import json
+import threading
+import time
+
+import aiohttp
+import pytest
+
+from utils.webhook_server import SECRET_HEADER, WebhookServer
+
+SECRET = "secret"
+
+
+class Receiver:
+    """process_update, который записывает обновления и может ждать разрешения продолжить"""
+
+    def __init__(self):
+        self.updates = []
+        self.release = threading.Event()
+        self.release.set()
+        self.entered = threading.Event()
+
+    def __call__(self, data):
+        self.updates.append(data["update_id"])
+        self.entered.set()
+        self.release.wait(10)
+
+    def wait_for(self, count, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while len(self.updates) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.updates
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(receiver, **options):
+        webhook = WebhookServer(receiver, SECRET, host="127.0.0.1", port=0, **options)
+        webhook.start()
+        servers.append((webhook, receiver))
+        return webhook
+
+    yield start
+    for webhook, receiver in servers:
+        receiver.release.set()
+        webhook.close()
+
+
+def post(webhook, bodies, secret=SECRET, concurrency=1):
+    """Отправить тела запросов; возвращает [(статус, задержка ответа в секундах)] в порядке bodies"""
+    url = f"http://127.0.0.1:{webhook.port}{webhook.path}"
+
+    async def send_all():
+        results = [None] * len(bodies)
+        queue = list(enumerate(bodies))
+        queue.reverse()
+        async with aiohttp.ClientSession(headers={SECRET_HEADER: secret}) as session:
+            async def worker():
+                while queue:
+                    index, body = queue.pop()
+                    started = time.perf_counter()
+                    async with session.post(url, data=body) as response:
+                        await response.read()
+                        results[index] = (response.status, time.perf_counter() - started)
+
+            await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return results
+
+    return asyncio.run(send_all())
+
+
+def update_body(update_id):
+    return json.dumps({"update_id": update_id, "message": {"text": "hi"}})
+
+
+def test_wrong_secret_is_forbidden(server):
+    receiver = Receiver()
+    webhook = server(receiver)
+
+    [(status, _)] = post(webhook, [update_body(1)], secret="wrong")
+
+    assert status == 403
+    assert webhook.stats()["rejected"] == 1
+    assert receiver.updates == []
+
+
+def test_valid_updates_are_accepted_at_once_and_forwarded_in_order(server):
+    receiver = Receiver()
+    receiver.release.clear()
+    webhook = server(receiver)
+
+    # Обработка первого обновления заблокирована, а ответы все равно приходят сразу
+    results = post(webhook, [update_body(update_id) for update_id in range(1, 11)])
+    assert [status for status, _ in results] == [200] * 10
+    assert receiver.entered.wait(5)
+    assert receiver.updates == [1]
+
+    receiver.release.set()
+    assert receiver.wait_for(10) == list(range(1, 11))
+    assert webhook.stats()["received"] == 10
+
+
+def test_full_intake_queue_answers_503(server):
+    receiver = Receiver()
+    receiver.release.clear()
+    webhook = server(receiver, intake_size=2)
+
+    [(status, _)] = post(webhook, [update_body(1)])
+    assert status == 200
+    # Первое обновление забрано из очереди и ждет в process_update, еще два помещаются в очередь
+    assert receiver.entered.wait(5)
+    results = post(webhook, [update_body(update_id) for update_id in (2, 3, 4)])
+
+    assert [status for status, _ in results] == [200, 200, 503]
+    assert webhook.stats()["dropped"] == 1
+
+    receiver.release.set()
+    assert receiver.wait_for(3) == [1, 2, 3]
+
+
+def test_malformed_body_is_rejected(server):
+    receiver = Receiver()
+    webhook = server(receiver)
+
+    results = post(webhook, ["{not json", "[1, 2]", "", update_body(1)])
+
+    assert [status for status, _ in results] == [400, 400, 400, 200]
+    assert receiver.wait_for(1) == [1]
+    assert webhook.stats()["malformed"] == 3
+    assert webhook.stats()["failed"] == 0
+
+
+@pytest.mark.slow
+def test_load(server):
+    """Нагрузка синтетическими обновлениями: пропускная способность и p99 задержки ответа"""
+    count = 5000
+    receiver = Receiver()
+    webhook = server(receiver, intake_size=count)
+
+    started = time.perf_counter()
+    results = post(webhook, [update_body(update_id) for update_id in range(count)], concurrency=50)
+    accepted = time.perf_counter() - started
+    assert receiver.wait_for(count, timeout=60) == list(range(count))
+    processed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[len(latencies) * 99 // 100]
+    print(
+        f"\nwebhook: {count} обновлений, прием {count / accepted:.0f} обн/с, "
+        f"до Dispatcher {count / processed:.0f} обн/с, ответ p50 {p50 * 1000:.1f} мс, "
+        f"p99 {p99 * 1000:.1f} мс"
+    )
+    assert {status for status, _ in results} == {200}
+    assert p99 < 1.0
@@ -0,0 +1,113 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from database.writer import WriteQueue
+
+
+@pytest.fixture
+def table(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE t (x INTEGER UNIQUE)")
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return [x for (x,) in conn.execute("SELECT x FROM t ORDER BY x")]
+    finally:
+        conn.close()
+
+
+def insert(x):
+    async def op(db):
+        cursor = await db.execute("INSERT INTO t (x) VALUES (?)", (x,))
+        return cursor.lastrowid
+
+    return op
+
+
+def test_operations_share_one_commit(table, connection_threads):
+    writer = WriteQueue(table, max_batch_size=64, max_batch_delay=0.05)
+    writer.start()
+
+    async def scenario():
+        results = await asyncio.gather(*[writer.submit(insert(x)) for x in range(10)])
+        await writer.close()
+        return results
+
+    assert sorted(asyncio.run(scenario())) == list(range(1, 11))
+    assert rows(table) == list(range(10))
+    assert writer.stats()["batches"] == 1
+    assert writer.stats()["operations"] == 10
+    assert connection_threads() == []
+
+
+def test_failed_operation_rolls_back_only_its_savepoint(table):
+    writer = WriteQueue(table, max_batch_delay=0.05)
+    writer.start()
+
+    async def insert_then_fail(db):
+        await db.execute("INSERT INTO t (x) VALUES (100)")
+        # Повтор нарушает UNIQUE: откатывается вся операция, включая первую вставку
+        await db.execute("INSERT INTO t (x) VALUES (1)")
+
+    async def scenario():
+        results = await asyncio.gather(
+            writer.submit(insert(1)),
+            writer.submit(insert_then_fail),
+            writer.submit(insert(2)),
+            return_exceptions=True,
+        )
+        await writer.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert isinstance(results[1], sqlite3.IntegrityError)
+    assert rows(table) == [1, 2]
+    assert writer.stats()["batches"] == 1
+    assert writer.stats()["operations"] == 2
+
+
+def test_batch_size_limit(table):
+    writer = WriteQueue(table, max_batch_size=3, max_batch_delay=0.05)
+    writer.start()
+
+    async def scenario():
+        await asyncio.gather(*[writer.submit(insert(x)) for x in range(7)])
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert rows(table) == list(range(7))
+    assert writer.stats()["batches"] == 3
+
+
+def test_close_commits_queued_operations(table, connection_threads):
+    writer = WriteQueue(table, max_batch_size=2, max_batch_delay=0.05)
+    writer.start()
+
+    async def scenario():
+        pending = [asyncio.ensure_future(writer.submit(insert(x))) for x in range(5)]
+        await asyncio.sleep(0)
+        await writer.close()
+        await asyncio.gather(*pending)
+        with pytest.raises(RuntimeError):
+            await writer.submit(insert(99))
+
+    asyncio.run(scenario())
+    assert rows(table) == list(range(5))
+    assert connection_threads() == []
+
+
+def test_failed_pragma_closes_connection(table, connection_threads):
+    writer = WriteQueue(table, pragmas={"busy_timeout": "not a number"})
+    writer.start()
+
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(writer.close())
+
+    assert connection_threads() == []
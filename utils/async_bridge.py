@@ -0,0 +1,125 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Coroutine, Optional
+
+from utils.loop_thread import LoopThread
+from utils.update_scheduler import UpdateScheduler
+
+logger = logging.getLogger(__name__)
+
+# Единственный на процесс цикл событий, в котором выполняются все асинхронные обработчики
+_bridge = LoopThread("async-bridge")
+_bridge_lock = threading.Lock()
+_io_threads = 16
+_lanes = 0
+_lane_queue_size = 100
+_scheduler: Optional[UpdateScheduler] = None
+
+
+def configure(io_threads: int, lanes: int = 0, lane_queue_size: int = 100) -> None:
+    """Задать параметры моста (до его запуска).
+
+    :param io_threads: Размер пула потоков для блокирующих вызовов
+    :param lanes: Количество дорожек планировщика обновлений (0 - без упорядочивания)
+    :param lane_queue_size: Максимальная длина очереди одной дорожки
+    """
+    global _io_threads, _lanes, _lane_queue_size
+    _io_threads = max(1, io_threads)
+    _lanes = max(0, lanes)
+    _lane_queue_size = lane_queue_size
+
+
+def get_bridge() -> LoopThread:
+    """Получить поток цикла событий, запустив его при первом обращении"""
+    if not _bridge.running:
+        with _bridge_lock:
+            if not _bridge.running:
+                _bridge.start()
+                _bridge.loop.set_default_executor(
+                    ThreadPoolExecutor(max_workers=_io_threads, thread_name_prefix="bridge-io")
+                )
+                _start_scheduler()
+    return _bridge
+
+
+def _start_scheduler() -> None:
+    """Запустить планировщик обновлений, если он включен"""
+    global _scheduler
+    if _lanes > 0:
+        _scheduler = UpdateScheduler(_bridge, lanes=_lanes, queue_size=_lane_queue_size).start()
+
+
+def get_scheduler() -> Optional[UpdateScheduler]:
+    """Получить планировщик обновлений (None, если он выключен или мост не запущен)"""
+    return _scheduler
+
+
+def submit(coro: Coroutine[Any, Any, Any]) -> Future:
+    """Запланировать корутину в общем цикле событий из любого потока"""
+    return get_bridge().submit(coro)
+
+
+async def run_sync(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Выполнить блокирующий вызов (например, метод Bot из PTB v13) в пуле потоков"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+def async_handler(func: Callable[..., Coroutine[Any, Any, Any]]) -> Callable[..., None]:
+    """Превратить асинхронный обработчик в синхронный обработчик Dispatcher.
+
+    Корутина отправляется в общий цикл событий, а поток Dispatcher сразу
+    освобождается. Если включен планировщик, обработчик встает в очередь
+    дорожки пользователя и выполняется после его предыдущих обновлений.
+    Исключение обработчика передается в обработчики ошибок Dispatcher.
+    """
+    @functools.wraps(func)
+    def wrapper(self, update, context, *args, **kwargs) -> None:
+        on_error = functools.partial(_report_error, update, context)
+        get_bridge()
+        scheduler = _scheduler
+        if scheduler is not None:
+            scheduler.schedule(
+                update, lambda: func(self, update, context, *args, **kwargs), on_error
+            )
+            return
+        future = submit(func(self, update, context, *args, **kwargs))
+        future.add_done_callback(functools.partial(_future_done, on_error))
+
+    return wrapper
+
+
+def _future_done(on_error: Callable[[BaseException], None], future: Future) -> None:
+    """Передать ошибку завершившейся корутины обработчику"""
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        on_error(error)
+
+
+def _report_error(update: Any, context: Any, error: BaseException) -> None:
+    """Передать ошибку асинхронного обработчика в Dispatcher"""
+    dispatcher = getattr(context, "dispatcher", None)
+    if dispatcher is not None:
+        dispatcher.dispatch_error(update, error)
+    else:
+        logger.error("Ошибка в обработчике: %s", error, exc_info=error)
+
+
+def drain(timeout: Optional[float] = None) -> int:
+    """Дообработать обновления, уже поставленные в дорожки планировщика.
+
+    Возвращает количество обновлений, не завершившихся за timeout секунд.
+    """
+    if _scheduler is None or not _bridge.running:
+        return 0
+    return submit(_scheduler.close(timeout)).result()
+
+
+def shutdown(timeout: Optional[float] = 5.0) -> None:
+    """Остановить общий цикл событий"""
+    _bridge.stop(timeout)
@@ -0,0 +1,277 @@
+import threading
+import time
+from collections import deque
+from queue import Empty
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Элемент очереди: момент постановки, обновление, номер класса и ключ пользователя
+_Entry = Tuple[float, Any, int, Optional[int]]
+
+
+class IntakeQueue:
+    """Ограниченная очередь приема обновлений с приоритетами.
+
+    Заменяет update_queue Updater и Dispatcher: поток polling (или
+    webhook-сервер) кладет обновления, поток Dispatcher забирает их по
+    одному. Каждое обновление относится к классу приоритета, у каждого
+    класса своя очередь FIFO, и Dispatcher всегда получает обновление самого
+    приоритетного непустого класса.
+
+    Классы с max_wait считаются сбрасываемыми. Пока система перегружена
+    (overloaded() возвращает True), их обновления не передаются в
+    Dispatcher и ждут в очереди; обновление, прождавшее дольше max_wait
+    своего класса, сбрасывается. При заполнении очереди сбрасывается самое
+    новое обновление наименее приоритетного класса. Для сброшенного
+    обновления вызывается on_shed, например чтобы ответить на нажатие
+    кнопки. Обновления классов без max_wait передаются без задержки и
+    никогда не сбрасываются; ради них очередь может превысить maxsize.
+
+    Приоритет выбирает только между обновлениями разных пользователей:
+    обновления одного пользователя (или чата, если пользователя нет)
+    передаются в порядке поступления. Если первым в своем классе стоит
+    обновление, перед которым у того же пользователя ждет более раннее
+    обновление другого класса, сначала передается это раннее обновление -
+    оно наследует приоритет позднего и не задерживается перегрузкой.
+    """
+
+    def __init__(
+        self,
+        classify: Callable[[Any], int],
+        classes: List[str],
+        max_wait: Dict[str, float],
+        maxsize: int = 1000,
+        overloaded: Optional[Callable[[], bool]] = None,
+        on_shed: Optional[Callable[[Any, str], None]] = None,
+        on_admit: Optional[Callable[[Any, float], None]] = None,
+        poll_interval: float = 0.02,
+    ):
+        """
+        Инициализация очереди приема
+
+        :param classify: Номер класса обновления (0 - самый приоритетный)
+        :param classes: Имена классов в порядке убывания приоритета
+        :param max_wait: Сколько секунд обновление класса может ждать при перегрузке;
+            классы, которых здесь нет, не сбрасываются
+        :param maxsize: Максимальная длина очереди для сбрасываемых классов
+        :param overloaded: Признак перегрузки обработчиков; по умолчанию перегрузки нет
+        :param on_shed: Вызывается для сброшенного обновления с именем его класса
+        :param on_admit: Вызывается для переданного в Dispatcher обновления с моментом
+            его постановки в очередь (time.monotonic())
+        :param poll_interval: Как часто (в секундах) проверять перегрузку, пока ждут
+            только сбрасываемые обновления
+        """
+        self.classify = classify
+        self.classes = list(classes)
+        self.maxsize = max(1, maxsize)
+        self.overloaded = overloaded or (lambda: False)
+        self.on_shed = on_shed
+        self.on_admit = on_admit
+        self.poll_interval = poll_interval
+        # Максимальное ожидание по номеру класса; None - класс не сбрасывается
+        self._max_wait: List[Optional[float]] = [max_wait.get(name) for name in self.classes]
+
+        self._queues: List[Deque[_Entry]] = [deque() for _ in self.classes]
+        # Ожидающие обновления каждого пользователя в порядке поступления
+        self._lanes: Dict[int, Deque[_Entry]] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+
+        # Счетчики
+        self.max_depth = 0
+        self.admitted = {name: 0 for name in self.classes}
+        self.shed = {name: 0 for name in self.classes}
+        self.max_queued = {name: 0.0 for name in self.classes}
+        self.promoted = 0
+
+    @staticmethod
+    def lane_of(item: Any) -> Optional[int]:
+        """Ключ упорядочивания: пользователь, иначе чат; None - порядок не важен"""
+        user = getattr(item, "effective_user", None)
+        if user is not None:
+            return user.id
+        chat = getattr(item, "effective_chat", None)
+        if chat is not None:
+            return chat.id
+        return None
+
+    def _class_of(self, item: Any) -> int:
+        """Номер класса; служебные объекты (например, ошибки polling) - самые приоритетные"""
+        if getattr(item, "update_id", None) is None:
+            return 0
+        return self.classify(item)
+
+    def put(self, item: Any, block: bool = True, timeout: Optional[float] = None) -> None:
+        """Поставить обновление в очередь его класса; не блокирует"""
+        index = self._class_of(item)
+        shed = None
+        with self._lock:
+            if self._size >= self.maxsize:
+                victim = self._victim_class()
+                if victim is not None and victim > index:
+                    # Вытесняем самое новое обновление менее приоритетного класса
+                    entry = self._queues[victim].pop()
+                    self._forget(entry)
+                    shed = (entry[1], victim)
+                    self._size -= 1
+                elif self._max_wait[index] is not None:
+                    shed = (item, index)
+            accepted = shed is None or shed[0] is not item
+            if accepted:
+                lane = self.lane_of(item)
+                entry = (time.monotonic(), item, index, lane)
+                self._queues[index].append(entry)
+                if lane is not None:
+                    self._lanes.setdefault(lane, deque()).append(entry)
+                self._size += 1
+                self.max_depth = max(self.max_depth, self._size)
+                self._not_empty.notify()
+        if shed is not None:
+            self._shed(*shed)
+
+    def _victim_class(self) -> Optional[int]:
+        """Наименее приоритетный непустой сбрасываемый класс"""
+        for index in range(len(self.classes) - 1, -1, -1):
+            if self._queues[index] and self._max_wait[index] is not None:
+                return index
+        return None
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Any:
+        """Забрать обновление самого приоритетного класса, которое можно передать сейчас.
+
+        Как queue.Queue.get: при пустой очереди ждет не дольше timeout
+        секунд и выбрасывает queue.Empty.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            shed: List[Tuple[Any, int]] = []
+            with self._lock:
+                item, queued_at, wait = self._pop(shed)
+                if item is None and not shed and block:
+                    left = None if deadline is None else deadline - time.monotonic()
+                    if left is None or left > 0:
+                        if wait:
+                            # Ждут только сбрасываемые обновления - проверим перегрузку позже
+                            left = self.poll_interval if left is None else min(left, self.poll_interval)
+                        self._not_empty.wait(left)
+                        continue
+            for victim, index in shed:
+                self._shed(victim, index)
+            if item is not None:
+                if self.on_admit is not None:
+                    self.on_admit(item, queued_at)
+                return item
+            if shed:
+                continue
+            raise Empty
+
+    def _pop(self, shed: List[Tuple[Any, int]]) -> Tuple[Any, float, bool]:
+        """Извлечь обновление под блокировкой.
+
+        Устаревшие обновления сбрасываемых классов добавляются в shed.
+        Возвращает (обновление или None, момент его постановки в очередь,
+        есть ли ожидающие перегрузки обновления).
+        """
+        now = time.monotonic()
+        overloaded = None
+        for index, queue in enumerate(self._queues):
+            if not queue:
+                continue
+            max_wait = self._max_wait[index]
+            if max_wait is not None:
+                while queue and now - queue[0][0] > max_wait:
+                    entry = queue.popleft()
+                    self._forget(entry)
+                    shed.append((entry[1], index))
+                    self._size -= 1
+                if not queue:
+                    continue
+                if overloaded is None:
+                    overloaded = self.overloaded()
+                if overloaded:
+                    continue
+            queued_at, item, index, _ = self._take(index)
+            name = self.classes[index]
+            self.admitted[name] += 1
+            self.max_queued[name] = max(self.max_queued[name], now - queued_at)
+            return item, queued_at, False
+        return None, 0.0, bool(overloaded)
+
+    def _take(self, index: int) -> _Entry:
+        """Извлечь первое обновление класса или более раннее обновление того же пользователя"""
+        queue = self._queues[index]
+        entry = queue[0]
+        lane = entry[3]
+        if lane is not None and self._lanes[lane][0] is not entry:
+            # Раннее обновление пользователя ждет в другом классе - передаем его первым
+            entry = self._lanes[lane][0]
+            _discard(self._queues[entry[2]], entry)
+            self.promoted += 1
+        else:
+            queue.popleft()
+        self._forget(entry)
+        self._size -= 1
+        return entry
+
+    def _forget(self, entry: _Entry) -> None:
+        """Убрать извлеченное обновление из очереди его пользователя"""
+        lane = entry[3]
+        if lane is None:
+            return
+        entries = self._lanes[lane]
+        if entries[0] is entry:
+            entries.popleft()
+        else:
+            _discard(entries, entry)
+        if not entries:
+            del self._lanes[lane]
+
+    def _shed(self, item: Any, index: int) -> None:
+        """Учесть сброшенное обновление и сообщить о нем (вне блокировки)"""
+        name = self.classes[index]
+        with self._lock:
+            self.shed[name] += 1
+        if self.on_shed is not None:
+            self.on_shed(item, name)
+
+    def task_done(self) -> None:
+        """Совместимость с queue.Queue: Dispatcher отмечает обработанные обновления"""
+
+    def qsize(self) -> int:
+        """Количество ожидающих обновлений"""
+        return self._size
+
+    def empty(self) -> bool:
+        """Пуста ли очередь"""
+        return self._size == 0
+
+    def close(self) -> List[Any]:
+        """Забрать все ожидающие обновления в порядке приоритета (при остановке).
+
+        Обновления одного пользователя остаются в порядке поступления.
+        """
+        items = []
+        with self._lock:
+            while self._size:
+                index = next(index for index, queue in enumerate(self._queues) if queue)
+                items.append(self._take(index)[1])
+        return items
+
+    def stats(self) -> Dict[str, Any]:
+        """Глубина очереди, переданные и сброшенные обновления по классам"""
+        return {
+            "depth": self._size,
+            "max_depth": self.max_depth,
+            "admitted": dict(self.admitted),
+            "shed": dict(self.shed),
+            "max_queued": dict(self.max_queued),
+            "promoted": self.promoted,
+        }
+
+
+def _discard(entries: Deque[_Entry], entry: _Entry) -> None:
+    """Удалить элемент из середины очереди (сравнение по идентичности)"""
+    for position, queued in enumerate(entries):
+        if queued is entry:
+            del entries[position]
+            return
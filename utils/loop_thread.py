@@ -0,0 +1,68 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+
+class LoopThread:
+    """Отдельный поток с собственным долгоживущим циклом событий asyncio"""
+
+    def __init__(self, name: str = "loop-thread"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Цикл событий потока"""
+        if self._loop is None:
+            raise RuntimeError(f"Поток {self.name} не запущен")
+        return self._loop
+
+    @property
+    def running(self) -> bool:
+        """Запущен ли поток"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "LoopThread":
+        """Запустить поток и дождаться готовности цикла событий"""
+        if self.running:
+            return self
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _run(self) -> None:
+        """Тело потока: создать цикл событий и крутить его до остановки"""
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            # Отменяем оставшиеся задачи и даем им корректно завершиться
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+    def in_loop_thread(self) -> bool:
+        """Вызван ли код из потока этого цикла событий"""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Coroutine[Any, Any, Any]) -> Future:
+        """Запланировать корутину в цикле событий потока"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """Остановить цикл событий и дождаться завершения потока"""
+        if not self.running:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if not self.in_loop_thread():
+            self._thread.join(timeout)
@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from telegram.error import RetryAfter
+
+from utils.async_bridge import run_sync
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        """Пополнить ведро за прошедшее время"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """Сколько секунд ждать до появления токена (0 - токен есть)"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        """Забрать токен (после проверки delay)"""
+        self.tokens -= 1
+
+    def full(self, now: Optional[float] = None) -> bool:
+        """Полностью ли пополнено ведро"""
+        self._refill(time.monotonic() if now is None else now)
+        return self.tokens >= self.capacity
+
+
+class _ChatState:
+    """Очередность и лимит отправки в один чат"""
+
+    __slots__ = ("lock", "bucket", "users")
+
+    def __init__(self, rate: float, burst: float):
+        self.lock = asyncio.Lock()
+        self.bucket = TokenBucket(rate, burst)
+        self.users = 0
+
+
+class OutboundQueue:
+    """Очередь исходящих запросов к Telegram Bot API с учетом лимитов.
+
+    Все запросы проходят через общее ведро токенов (по умолчанию 30 в
+    секунду), новые сообщения - еще и через ведро своего чата (1 в секунду
+    с небольшим запасом). Интерактивные ответы пользователям получают токены
+    раньше массовой рассылки. Ответ 429 приостанавливает всю очередь на
+    retry_after секунд, после чего запрос повторяется.
+
+    Методы вызываются из общего цикла событий (async_bridge).
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        max_retries: int = 3,
+    ):
+        """
+        Инициализация очереди
+
+        :param global_rate: Запросов в секунду для всего бота
+        :param chat_rate: Сообщений в секунду в один чат
+        :param chat_burst: Сколько сообщений подряд можно отправить в чат без ожидания
+        :param max_retries: Сколько раз повторять запрос после ответа 429
+        """
+        self.max_retries = max_retries
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+
+        # Без запаса: в любом скользящем окне в 1 секунду не больше global_rate запросов
+        self._global = TokenBucket(global_rate, 1.0)
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._bulk_waiters: Deque[asyncio.Future] = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._paused_until = 0.0
+        self._chats: Dict[int, _ChatState] = {}
+        self._sends_since_prune = 0
+
+        # Метрики обновляются только в потоке цикла событий
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+        self.waiting = 0
+        self.wait_time = {"interactive": 0.0, "bulk": 0.0}
+        self.max_wait = {"interactive": 0.0, "bulk": 0.0}
+        self.requests = {"interactive": 0, "bulk": 0}
+
+    async def send(
+        self, chat_id: int, func: Callable[..., Any], /, *args: Any, bulk: bool = False, **kwargs: Any
+    ) -> Any:
+        """Отправить сообщение в чат с учетом лимита чата и общего лимита.
+
+        :param chat_id: Чат, в который уходит сообщение (позиционный аргумент, поэтому
+            тот же chat_id можно передать и в kwargs метода Bot)
+        :param func: Блокирующий метод Bot (send_message, send_document, reply_text, ...)
+        :param bulk: Массовая рассылка - уступает интерактивным ответам
+        """
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = self._chats[chat_id] = _ChatState(self.chat_rate, self.chat_burst)
+        state.users += 1
+        self.waiting += 1
+        # До вызова _request ожидание снимаем сами (например, при отмене)
+        queued = True
+        try:
+            # Сообщения в один чат уходят строго по очереди
+            async with state.lock:
+                started = time.monotonic()
+                delay = state.bucket.delay(started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                queued = False
+                return await self._request(func, args, kwargs, bulk, started, state.bucket)
+        finally:
+            if queued:
+                self.waiting -= 1
+            state.users -= 1
+            self._maybe_prune()
+
+    async def call(self, func: Callable[..., Any], /, *args: Any, bulk: bool = False, **kwargs: Any) -> Any:
+        """Выполнить прочий запрос (редактирование, удаление) с учетом только общего лимита
+
+        :param bulk: Фоновый запрос - уступает интерактивным ответам
+        """
+        self.waiting += 1
+        return await self._request(func, args, kwargs, bulk, time.monotonic())
+
+    async def _request(
+        self,
+        func: Callable[..., Any],
+        args: tuple,
+        kwargs: dict,
+        bulk: bool,
+        started: float,
+        chat_bucket: Optional[TokenBucket] = None,
+    ) -> Any:
+        """Дождаться токена, выполнить запрос и повторить его после 429.
+
+        Запрос уже учтен в self.waiting и перестает считаться ожидающим,
+        когда получает токен. Токен ведра чата забирается в момент отправки:
+        если брать его раньше, ожидание общего токена засчиталось бы как
+        пауза между сообщениями в чат.
+        """
+        kind = "bulk" if bulk else "interactive"
+        self.requests[kind] += 1
+        attempt = 0
+        try:
+            await self._acquire(bulk)
+        finally:
+            self.waiting -= 1
+        while True:
+            if attempt:
+                await self._acquire(bulk)
+            if chat_bucket is not None:
+                chat_bucket.delay()
+                chat_bucket.take()
+            waited = time.monotonic() - started
+            try:
+                result = await run_sync(func, *args, **kwargs)
+            except RetryAfter as e:
+                self.throttled += 1
+                self._pause(e.retry_after)
+                attempt += 1
+                if attempt > self.max_retries:
+                    self.failed += 1
+                    raise
+                logger.warning("Telegram ограничил частоту запросов, пауза %s с", e.retry_after)
+                continue
+            except Exception:
+                self.failed += 1
+                raise
+            self.sent += 1
+            self.wait_time[kind] += waited
+            self.max_wait[kind] = max(self.max_wait[kind], waited)
+            return result
+
+    async def _acquire(self, bulk: bool) -> None:
+        """Получить токен общего ведра: интерактивные запросы обслуживаются первыми"""
+        now = time.monotonic()
+        queued = self._waiters or (bulk and self._bulk_waiters)
+        if not queued and now >= self._paused_until and self._global.delay(now) == 0:
+            self._global.take()
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        (self._bulk_waiters if bulk else self._waiters).append(future)
+        self._schedule_wakeup(0)
+        await future
+
+    def _schedule_wakeup(self, delay: float) -> None:
+        """Запланировать раздачу токенов ожидающим"""
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._wakeup)
+
+    def _wakeup(self) -> None:
+        """Раздать появившиеся токены ожидающим в порядке приоритета"""
+        self._timer = None
+        while self._waiters or self._bulk_waiters:
+            now = time.monotonic()
+            if now < self._paused_until:
+                self._schedule_wakeup(self._paused_until - now)
+                return
+            delay = self._global.delay(now)
+            if delay > 0:
+                self._schedule_wakeup(delay)
+                return
+            waiters = self._waiters if self._waiters else self._bulk_waiters
+            future = waiters.popleft()
+            if not future.done():
+                self._global.take()
+                future.set_result(None)
+
+    def _pause(self, retry_after: float) -> None:
+        """Приостановить все запросы после ответа 429"""
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def _maybe_prune(self) -> None:
+        """Время от времени удалять состояние чатов без ожидающих сообщений"""
+        self._sends_since_prune += 1
+        if self._sends_since_prune < 1000:
+            return
+        self._sends_since_prune = 0
+        now = time.monotonic()
+        idle = [
+            chat_id for chat_id, state in self._chats.items()
+            if state.users == 0 and state.bucket.full(now)
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики очереди: глубина, ожидание, количество ответов 429"""
+        return {
+            "depth": self.waiting,
+            "sent": self.sent,
+            "failed": self.failed,
+            "throttled": self.throttled,
+            "requests": dict(self.requests),
+            "avg_wait": {
+                kind: self.wait_time[kind] / self.requests[kind] if self.requests[kind] else 0.0
+                for kind in self.wait_time
+            },
+            "max_wait": dict(self.max_wait),
+            "chats": len(self._chats),
+        }
+
+
+# Общая для процесса очередь исходящих запросов
+_outbound = OutboundQueue()
+
+
+def configure(global_rate: float, chat_rate: float, chat_burst: float, max_retries: int) -> None:
+    """Задать лимиты очереди исходящих запросов (до начала работы)"""
+    global _outbound
+    _outbound = OutboundQueue(global_rate, chat_rate, chat_burst, max_retries)
+
+
+def get_outbound() -> OutboundQueue:
+    """Получить общую очередь исходящих запросов"""
+    return _outbound
+
+
+async def send(
+    chat_id: int, func: Callable[..., Any], /, *args: Any, bulk: bool = False, **kwargs: Any
+) -> Any:
+    """Отправить сообщение через общую очередь"""
+    return await _outbound.send(chat_id, func, *args, bulk=bulk, **kwargs)
+
+
+async def call(func: Callable[..., Any], /, *args: Any, bulk: bool = False, **kwargs: Any) -> Any:
+    """Выполнить прочий запрос через общую очередь"""
+    return await _outbound.call(func, *args, bulk=bulk, **kwargs)
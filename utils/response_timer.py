@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+# Измеряемые задержки
+ACK = "ack"
+VISIBLE = "visible"
+HANDLER = "handler"
+
+
+class _Timing:
+    """Отметки времени одного нажатия"""
+
+    __slots__ = ("received", "started", "acked", "finished", "shown")
+
+    def __init__(self, received: float):
+        self.received = received
+        self.started: Optional[float] = None
+        self.acked = False
+        self.finished = False
+        self.shown = False
+
+
+class ResponseTimer:
+    """Задержки ответа на нажатия кнопок.
+
+    Для каждого нажатия (по update_id) отдельно измеряются:
+    - ack - от приема обновления до подтверждения нажатия (пропадает
+      индикатор загрузки на кнопке);
+    - visible - от приема обновления до первого показанного экрана
+      (отредактированное или отправленное сообщение);
+    - handler - время работы обработчика в дорожке пользователя.
+
+    Хранятся последние samples значений каждой задержки. Отметки нажатий,
+    которые не дошли до обработчика (отклонены, схлопнуты), удаляются через
+    max_age секунд.
+
+    Методы можно вызывать из любого потока.
+    """
+
+    def __init__(self, samples: int = 10000, max_age: float = 60.0):
+        """
+        Инициализация таймера
+
+        :param samples: Сколько последних значений каждой задержки хранить
+        :param max_age: Через сколько секунд забывать незавершенные нажатия
+        """
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # update_id -> отметки; в начале словаря - самые старые нажатия
+        self._timings: Dict[int, _Timing] = {}
+        self._samples: Dict[str, Deque[float]] = {
+            name: deque(maxlen=max(1, samples)) for name in (ACK, VISIBLE, HANDLER)
+        }
+        self._next_sweep = time.monotonic() + max_age
+
+    def received(self, update_id: int, at: Optional[float] = None) -> None:
+        """Отметить прием нажатия (at - момент по time.monotonic(), по умолчанию сейчас)"""
+        now = time.monotonic()
+        with self._lock:
+            if update_id not in self._timings:
+                self._timings[update_id] = _Timing(now if at is None else at)
+            if now >= self._next_sweep:
+                self._sweep(now)
+
+    def acked(self, update_id: int) -> None:
+        """Нажатие подтверждено"""
+        with self._lock:
+            timing = self._timings.get(update_id)
+            if timing is None or timing.acked:
+                return
+            timing.acked = True
+            self._samples[ACK].append(time.monotonic() - timing.received)
+            if timing.finished:
+                del self._timings[update_id]
+
+    def visible(self, update_id: int) -> None:
+        """Пользователь увидел результат нажатия; учитывается первый экран"""
+        with self._lock:
+            timing = self._timings.get(update_id)
+            if timing is None or timing.shown:
+                return
+            timing.shown = True
+            self._samples[VISIBLE].append(time.monotonic() - timing.received)
+
+    def started(self, update_id: int) -> None:
+        """Обработчик нажатия начал работу"""
+        with self._lock:
+            timing = self._timings.get(update_id)
+            if timing is not None:
+                timing.started = time.monotonic()
+
+    def finished(self, update_id: int) -> None:
+        """Обработчик нажатия завершился"""
+        with self._lock:
+            timing = self._timings.get(update_id)
+            if timing is None:
+                return
+            if timing.started is not None:
+                self._samples[HANDLER].append(time.monotonic() - timing.started)
+            timing.finished = True
+            if timing.acked:
+                del self._timings[update_id]
+
+    def _sweep(self, now: float) -> None:
+        """Забыть старые незавершенные нажатия (под блокировкой)"""
+        self._next_sweep = now + self.max_age
+        expired = []
+        for update_id, timing in self._timings.items():
+            if now - timing.received < self.max_age:
+                break
+            expired.append(update_id)
+        for update_id in expired:
+            del self._timings[update_id]
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Количество значений, медиана, 95-й перцентиль и максимум каждой задержки (в секундах)"""
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+        result = {}
+        for name, values in samples.items():
+            count = len(values)
+            result[name] = {
+                "count": count,
+                "p50": values[count // 2] if count else 0.0,
+                "p95": values[min(count - 1, count * 95 // 100)] if count else 0.0,
+                "max": values[-1] if count else 0.0,
+            }
+        return result
+
+
+# Общий для процесса таймер ответов на нажатия
+_timer = ResponseTimer()
+
+
+def get_response_timer() -> ResponseTimer:
+    """Получить общий таймер ответов на нажатия"""
+    return _timer
@@ -0,0 +1,28 @@
+import time
+from typing import List, Optional, Tuple
+
+
+class StartupTimer:
+    """Замер длительности этапов запуска бота (--measure-startup)"""
+
+    def __init__(self, started_at: Optional[float] = None):
+        """
+        Инициализация таймера
+
+        :param started_at: Момент начала отсчета по time.perf_counter(), по умолчанию - сейчас
+        """
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self._last = self.started_at
+        self.phases: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str) -> None:
+        """Завершить этап: записать время, прошедшее с конца предыдущего"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self) -> str:
+        """Текстовый отчет по этапам в миллисекундах"""
+        lines = [f"  {phase}: {seconds * 1000:.1f} мс" for phase, seconds in self.phases]
+        lines.append(f"  всего: {(self._last - self.started_at) * 1000:.1f} мс")
+        return "\n".join(lines)
@@ -0,0 +1,183 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.loop_thread import LoopThread
+
+# Задание дорожки: update_id, фабрика корутины обработчика и функция для передачи ошибки
+Job = Tuple[Optional[int], Callable[[], Awaitable[Any]], Callable[[BaseException], None]]
+
+
+class UpdateScheduler:
+    """Планировщик обновлений по дорожкам.
+
+    Обновления распределяются по user_id на фиксированное число дорожек.
+    У каждой дорожки своя ограниченная очередь и один исполнитель, поэтому
+    обновления одного пользователя выполняются строго по порядку, а разные
+    пользователи обрабатываются параллельно. При заполнении очереди поток
+    Dispatcher ждет свободного места, и прием обновлений притормаживает.
+    """
+
+    def __init__(self, loop_thread: LoopThread, lanes: int = 32, queue_size: int = 100):
+        """
+        Инициализация планировщика
+
+        :param loop_thread: Поток с циклом событий, в котором выполняются обработчики
+        :param lanes: Количество дорожек (максимум одновременно обрабатываемых пользователей)
+        :param queue_size: Максимальная длина очереди одной дорожки
+        """
+        self.loop_thread = loop_thread
+        self.lanes = max(1, lanes)
+        self.queue_size = max(1, queue_size)
+
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._closed = False
+        # Незавершенные задания по update_id: {update_id: количество}
+        self._inflight: Dict[int, int] = {}
+
+        # Метрики обновляются только в потоке цикла событий
+        self.enqueued = 0
+        self.completed = 0
+        self.failed = 0
+        self.blocked = 0
+        self.blocked_time = 0.0
+        self.max_depth = 0
+
+    def start(self) -> "UpdateScheduler":
+        """Создать очереди и исполнителей дорожек"""
+        self.loop_thread.start()
+        self.loop_thread.submit(self._setup()).result()
+        return self
+
+    async def _setup(self) -> None:
+        """Создать очереди в цикле событий потока"""
+        self._queues = [asyncio.Queue(self.queue_size) for _ in range(self.lanes)]
+        self._workers = [
+            asyncio.ensure_future(self._lane_worker(queue)) for queue in self._queues
+        ]
+
+    @staticmethod
+    def lane_key(update: Any) -> int:
+        """Ключ упорядочивания обновления: пользователь, иначе чат"""
+        user = getattr(update, "effective_user", None)
+        if user is not None:
+            return user.id
+        chat = getattr(update, "effective_chat", None)
+        if chat is not None:
+            return chat.id
+        return 0
+
+    def schedule(
+        self,
+        update: Any,
+        job: Callable[[], Awaitable[Any]],
+        on_error: Callable[[BaseException], None],
+    ) -> None:
+        """Поставить обработчик обновления в очередь его дорожки.
+
+        Вызывается из потока Dispatcher и ждет, пока задание не окажется в
+        очереди: так сохраняется порядок и работает обратное давление.
+        """
+        if self._closed:
+            raise RuntimeError("Планировщик обновлений остановлен")
+        queue = self._queues[self.lane_key(update) % self.lanes]
+        coro = self._enqueue(queue, (getattr(update, "update_id", None), job, on_error))
+        if self.loop_thread.in_loop_thread():
+            asyncio.ensure_future(coro)
+        else:
+            self.loop_thread.submit(coro).result()
+
+    async def _enqueue(self, queue: asyncio.Queue, item: Optional[Job]) -> None:
+        """Добавить задание в очередь дорожки, учитывая ожидание при переполнении"""
+        if queue.full():
+            self.blocked += 1
+            started = time.monotonic()
+            await queue.put(item)
+            self.blocked_time += time.monotonic() - started
+        else:
+            queue.put_nowait(item)
+        if item is not None:
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, queue.qsize())
+            update_id = item[0]
+            if update_id is not None:
+                self._inflight[update_id] = self._inflight.get(update_id, 0) + 1
+
+    async def _lane_worker(self, queue: asyncio.Queue) -> None:
+        """Исполнитель дорожки: по одному заданию за раз до сигнала остановки"""
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                update_id, job, on_error = item
+                try:
+                    await job()
+                except Exception as e:
+                    self.failed += 1
+                    on_error(e)
+                # Прерванное по таймауту остановки задание остается незавершенным
+                self.completed += 1
+                self._finish(update_id)
+            finally:
+                queue.task_done()
+
+    def _finish(self, update_id: Optional[int]) -> None:
+        """Снять отметку незавершенного задания"""
+        if update_id is None:
+            return
+        left = self._inflight.get(update_id, 0) - 1
+        if left > 0:
+            self._inflight[update_id] = left
+        else:
+            self._inflight.pop(update_id, None)
+
+    def pending(self) -> int:
+        """Количество обновлений, обработка которых еще не завершена.
+
+        Обновление с несколькими заданиями (обработчик и служебные отметки)
+        считается один раз. Можно вызывать из любого потока, например из
+        потока Dispatcher.
+        """
+        return len(self._inflight)
+
+    async def close(self, timeout: Optional[float] = None) -> int:
+        """Дообработать поставленные задания и остановить дорожки.
+
+        :param timeout: Сколько секунд ждать дообработки, None - без ограничения
+        :return: Количество обновлений, обработка которых не успела завершиться
+        """
+        if self._closed:
+            return self.pending()
+        self._closed = True
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        return self.pending()
+
+    async def _drain(self) -> None:
+        """Поставить сигнал остановки в каждую дорожку и дождаться исполнителей"""
+        for queue in self._queues:
+            await self._enqueue(queue, None)
+        await asyncio.gather(*self._workers)
+
+    def stats(self) -> Dict[str, float]:
+        """Метрики очередей и обратного давления"""
+        depths = [queue.qsize() for queue in self._queues]
+        return {
+            "lanes": self.lanes,
+            "queue_size": self.queue_size,
+            "enqueued": self.enqueued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "depth": sum(depths),
+            "busiest_lane_depth": max(depths, default=0),
+            "pending": self.pending(),
+            "max_depth": self.max_depth,
+            "blocked": self.blocked,
+            "blocked_time": self.blocked_time,
+        }
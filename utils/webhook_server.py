@@ -0,0 +1,162 @@
+import asyncio
+import hmac
+import json
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from aiohttp import web
+
+from utils.loop_thread import LoopThread
+
+logger = logging.getLogger(__name__)
+
+# Заголовок, в котором Telegram передает secret_token, указанный в setWebhook
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """Встроенный aiohttp-сервер для приема обновлений через webhook.
+
+    Запрос проверяется по секретному токену, JSON тела разбирается и
+    кладется в ограниченную очередь приема, и Telegram сразу получает ответ
+    200. Передачу в Dispatcher выполняет отдельная задача. Тело, которое не
+    является JSON-объектом, отклоняется с ответом 400. Если очередь
+    заполнена, сервер отвечает 503, и Telegram повторит доставку позже.
+
+    Сервер работает в собственном потоке с циклом событий, чтобы обработчики
+    обновлений не задерживали ответы Telegram.
+    """
+
+    def __init__(
+        self,
+        process_update: Callable[[Dict[str, Any]], Any],
+        secret_token: str,
+        host: str = "0.0.0.0",
+        port: int = 8443,
+        path: str = "/webhook",
+        intake_size: int = 1000,
+        loop_thread: Optional[LoopThread] = None,
+    ):
+        """
+        Инициализация webhook-сервера
+
+        :param process_update: Блокирующая функция, передающая JSON обновления в Dispatcher
+        :param secret_token: Секретный токен, который Telegram присылает в заголовке
+        :param host: Адрес для прослушивания
+        :param port: Порт для прослушивания; 0 - любой свободный (фактический порт
+            после start() записывается в self.port)
+        :param path: Путь, на который Telegram отправляет обновления
+        :param intake_size: Максимальная длина очереди приема
+        :param loop_thread: Поток с циклом событий; по умолчанию сервер создает свой
+        """
+        self.process_update = process_update
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.path = path
+        self.intake_size = max(1, intake_size)
+        self._own_thread = loop_thread is None
+        self._thread = loop_thread or LoopThread("webhook-server")
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._forwarder: Optional[asyncio.Task] = None
+
+        # Метрики обновляются только в потоке цикла событий
+        self.received = 0
+        self.rejected = 0
+        self.malformed = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    def start(self) -> None:
+        """Запустить поток сервера и дождаться, пока порт начнет принимать запросы"""
+        self._thread.start()
+        self._thread.submit(self._start()).result()
+
+    async def _start(self) -> None:
+        """Запустить HTTP-сервер и задачу передачи обновлений"""
+        self._queue = asyncio.Queue(self.intake_size)
+        app = web.Application()
+        app.router.add_post(self.path, self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        if self.port == 0:
+            self.port = self._runner.addresses[0][1]
+        self._forwarder = asyncio.ensure_future(self._forward())
+        logger.info("Webhook-сервер слушает %s:%d%s", self.host, self.port, self.path)
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        """Принять обновление: проверить токен и поставить в очередь без ожидания обработки"""
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, self.secret_token):
+            self.rejected += 1
+            return web.Response(status=403)
+
+        try:
+            data = json.loads(await request.read())
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            self.malformed += 1
+            return web.Response(status=400)
+
+        try:
+            self._queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return web.Response(status=503, headers={"Retry-After": "1"})
+
+        self.received += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+        return web.Response()
+
+    async def _forward(self) -> None:
+        """Разбирать обновления из очереди и по одному передавать в Dispatcher"""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            try:
+                if item is None:
+                    return
+                try:
+                    # Обновления передаются строго по одному, чтобы сохранить их порядок
+                    await loop.run_in_executor(None, self.process_update, item)
+                    self.processed += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.error("Ошибка обработки webhook-обновления: %s", e, exc_info=e)
+            finally:
+                self._queue.task_done()
+
+    def close(self) -> None:
+        """Перестать принимать запросы и передать в Dispatcher уже принятые обновления"""
+        if self._runner is None:
+            return
+        self._thread.submit(self._close()).result()
+        if self._own_thread:
+            self._thread.stop()
+
+    async def _close(self) -> None:
+        """Остановить HTTP-сервер и дождаться задачи передачи обновлений"""
+        await self._runner.cleanup()
+        self._runner = None
+        if self._forwarder is not None:
+            await self._queue.put(None)
+            await self._forwarder
+
+    def stats(self) -> Dict[str, int]:
+        """Метрики приема обновлений"""
+        return {
+            "received": self.received,
+            "rejected": self.rejected,
+            "malformed": self.malformed,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "failed": self.failed,
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_depth": self.max_depth,
+        }